@@ -89,6 +89,11 @@ LOADING_MAG_METRICS_DATATABLE = "loading-mag-metrics-datatable"
 MAG_METRICS_DATATABLE = "mag-metrics-datatable"
 LOADING_SCATTERPLOT_2D = "loading-scatterplot-2d"
 SCATTERPLOT_2D_FIGURE = "scatterplot-2d-figure"
+SCATTERPLOT_2D_VIEWPORT_STORE = "scatterplot-2d-viewport-store"
+CONTIG_SELECTION_STORE = "contig-selection-store"
+CONTIG_DISTRIBUTIONS_STORE = "contig-distributions-store"
+CONTIG_LOOKUP_STORE = "contig-lookup-store"
+SCATTERPLOT_2D_TOOLTIP = "scatterplot-2d-tooltip"
 LOADING_SCATTERPLOT_3D = "loading-scatterplot-3d"
 SCATTERPLOT_3D = "scatterplot-3d"
 LOADING_TAXONOMY_DISTRIBUTION = "loading-taxonomy-distribution"
@@ -4,4 +4,8 @@ task_send_sent_event = True
 worker_prefetch_multiplier = 1
 worker_concurrency = 2
 task_track_started = True
-imports = ("automappa.pages.home.tasks", "automappa.tasks")
+imports = (
+    "automappa.pages.home.tasks",
+    "automappa.pages.mag_refinement.tasks",
+    "automappa.tasks",
+)
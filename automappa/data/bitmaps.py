@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# Compressed bitmaps of refinement membership over dense contig rows
+import functools
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+
+# Containers holding more values than this are stored as bitmaps
+ARRAY_CONTAINER_MAX_SIZE = 4096
+# Number of 64-bit words of a bitmap container (2^16 bits)
+BITMAP_CONTAINER_WORDS = 1024
+# Number of set bits of every byte value
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint16)
+
+Container = np.ndarray
+
+
+def to_words(container: Container) -> np.ndarray:
+    """Bitmap (little-endian uint64 words) of a container"""
+    if container.dtype != np.uint16:
+        return container
+    bits = np.zeros(BITMAP_CONTAINER_WORDS * 64, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view("<u8")
+
+
+def to_values(container: Container) -> np.ndarray:
+    """Sorted uint16 values of a container"""
+    if container.dtype == np.uint16:
+        return container
+    bits = np.unpackbits(container.view(np.uint8), bitorder="little")
+    return np.flatnonzero(bits).astype(np.uint16)
+
+
+def contains(words: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Whether each of `values` is set in the bitmap `words`"""
+    shifts = (values & 63).astype(np.uint64)
+    return ((words[values >> 6] >> shifts) & np.uint64(1)).astype(bool)
+
+
+def cardinality(container: Container) -> int:
+    if container.dtype == np.uint16:
+        return container.size
+    return int(POPCOUNT[container.view(np.uint8)].sum())
+
+
+def optimize(container: Container) -> Optional[Container]:
+    """Store `container` in its smallest representation (None when empty)"""
+    count = cardinality(container)
+    if not count:
+        return None
+    if container.dtype == np.uint16:
+        return container if count <= ARRAY_CONTAINER_MAX_SIZE else to_words(container)
+    return to_values(container) if count <= ARRAY_CONTAINER_MAX_SIZE else container
+
+
+def union_containers(a: Container, b: Container) -> Optional[Container]:
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return optimize(np.union1d(a, b))
+    return optimize(to_words(a) | to_words(b))
+
+
+def intersect_containers(a: Container, b: Container) -> Optional[Container]:
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return optimize(np.intersect1d(a, b, assume_unique=True))
+    if a.dtype == np.uint16:
+        return optimize(a[contains(b, a)])
+    if b.dtype == np.uint16:
+        return optimize(b[contains(a, b)])
+    return optimize(a & b)
+
+
+def subtract_containers(a: Container, b: Container) -> Optional[Container]:
+    if a.dtype == np.uint16 and b.dtype == np.uint16:
+        return optimize(np.setdiff1d(a, b, assume_unique=True))
+    if a.dtype == np.uint16:
+        return optimize(a[~contains(b, a)])
+    return optimize(a & ~to_words(b))
+
+
+class RoaringBitmap:
+    """Compressed set of unsigned 32-bit integers (roaring bitmap)
+
+    Values are partitioned by their 16 most significant bits into containers
+    of their 16 least significant bits. Sparse containers are sorted uint16
+    arrays and dense containers (more than 4096 values) are 2^16-bit bitmaps,
+    so set operations are container-wise array merges or word-wise bit logic.
+
+    Parameters
+    ----------
+    containers : Optional[Dict[int, np.ndarray]], optional
+        Non-empty containers keyed by their high 16 bits, by default None (empty)
+
+    References
+    ----------
+    Chambi S. et al. (2016) Better bitmap performance with Roaring bitmaps.
+    Software: Practice and Experience 46(5), 709-719
+    """
+
+    __slots__ = ("containers", "_cardinality")
+
+    def __init__(self, containers: Optional[Dict[int, Container]] = None) -> None:
+        self.containers = containers if containers is not None else {}
+        # NOTE: Bitmaps are never modified in place (operations return new ones)
+        self._cardinality: Optional[int] = None
+
+    @classmethod
+    def from_indices(cls, indices: Iterable[int]) -> "RoaringBitmap":
+        indices = np.unique(np.asarray(indices, dtype=np.uint32))
+        if not indices.size:
+            return cls()
+        keys = indices >> 16
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        containers = {
+            int(keys[start]): optimize((chunk & 0xFFFF).astype(np.uint16))
+            for start, chunk in zip(starts, np.split(indices, starts[1:]))
+        }
+        return cls(containers)
+
+    def to_indices(self) -> np.ndarray:
+        """Sorted values of the bitmap"""
+        if not self.containers:
+            return np.empty(0, dtype=np.uint32)
+        return np.concatenate(
+            [
+                (np.uint32(key) << np.uint32(16)) | to_values(container)
+                for key, container in sorted(self.containers.items())
+            ]
+        )
+
+    def to_mask(self, size: int) -> np.ndarray:
+        mask = np.zeros(size, dtype=bool)
+        mask[self.to_indices()] = True
+        return mask
+
+    @property
+    def nbytes(self) -> int:
+        return sum(container.nbytes for container in self.containers.values())
+
+    def __len__(self) -> int:
+        if self._cardinality is None:
+            self._cardinality = sum(
+                cardinality(container) for container in self.containers.values()
+            )
+        return self._cardinality
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RoaringBitmap):
+            return NotImplemented
+        return self.containers.keys() == other.containers.keys() and all(
+            np.array_equal(to_values(container), to_values(other.containers[key]))
+            for key, container in self.containers.items()
+        )
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(cardinality={len(self):,})"
+
+    def _combine(
+        self,
+        other: "RoaringBitmap",
+        operation: Callable[[Container, Container], Optional[Container]],
+        keys: Iterable[int],
+    ) -> "RoaringBitmap":
+        containers = {}
+        for key in keys:
+            a, b = self.containers.get(key), other.containers.get(key)
+            if a is None:
+                container = b
+            elif b is None:
+                container = a
+            else:
+                container = operation(a, b)
+            if container is not None:
+                containers[key] = container
+        return RoaringBitmap(containers)
+
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        keys = self.containers.keys() | other.containers.keys()
+        return self._combine(other, union_containers, keys)
+
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        keys = self.containers.keys() & other.containers.keys()
+        return self._combine(other, intersect_containers, keys)
+
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        return self._combine(other, subtract_containers, self.containers.keys())
+
+    def intersects(self, other: "RoaringBitmap") -> bool:
+        for key in self.containers.keys() & other.containers.keys():
+            shared = intersect_containers(self.containers[key], other.containers[key])
+            if shared is not None:
+                return True
+        return False
+
+    @classmethod
+    def union(cls, *bitmaps: "RoaringBitmap") -> "RoaringBitmap":
+        return functools.reduce(cls.__or__, bitmaps, cls())
+
+    @classmethod
+    def intersection(
+        cls, bitmap: "RoaringBitmap", *bitmaps: "RoaringBitmap"
+    ) -> "RoaringBitmap":
+        return functools.reduce(cls.__and__, bitmaps, bitmap)
+
+    @classmethod
+    def difference(
+        cls, bitmap: "RoaringBitmap", *bitmaps: "RoaringBitmap"
+    ) -> "RoaringBitmap":
+        """Values of `bitmap` in none of `bitmaps`"""
+        return functools.reduce(cls.__sub__, bitmaps, bitmap)
+
+
+class RefinementBitmaps:
+    """Contig membership of the current refinements of a metagenome
+
+    Bitmaps are over dense contig rows, i.e. the positions of the metagenome's
+    contigs ordered by Contig.id (the rows of `MetagenomeContigs`).
+
+    Parameters
+    ----------
+    bitmaps : Dict[int, RoaringBitmap]
+        Membership bitmap of each (non-outdated) refinement keyed by Refinement.id
+    user_refinement_ids : Iterable[int]
+        Refinements created by the user (i.e. not initial refinements)
+    """
+
+    def __init__(
+        self, bitmaps: Dict[int, RoaringBitmap], user_refinement_ids: Iterable[int]
+    ) -> None:
+        self.bitmaps = bitmaps
+        self.user_refinement_ids = sorted(user_refinement_ids)
+
+    def __len__(self) -> int:
+        return len(self.bitmaps)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bitmap.nbytes for bitmap in self.bitmaps.values())
+
+    def counts(self) -> Dict[int, int]:
+        """Number of contigs of each refinement"""
+        return {
+            refinement_id: len(bitmap) for refinement_id, bitmap in self.bitmaps.items()
+        }
+
+    def user_refined(self) -> RoaringBitmap:
+        """Contigs in any current user refinement"""
+        return RoaringBitmap.union(
+            *(self.bitmaps[refinement_id] for refinement_id in self.user_refinement_ids)
+        )
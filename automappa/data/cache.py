@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+# Process-level caches of immutable per-metagenome contig attributes
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import redis
+from scipy import sparse
+from sqlmodel import Session, func, select
+
+from automappa import settings
+from automappa.data.bitmaps import RefinementBitmaps, RoaringBitmap
+from automappa.data.database import engine
+from automappa.data.filters import ContigSelection
+from automappa.data.models import (
+    Contig,
+    ContigRefinementLink,
+    Lineage,
+    Marker,
+    Refinement,
+)
+from automappa.data.results import memoize, result_cache
+from automappa.data.schemas import ContigSchema, MarkerSchema
+from automappa.utils.markers import MARKER_SIZES, MARKER_SYMBOLS
+
+logger = logging.getLogger(__name__)
+
+# Number of selection masks retained per metagenome
+SELECTION_MASKS_MAXSIZE = 8
+
+LINEAGE_COLUMNS = [
+    ContigSchema.SUPERKINGDOM,
+    ContigSchema.PHYLUM,
+    ContigSchema.CLASS,
+    ContigSchema.ORDER,
+    ContigSchema.FAMILY,
+    ContigSchema.GENUS,
+    ContigSchema.SPECIES,
+]
+
+CATEGORICAL_COLUMNS = [
+    ContigSchema.CLUSTER,
+    ContigSchema.SUPERKINGDOM,
+    ContigSchema.PHYLUM,
+    ContigSchema.CLASS,
+    ContigSchema.ORDER,
+    ContigSchema.FAMILY,
+    ContigSchema.GENUS,
+    ContigSchema.SPECIES,
+    ContigSchema.MARKER_SYMBOL,
+]
+
+
+class ContigMarkers:
+    """Sparse contig x marker accession count matrix of a metagenome
+
+    Rows are aligned with the rows of `MetagenomeContigs`, columns with
+    `accessions`.
+    """
+
+    def __init__(self, counts: sparse.csr_matrix, accessions: np.ndarray) -> None:
+        self.counts = counts
+        self.accessions = accessions
+        self.nbytes = int(
+            counts.data.nbytes
+            + counts.indices.nbytes
+            + counts.indptr.nbytes
+            + accessions.nbytes
+        )
+
+    def accession_counts(self, mask: np.ndarray) -> np.ndarray:
+        """Number of markers of each accession among the masked contigs"""
+        return np.asarray(self.counts[np.flatnonzero(mask)].sum(axis=0)).ravel()
+
+
+class MetagenomeContigs:
+    """Columnar contig attributes of a single metagenome
+
+    Rows are ordered by Contig.id so row positions are stable between loads.
+    Contig attributes and markers are immutable after ingestion (marker symbols
+    and sizes are derived from marker counts, see `add_marker_columns`), only
+    the refinement membership (`refinements`) is reloaded after it is
+    invalidated, either in this process or by a new refinement generation (e.g.
+    a refinement saved by another worker).
+    """
+
+    def __init__(self, metagenome_id: int, df: pd.DataFrame) -> None:
+        self.metagenome_id = metagenome_id
+        self.df = df
+        self.contig_ids = df[ContigSchema.CONTIG_ID].to_numpy()
+        self.headers = df[ContigSchema.HEADER]
+        self._refinements: Optional[RefinementBitmaps] = None
+        self._refinements_generation: Optional[int] = None
+        self._refined: Optional[np.ndarray] = None
+        self._markers: Optional[ContigMarkers] = None
+        self._selection_masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._selection_masks_lock = threading.Lock()
+        self._df_nbytes = int(df.memory_usage(deep=True).sum())
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    @property
+    def nbytes(self) -> int:
+        markers_nbytes = self._markers.nbytes if self._markers is not None else 0
+        refinements = self._refinements
+        refinements_nbytes = refinements.nbytes if refinements is not None else 0
+        return self._df_nbytes + markers_nbytes + refinements_nbytes
+
+    @property
+    def markers(self) -> ContigMarkers:
+        """Marker accession counts of each contig, loaded on first use"""
+        markers = self._markers
+        if markers is None:
+            markers = load_contig_markers(self.metagenome_id, self.contig_ids)
+            self._markers = markers
+        return markers
+
+    @property
+    def refinements(self) -> RefinementBitmaps:
+        """Membership bitmaps (over rows) of the current refinements"""
+        generation = get_refinements_generation(self.metagenome_id)
+        refinements = self._refinements
+        if refinements is None or generation != self._refinements_generation:
+            refinements = load_refinement_bitmaps(self.metagenome_id)
+            self._refinements = refinements
+            self._refinements_generation = generation
+            self._refined = None
+        return refinements
+
+    @property
+    def refined(self) -> np.ndarray:
+        """Mask of contigs in user refinements that are not outdated"""
+        refinements = self.refinements
+        refined = self._refined
+        if refined is None:
+            refined = refinements.user_refined().to_mask(len(self))
+            self._refined = refined
+        return refined
+
+    def invalidate_refinements(self) -> None:
+        self._refinements = None
+        self._refined = None
+
+    def column(self, name: str) -> np.ndarray:
+        return self.df[name].to_numpy()
+
+    def get_selection(self, rows: Iterable[int]) -> ContigSelection:
+        """Resolve row positions (e.g. from figure customdata) to a selection"""
+        rows = np.fromiter(rows, dtype=np.int64)
+        rows = rows[(rows >= 0) & (rows < len(self))]
+        contig_ids = self.contig_ids[rows]
+        return ContigSelection.from_contig_ids(self.metagenome_id, contig_ids)
+
+    def selection_mask(self, selection: Optional[ContigSelection]) -> np.ndarray:
+        """Boolean mask of the contigs in `selection`
+
+        Masks are retained by `selection.selection_id` so components sharing a
+        selection only resolve it once. A missing selection (or a selection of
+        another metagenome) selects all contigs.
+        """
+        if selection is None or selection.metagenome_id != self.metagenome_id:
+            return np.ones(len(self), dtype=bool)
+        selection_id = selection.selection_id
+        # NOTE: Entries are shared by the callbacks of every worker thread
+        with self._selection_masks_lock:
+            mask = self._selection_masks.get(selection_id)
+            if mask is not None:
+                self._selection_masks.move_to_end(selection_id)
+                return mask
+        mask = np.isin(self.contig_ids, selection.contig_ids, assume_unique=True)
+        # Shared between callers
+        mask.flags.writeable = False
+        with self._selection_masks_lock:
+            self._selection_masks[selection_id] = mask
+            self._selection_masks.move_to_end(selection_id)
+            while len(self._selection_masks) > SELECTION_MASKS_MAXSIZE:
+                self._selection_masks.popitem(last=False)
+        return mask
+
+    def groups(
+        self, column: str, mask: np.ndarray
+    ) -> List[Tuple[Optional[str], np.ndarray]]:
+        """Row positions of the masked contigs grouped by the values of `column`
+
+        Parameters
+        ----------
+        column : str
+            Column with which to group contigs
+        mask : np.ndarray
+            Boolean mask of contigs to group (see `mask`)
+
+        Returns
+        -------
+        List[Tuple[Optional[str], np.ndarray]]
+            (group value, row positions) ordered by group value with missing
+            values (None) last
+        """
+        values = self.df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values, sort=True)
+        positions = np.flatnonzero(mask)
+        if not positions.size:
+            return []
+        # Missing values have code -1, move them after all other groups
+        codes = np.where(codes < 0, len(uniques), codes)[positions]
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+        names = [
+            uniques[code] if code < len(uniques) else None
+            for code in sorted_codes[np.r_[0, boundaries]]
+        ]
+        return list(zip(names, np.split(positions[order], boundaries)))
+
+    def category_codes(
+        self, column: str, mask: np.ndarray
+    ) -> Tuple[np.ndarray, List[Optional[str]], np.ndarray]:
+        """Dense integer codes of the values of `column` for the masked contigs
+
+        Parameters
+        ----------
+        column : str
+            Column with which to categorize contigs
+        mask : np.ndarray
+            Boolean mask of contigs to categorize (see `mask`)
+
+        Returns
+        -------
+        Tuple[np.ndarray, List[Optional[str]], np.ndarray]
+            Code of each masked contig, category of each code (None for missing
+            values) and number of contigs of each code, ranked from the most
+            to the least abundant category
+        """
+        values = self.df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values, sort=True)
+        # Missing values have code -1, count them as their own category
+        codes = np.where(codes < 0, len(uniques), codes)[mask]
+        counts = np.bincount(codes, minlength=len(uniques) + 1)
+        ranked = np.argsort(-counts, kind="stable")
+        ranked = ranked[counts[ranked] > 0]
+        ranks = np.empty(counts.size, dtype=np.uint32)
+        ranks[ranked] = np.arange(ranked.size)
+        categories = [uniques[code] if code < len(uniques) else None for code in ranked]
+        return ranks[codes], categories, counts[ranked]
+
+    def lineage_counts(self, ranks: List[str], mask: np.ndarray) -> pd.DataFrame:
+        """Number of masked contigs of each distinct lineage over `ranks`
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per observed lineage with columns `ranks` (missing taxa are
+            null) and `ContigSchema.CONTIG_COUNT`
+        """
+        return (
+            self.df.loc[mask, ranks]
+            .groupby(ranks, observed=True, dropna=False, sort=False)
+            .size()
+            .reset_index(name=ContigSchema.CONTIG_COUNT)
+        )
+
+    def mask(
+        self,
+        headers: Optional[Iterable[str]] = None,
+        coverage_range: Optional[Tuple[float, float]] = None,
+        exclude_refined: bool = False,
+        ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> np.ndarray:
+        """Boolean mask of contigs matching all provided filters
+
+        Parameters
+        ----------
+        headers : Optional[Iterable[str]], optional
+            Contig headers to keep, falsy values keep all contigs
+        coverage_range : Optional[Tuple[float, float]], optional
+            Inclusive (min, max) coverage range
+        exclude_refined : bool, optional
+            Whether to drop contigs in non-outdated user refinements
+        ranges : Optional[Dict[str, Tuple[float, float]]], optional
+            Inclusive (min, max) ranges keyed by numeric column (e.g. a viewport)
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array aligned with the cached rows
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if headers:
+            mask &= self.headers.isin(headers).to_numpy()
+        if coverage_range:
+            min_cov, max_cov = coverage_range
+            coverage = self.column(ContigSchema.COVERAGE)
+            mask &= (coverage >= min_cov) & (coverage <= max_cov)
+        if exclude_refined:
+            mask &= ~self.refined
+        for name, (min_value, max_value) in (ranges or {}).items():
+            values = self.column(name)
+            mask &= (values >= min_value) & (values <= max_value)
+        return mask
+
+
+def load_metagenome_contigs(metagenome_id: int) -> MetagenomeContigs:
+    marker_counts = (
+        select([Marker.contig_id, func.count(Marker.id).label("marker_count")])
+        .join(Contig)
+        .where(Contig.metagenome_id == metagenome_id)
+        .group_by(Marker.contig_id)
+        .subquery()
+    )
+    stmt = (
+        select(
+            Contig.id,
+            Contig.header,
+            Contig.cluster,
+            Contig.coverage,
+            Contig.gc_content,
+            Contig.length,
+            Contig.x_1,
+            Contig.x_2,
+            Contig.taxid,
+            func.coalesce(marker_counts.c.marker_count, 0),
+        )
+        .select_from(Contig)
+        .join(marker_counts, marker_counts.c.contig_id == Contig.id, isouter=True)
+        .where(Contig.metagenome_id == metagenome_id)
+        .order_by(Contig.id)
+    )
+    with Session(engine) as session:
+        results = session.exec(stmt).all()
+    columns = [
+        ContigSchema.CONTIG_ID,
+        ContigSchema.HEADER,
+        ContigSchema.CLUSTER,
+        ContigSchema.COVERAGE,
+        ContigSchema.GC_CONTENT,
+        ContigSchema.LENGTH,
+        ContigSchema.X_1,
+        ContigSchema.X_2,
+        ContigSchema.TAXID,
+        ContigSchema.MARKER_COUNT,
+    ]
+    df = pd.DataFrame.from_records(results, columns=columns)
+    df = add_marker_columns(df)
+    df = add_lineage_columns(df, load_lineages(metagenome_id))
+    df = df.astype({column: "category" for column in CATEGORICAL_COLUMNS})
+    return MetagenomeContigs(metagenome_id, df)
+
+
+def add_marker_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Marker symbol and size of each contig derived from its marker count
+
+    These match Contig.marker_symbol and Contig.marker_size (assigned by the
+    `assign_contigs_marker_attributes` task) but do not depend on that task
+    having finished before the contigs were cached.
+    """
+    marker_counts = df[ContigSchema.MARKER_COUNT].to_numpy()
+    codes = np.minimum(marker_counts, len(MARKER_SYMBOLS) - 1)
+    df[ContigSchema.MARKER_SYMBOL] = pd.Categorical.from_codes(
+        codes, categories=MARKER_SYMBOLS
+    )
+    df[ContigSchema.MARKER_SIZE] = np.array(MARKER_SIZES, dtype=np.uint8)[codes]
+    return df
+
+
+def load_lineages(metagenome_id: int) -> pd.DataFrame:
+    """Lineages referenced by the contigs of `metagenome_id` indexed by taxid"""
+    taxids = (
+        select(Contig.taxid).where(Contig.metagenome_id == metagenome_id).distinct()
+    )
+    stmt = select(
+        Lineage.taxid,
+        Lineage.superkingdom,
+        Lineage.phylum,
+        Lineage.klass,
+        Lineage.order,
+        Lineage.family,
+        Lineage.genus,
+        Lineage.species,
+    ).where(Lineage.taxid.in_(taxids))
+    with Session(engine) as session:
+        results = session.exec(stmt).all()
+    return pd.DataFrame.from_records(
+        results, columns=[ContigSchema.TAXID, *LINEAGE_COLUMNS]
+    ).set_index(ContigSchema.TAXID)
+
+
+def add_lineage_columns(df: pd.DataFrame, lineages: pd.DataFrame) -> pd.DataFrame:
+    """Expand the taxid of each contig into categorical rank columns
+
+    Each rank is dictionary-encoded over the (few) lineages and the contig
+    columns are built from integer codes, rank names are never repeated per
+    contig.
+    """
+    positions = lineages.index.get_indexer(df[ContigSchema.TAXID])
+    for rank in LINEAGE_COLUMNS:
+        codes, taxa = pd.factorize(lineages[rank])
+        # Contigs without a (known) taxid have position -1, i.e. a missing taxon
+        codes = np.append(codes, -1)[positions]
+        df[rank] = pd.Categorical.from_codes(codes, categories=taxa)
+    return df
+
+
+def load_contig_markers(metagenome_id: int, contig_ids: np.ndarray) -> ContigMarkers:
+    stmt = (
+        select(Marker.contig_id, Marker.sacc)
+        .join(Contig)
+        .where(Contig.metagenome_id == metagenome_id)
+    )
+    with Session(engine) as session:
+        results = session.exec(stmt).all()
+    df = pd.DataFrame.from_records(
+        results, columns=[ContigSchema.CONTIG_ID, MarkerSchema.SACC]
+    )
+    # contig_ids are sorted (see `load_metagenome_contigs`)
+    rows = np.searchsorted(contig_ids, df[ContigSchema.CONTIG_ID].to_numpy())
+    cols, accessions = pd.factorize(df[MarkerSchema.SACC], sort=True)
+    # Duplicate (contig, accession) entries are summed
+    counts = sparse.csr_matrix(
+        (np.ones(len(df), dtype=np.int32), (rows, cols)),
+        shape=(len(contig_ids), len(accessions)),
+    )
+    return ContigMarkers(counts, np.asarray(accessions, dtype=object))
+
+
+def get_refinements_generation(metagenome_id: int) -> Optional[int]:
+    """Refinement generation of `metagenome_id` (None when redis is unreachable)"""
+    try:
+        return result_cache.get_generation(metagenome_id)
+    except redis.RedisError:
+        return None
+
+
+@memoize
+def load_refinement_bitmaps(metagenome_id: int) -> RefinementBitmaps:
+    """Load the membership of every current refinement as row bitmaps
+
+    Contig rows (positions ordered by Contig.id) are numbered in the same
+    query, so bitmaps are consistent with the rows of `MetagenomeContigs`.
+    Bitmaps are memoized per refinement generation and shared between workers.
+    """
+    rows = (
+        select(
+            Contig.id,
+            (func.row_number().over(order_by=Contig.id) - 1).label("row"),
+        )
+        .where(Contig.metagenome_id == metagenome_id)
+        .subquery()
+    )
+    stmt = (
+        select(
+            ContigRefinementLink.refinement_id,
+            Refinement.initial_refinement,
+            rows.c.row,
+        )
+        .join(Refinement)
+        .join(rows, rows.c.id == ContigRefinementLink.contig_id)
+        .where(
+            Refinement.metagenome_id == metagenome_id,
+            Refinement.outdated == False,
+        )
+        .order_by(ContigRefinementLink.refinement_id)
+    )
+    with Session(engine) as session:
+        records = np.array(session.exec(stmt).all(), dtype=np.int64).reshape(-1, 3)
+    refinement_ids, starts = np.unique(records[:, 0], return_index=True)
+    members = np.split(records[:, 2], starts[1:])
+    bitmaps = {
+        int(refinement_id): RoaringBitmap.from_indices(rows)
+        for refinement_id, rows in zip(refinement_ids, members)
+    }
+    is_initial = records[starts, 1].astype(bool)
+    return RefinementBitmaps(bitmaps, refinement_ids[~is_initial].tolist())
+
+
+class ContigCache:
+    """LRU cache of `MetagenomeContigs` bounded by a memory budget
+
+    The most recently used metagenome is always retained, even if it alone
+    exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, MetagenomeContigs]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def nbytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def get(self, metagenome_id: int) -> MetagenomeContigs:
+        with self._lock:
+            if metagenome_id in self._entries:
+                self._entries.move_to_end(metagenome_id)
+                return self._entries[metagenome_id]
+        contigs = load_metagenome_contigs(metagenome_id)
+        with self._lock:
+            self._entries[metagenome_id] = contigs
+            self._entries.move_to_end(metagenome_id)
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                evicted_id, _ = self._entries.popitem(last=False)
+                logger.debug(f"Evicted metagenome {evicted_id} from contig cache")
+        return contigs
+
+    def invalidate_refinements(self, metagenome_id: int) -> None:
+        """Reload only the refinement membership of `metagenome_id` on next use"""
+        with self._lock:
+            if metagenome_id in self._entries:
+                self._entries[metagenome_id].invalidate_refinements()
+
+    def evict(self, metagenome_id: int) -> None:
+        with self._lock:
+            self._entries.pop(metagenome_id, None)
+
+
+contig_cache = ContigCache(max_bytes=settings.cache.contig_cache_max_bytes)
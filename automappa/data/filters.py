@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# Composable contig filters evaluated against cached contig columns
+import hashlib
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+if TYPE_CHECKING:
+    from automappa.data.cache import MetagenomeContigs
+
+
+class ContigFilter(BaseModel):
+    """Filters applied to the contigs of a metagenome
+
+    Parameters
+    ----------
+    metagenome_id : int
+        Metagenome of the contigs
+    coverage_range : Optional[Tuple[float, float]], optional
+        Inclusive (min, max) coverage range, by default None (all coverages)
+    exclude_refined : bool, optional
+        Whether to drop contigs in non-outdated user refinements, by default False
+    ranges : Dict[str, Tuple[float, float]], optional
+        Inclusive (min, max) ranges keyed by numeric contig column, e.g. the
+        visible window of a figure, by default {} (no ranges)
+    """
+
+    metagenome_id: int
+    coverage_range: Optional[Tuple[float, float]] = None
+    exclude_refined: bool = False
+    ranges: Dict[str, Tuple[float, float]] = {}
+
+    def mask(self, contigs: "MetagenomeContigs") -> np.ndarray:
+        """Evaluate this filter against the cached columns of `contigs`
+
+        Parameters
+        ----------
+        contigs : MetagenomeContigs
+            Cached contigs of `metagenome_id`
+
+        Returns
+        -------
+        np.ndarray
+            Boolean array aligned with the cached rows
+        """
+        return contigs.mask(
+            coverage_range=self.coverage_range,
+            exclude_refined=self.exclude_refined,
+            ranges=self.ranges,
+        )
+
+
+class ContigSelection(BaseModel):
+    """Contigs selected from a figure, resolved once and shared between components
+
+    Parameters
+    ----------
+    metagenome_id : int
+        Metagenome of the selected contigs
+    selection_id : str
+        Digest of `contig_ids`, identical selections share the same id
+    contig_ids : np.ndarray
+        Sorted unique ids of the selected contigs
+    """
+
+    metagenome_id: int
+    selection_id: str
+    contig_ids: np.ndarray
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_contig_ids(
+        cls, metagenome_id: int, contig_ids: Iterable[int]
+    ) -> "ContigSelection":
+        contig_ids = np.unique(np.asarray(list(contig_ids), dtype=np.int64))
+        digest = hashlib.blake2b(contig_ids.tobytes(), digest_size=16).hexdigest()
+        return cls(
+            metagenome_id=metagenome_id,
+            selection_id=f"{metagenome_id}-{digest}",
+            contig_ids=contig_ids,
+        )
+
+    def __len__(self) -> int:
+        return len(self.contig_ids)
@@ -1,14 +1,31 @@
 #!/usr/bin/env python
 # DataLoader for Autometa results ingestion
+import gzip
+import io
+import itertools
 import logging
 from pathlib import Path
+import time
 import uuid
 import pandas as pd
 
 from functools import partial, reduce
-from typing import Callable, List, Optional, Union
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
 
-from Bio import SeqIO
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from sqlalchemy import Integer, Table, and_, insert, literal, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
 from sqlmodel import Session, select, SQLModel
 
 from automappa.data.schemas import ContigSchema, CytoscapeConnectionSchema, MarkerSchema
@@ -19,12 +36,17 @@ from automappa.data.database import (
     engine,
     get_table_names,
 )
+from automappa.data.metrics import update_refinement_metrics
 from automappa.data.models import (
     Contig,
+    ContigRefinementLink,
+    ContigSequence,
     Marker,
     Metagenome,
     CytoscapeConnection,
+    Lineage,
     Refinement,
+    utc_now,
 )
 
 logging.basicConfig(level=logging.DEBUG)
@@ -38,6 +60,13 @@ h5py_logger.propagate = False
 
 
 Preprocessor = Callable[[pd.DataFrame], pd.DataFrame]
+ThroughputReport = Dict[str, Dict[str, float]]
+
+# Number of rows sent per COPY (or executemany) statement during bulk ingestion
+INGEST_BATCH_SIZE = 50_000
+# Number of FASTA records held in memory at a time during ingestion
+FASTA_CHUNKSIZE = 5_000
+GZIP_MAGIC_NUMBER = b"\x1f\x8b"
 
 
 def compose(*functions: Preprocessor) -> Preprocessor:
@@ -106,31 +135,64 @@ def validate_uploader(
     return uploaded_files[0]
 
 
+def open_fasta(fpath: str) -> TextIO:
+    """Open a (optionally gzip or bgzip compressed) FASTA file for reading"""
+    with open(fpath, "rb") as fh:
+        is_gzipped = fh.read(2) == GZIP_MAGIC_NUMBER
+    # NOTE: bgzip files are a series of gzip blocks and may be read with gzip
+    return gzip.open(fpath, "rt") if is_gzipped else open(fpath, "r")
+
+
+def iter_fasta_chunks(
+    fpath: str, chunksize: int = FASTA_CHUNKSIZE
+) -> Iterator[pd.DataFrame]:
+    """Stream FASTA records as DataFrames of at most `chunksize` records
+
+    Parameters
+    ----------
+    fpath : str
+        Path to FASTA file (may be gzip or bgzip compressed)
+    chunksize : int, optional
+        Maximum number of records per chunk, by default FASTA_CHUNKSIZE
+
+    Yields
+    ------
+    pd.DataFrame
+        columns=[header, seq] where header is the record id (first word of the title)
+    """
+    with open_fasta(fpath) as handle:
+        records = (
+            dict(header=title.split(None, 1)[0], seq=seq)
+            for title, seq in SimpleFastaParser(handle)
+        )
+        while chunk := list(itertools.islice(records, chunksize)):
+            yield pd.DataFrame(chunk, columns=[ContigSchema.HEADER, "seq"])
+
+
 def create_metagenome(
     name: str, fpath: Optional[str], contigs: Optional[List[Contig]]
 ) -> Metagenome:
     logger.info(f"Adding metagenome from {fpath} to db")
-    if not contigs:
-        contigs = [
-            Contig(header=record.id, seq=str(record.seq))
-            for record in SeqIO.parse(fpath, "fasta")
-        ]
-    else:
-        pass
-        # Need to ensure Seq column is in contigs otherwise add them
-        # contig_seq_df = pd.DataFrame(
-        #     [
-        #         dict(header=record.id, seq=str(record.seq))
-        #         for record in SeqIO.parse(metagenome_fpath, "fasta")
-        #     ]
-        # )
-        # merge_seq_column = partial(add_seq_column, seqrecord_df=contig_seq_df)
-    metagenome = Metagenome(name=name, contigs=contigs)
-    with Session(engine) as session:
-        session.add(metagenome)
-        session.commit()
-        session.refresh(metagenome)
-    return metagenome
+    if contigs:
+        metagenome = Metagenome(name=name, contigs=contigs)
+        with Session(engine) as session:
+            session.add(metagenome)
+            session.commit()
+            session.refresh(metagenome)
+        return metagenome
+    with engine.begin() as connection:
+        metagenome_id = connection.execute(
+            insert(Metagenome.__table__).values(name=name)
+        ).inserted_primary_key[0]
+        for chunk in iter_fasta_chunks(fpath):
+            copy_dataframe_to_table(
+                chunk.drop(columns=["seq"]).assign(metagenome_id=metagenome_id),
+                Contig.__table__,
+                connection,
+            )
+        contig_ids_df = read_contig_ids(connection, metagenome_id)
+        copy_contig_sequences(fpath, contig_ids_df, connection)
+    return read_metagenome(metagenome_id)
 
 
 def read_metagenome(metagenome_id: int) -> Metagenome:
@@ -237,6 +299,55 @@ async def create_contigs(fpath: str, markers: Optional[List[Marker]]) -> None:
     await contigs
 
 
+def copy_contig_sequences(
+    fpath: str, contig_ids_df: pd.DataFrame, connection: Connection
+) -> int:
+    """Stream sequences from `fpath` into the contig_sequence table
+
+    Parameters
+    ----------
+    fpath : str
+        Path to metagenome FASTA (may be gzip or bgzip compressed)
+    contig_ids_df : pd.DataFrame
+        columns=[header, contig_id] (see `read_contig_ids`), records not
+        present here are skipped
+    connection : Connection
+        connection with an open transaction (i.e. from ``engine.begin()``)
+
+    Returns
+    -------
+    int
+        Number of sequences written
+    """
+    contig_ids = contig_ids_df.set_index(ContigSchema.HEADER)
+    rows = 0
+    for chunk in iter_fasta_chunks(fpath):
+        chunk = chunk.join(contig_ids, on=ContigSchema.HEADER, how="inner")
+        rows += copy_dataframe_to_table(chunk, ContigSequence.__table__, connection)
+    return rows
+
+
+def read_contig_sequences(contig_ids: List[int]) -> Dict[int, str]:
+    """Fetch sequences on demand for the provided Contig.id values
+
+    Parameters
+    ----------
+    contig_ids : List[int]
+        Contig.id values to retrieve sequences
+
+    Returns
+    -------
+    Dict[int, str]
+        Contig.id keys with nucleotide sequence values
+    """
+    statement = select(ContigSequence.contig_id, ContigSequence.seq).where(
+        ContigSequence.contig_id.in_(contig_ids)
+    )
+    with Session(engine) as session:
+        results = session.exec(statement).all()
+    return {contig_id: seq for contig_id, seq in results}
+
+
 def read_contigs(headers: List[str] = []) -> List[Contig]:
     statement = select(Contig)
     if headers:
@@ -384,80 +495,263 @@ def delete_cytoscape_connection(connection: CytoscapeConnection) -> None:
         session.commit()
 
 
+def get_table_records(df: pd.DataFrame, table: Table) -> pd.DataFrame:
+    """Subset `df` to the columns of `table` (in table order)
+
+    Integer columns are cast to pandas nullable integers so missing values
+    are written as NULL rather than as floats (e.g. '1234.0').
+    """
+    columns = [column.name for column in table.columns if column.name in df.columns]
+    integer_columns = {
+        column.name: "Int64"
+        for column in table.columns
+        if column.name in df.columns and isinstance(column.type, Integer)
+    }
+    return df[columns].astype(integer_columns)
+
+
+def copy_dataframe_to_table(
+    df: pd.DataFrame, table: Table, connection: Connection
+) -> int:
+    """Bulk insert `df` into `table` without creating ORM objects
+
+    Postgres connections stream CSV batches with ``COPY ... FROM STDIN``,
+    other dialects fall back to batched ``executemany`` inserts.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        records to insert, columns not present in `table` are ignored
+    table : Table
+        destination table (e.g. ``Contig.__table__``)
+    connection : Connection
+        connection with an open transaction (i.e. from ``engine.begin()``)
+
+    Returns
+    -------
+    int
+        Number of rows inserted
+    """
+    df = get_table_records(df, table)
+    if df.empty:
+        return 0
+    is_postgres = connection.dialect.name == "postgresql"
+    if is_postgres:
+        preparer = connection.dialect.identifier_preparer
+        columns = ", ".join(preparer.quote(column) for column in df.columns)
+        statement = f"COPY {preparer.format_table(table)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    for start in range(0, len(df), INGEST_BATCH_SIZE):
+        batch = df.iloc[start : start + INGEST_BATCH_SIZE]
+        if is_postgres:
+            buffer = io.StringIO()
+            batch.to_csv(buffer, index=False, header=False)
+            buffer.seek(0)
+            cursor = connection.connection.cursor()
+            try:
+                cursor.copy_expert(statement, buffer)
+            finally:
+                cursor.close()
+        else:
+            records = batch.astype(object).where(batch.notna(), None)
+            connection.execute(insert(table), records.to_dict("records"))
+    return len(df)
+
+
+def copy_lineages(contig_df: pd.DataFrame, connection: Connection) -> int:
+    """Insert the distinct lineages of `contig_df` not yet in the lineage table
+
+    Lineages are written with ``INSERT ... ON CONFLICT (taxid) DO NOTHING`` so
+    concurrent ingestions sharing taxids do not fail on the primary key. A taxid
+    keeps the first lineage stored for it, differing lineages of the same taxid
+    (within `contig_df` or compared to the stored lineage) are logged.
+
+    Parameters
+    ----------
+    contig_df : pd.DataFrame
+        contigs with taxid and rank columns (see `rename_class_column_to_klass`)
+    connection : Connection
+        connection with an open transaction (i.e. from ``engine.begin()``)
+
+    Returns
+    -------
+    int
+        Number of lineages not yet stored (i.e. inserted by this ingestion)
+    """
+    lineage_df = get_table_records(
+        contig_df.dropna(subset=[ContigSchema.TAXID]), Lineage.__table__
+    ).drop_duplicates()
+    taxids = lineage_df[ContigSchema.TAXID]
+    conflicting_taxids = taxids[taxids.duplicated()].unique().tolist()
+    if conflicting_taxids:
+        logger.warning(
+            f"{len(conflicting_taxids):,} taxids have several lineages, keeping the"
+            f" first lineage of each: {conflicting_taxids[:10]}"
+        )
+    lineage_df = lineage_df.drop_duplicates(subset=ContigSchema.TAXID)
+    ranks = lineage_df.columns.drop(ContigSchema.TAXID).tolist()
+    stored_lineages = select(
+        *(Lineage.__table__.c[column] for column in lineage_df.columns)
+    ).where(Lineage.taxid.in_(lineage_df[ContigSchema.TAXID].tolist()))
+    stored_df = pd.DataFrame(
+        connection.execute(stored_lineages).all(), columns=lineage_df.columns
+    )
+    compared_df = lineage_df.merge(
+        stored_df, on=ContigSchema.TAXID, suffixes=("", "_stored")
+    )
+    is_different = (
+        compared_df[ranks].fillna("").to_numpy()
+        != compared_df[[f"{rank}_stored" for rank in ranks]].fillna("").to_numpy()
+    ).any(axis=1)
+    if is_different.any():
+        different_taxids = compared_df.loc[is_different, ContigSchema.TAXID].tolist()
+        logger.warning(
+            f"{len(different_taxids):,} taxids differ from their stored lineage,"
+            f" keeping the stored lineages: {different_taxids[:10]}"
+        )
+    is_stored = lineage_df[ContigSchema.TAXID].isin(stored_df[ContigSchema.TAXID])
+    lineage_df = lineage_df[~is_stored]
+    if lineage_df.empty:
+        return 0
+    dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(connection.dialect.name)
+    if dialect is not None:
+        statement = dialect.insert(Lineage.__table__).on_conflict_do_nothing(
+            index_elements=[Lineage.taxid]
+        )
+    else:
+        statement = insert(Lineage.__table__)
+    records = lineage_df.astype(object).where(lineage_df.notna(), None)
+    for start in range(0, len(records), INGEST_BATCH_SIZE):
+        batch = records.iloc[start : start + INGEST_BATCH_SIZE]
+        connection.execute(statement, batch.to_dict("records"))
+    return len(lineage_df)
+
+
+def get_throughput(rows: int, start: float) -> Dict[str, float]:
+    seconds = time.perf_counter() - start
+    rows_per_second = rows / seconds if seconds else float(rows)
+    return dict(
+        rows=rows, seconds=round(seconds, 3), rows_per_second=round(rows_per_second, 1)
+    )
+
+
+def read_contig_ids(connection: Connection, metagenome_id: int) -> pd.DataFrame:
+    """Retrieve (header, contig_id) pairs for all contigs of `metagenome_id`"""
+    statement = select(Contig.header, Contig.id).where(
+        Contig.metagenome_id == metagenome_id
+    )
+    return pd.DataFrame(
+        connection.execute(statement).all(),
+        columns=[ContigSchema.HEADER, "contig_id"],
+    )
+
+
+def add_contig_id_column(df: pd.DataFrame, contig_ids_df: pd.DataFrame) -> pd.DataFrame:
+    return pd.merge(
+        df,
+        contig_ids_df,
+        left_on=MarkerSchema.CONTIG,
+        right_on=ContigSchema.HEADER,
+        how="inner",
+    )
+
+
 def create_sample_metagenome(
     name: str,
     metagenome_fpath: str,
     binning_fpath: str,
     markers_fpath: str,
     connections_fpath: Optional[str] = None,
-) -> Metagenome:
-    logger.info(f"Creating Metagenome {name=}")
-    raw_markers = load_markers(markers_fpath)
-    marker_preprocessor = compose(
-        rename_qname_column_to_orf, agg_to_markers_list_column
-    )
-    contig_markers_df = marker_preprocessor(raw_markers)
+) -> Tuple[int, ThroughputReport]:
+    """Bulk ingest a sample's metagenome, binning, markers and connections
 
-    contig_seq_df = pd.DataFrame(
-        [
-            dict(header=record.id, seq=str(record.seq))
-            for record in SeqIO.parse(metagenome_fpath, "fasta")
-        ]
-    )
-    merge_seq_column = partial(add_seq_column, seqrecord_df=contig_seq_df)
-    merge_markers_column = partial(
-        add_markers_column, markers_list_df=contig_markers_df
-    )
+    Rows are streamed directly into their tables (see `copy_dataframe_to_table`)
+    within a single transaction, bypassing SQLModel object creation.
+
+    Lineages missing from the lineage table are written first, followed by the
+    contig attributes of the binning table. The metagenome FASTA is then read
+    in chunks (see `iter_fasta_chunks`) and each chunk is joined against the
+    inserted contig ids by header and written to the contig_sequence table
+    before the next chunk is read, so memory stays bounded regardless of
+    assembly size.
+
+    Returns
+    -------
+    Tuple[int, ThroughputReport]
+        Metagenome.id and the rows, seconds and rows/s written per table
+    """
+    logger.info(f"Creating Metagenome {name=}")
     contig_preprocessor = compose(
         rename_class_column_to_klass,
         rename_contig_column_to_header,
         replace_cluster_na_values_with_unclustered,
-        merge_seq_column,
-        merge_markers_column,
     )
-    raw_binning = load_contigs(binning_fpath)
-    contig_df = contig_preprocessor(raw_binning)
-    nonmarker_contigs_mask = contig_df.markers.isna()
-    nonmarker_contigs = [
-        Contig(**record)
-        for record in contig_df.loc[nonmarker_contigs_mask]
-        .drop(columns=["markers"])
-        .to_dict("records")
-    ]
-    marker_contigs = [
-        Contig(**record)
-        for record in contig_df.loc[~nonmarker_contigs_mask].to_dict("records")
-    ]
-    contigs = nonmarker_contigs + marker_contigs
-    # Add cytoscape connection mapping if available
-    if connections_fpath:
-        connections_df = load_cytoscape_connections(connections_fpath)
-        connections = [
-            CytoscapeConnection(**record)
-            for record in connections_df.to_dict("records")
-        ]
-    else:
-        connections = []
+    contig_df = contig_preprocessor(load_contigs(binning_fpath))
+    marker_df = rename_qname_column_to_orf(load_markers(markers_fpath))
+
+    throughput = {}
+    with engine.begin() as connection:
+        metagenome_id = connection.execute(
+            insert(Metagenome.__table__).values(name=name)
+        ).inserted_primary_key[0]
+
+        # Rank names are stored once per taxid, contigs only keep the taxid
+        start = time.perf_counter()
+        rows = copy_lineages(contig_df, connection)
+        throughput[Lineage.__tablename__] = get_throughput(rows, start)
+
+        start = time.perf_counter()
+        rows = copy_dataframe_to_table(
+            contig_df.assign(metagenome_id=metagenome_id),
+            Contig.__table__,
+            connection,
+        )
+        throughput[Contig.__tablename__] = get_throughput(rows, start)
+        contig_ids_df = read_contig_ids(connection, metagenome_id)
+
+        start = time.perf_counter()
+        rows = copy_contig_sequences(metagenome_fpath, contig_ids_df, connection)
+        throughput[ContigSequence.__tablename__] = get_throughput(rows, start)
+
+        start = time.perf_counter()
+        marker_df = add_contig_id_column(marker_df, contig_ids_df)
+        rows = copy_dataframe_to_table(marker_df, Marker.__table__, connection)
+        throughput[Marker.__tablename__] = get_throughput(rows, start)
+
+        # Add cytoscape connection mapping if available
+        if connections_fpath:
+            connections_df = load_cytoscape_connections(connections_fpath)
+            start = time.perf_counter()
+            rows = copy_dataframe_to_table(
+                connections_df.assign(metagenome_id=metagenome_id),
+                CytoscapeConnection.__table__,
+                connection,
+            )
+            throughput[CytoscapeConnection.__tablename__] = get_throughput(
+                rows, start
+            )
 
-    metagenome = Metagenome(
-        name=name, contigs=contigs, connections=connections, refinements=[]
-    )
-    with Session(engine) as session:
-        session.add(metagenome)
-        session.commit()
-        session.refresh(metagenome)
-    return metagenome
+    for table, report in throughput.items():
+        logger.info(
+            f"Ingested {report['rows']:,} {table} rows ({report['rows_per_second']:,} rows/s)"
+        )
+    return metagenome_id, throughput
 
 
 def create_initial_refinements(metagenome_id: int) -> None:
     """Initialize Contig.refinements for contigs with Contig.cluster values
 
+    All initial Refinement rows are inserted with one ``INSERT ... SELECT``
+    over the metagenome's distinct clusters and ContigRefinementLink is
+    populated with a second ``INSERT ... SELECT`` joining contigs to their
+    new refinement by cluster. The RefinementMetrics of the new refinements
+    are written in the same transaction.
+
     Parameters
     ----------
     metagenome_id : int
         Metagenome.id value corresponding to Contigs
     """
-    clusters_stmt = (
+    clusters = (
         select([Contig.cluster])
         .where(
             Contig.metagenome_id == metagenome_id,
@@ -466,22 +760,98 @@ def create_initial_refinements(metagenome_id: int) -> None:
             Contig.cluster != "unclustered",
         )
         .distinct()
+        .subquery()
     )
-    with Session(engine) as session:
-        clusters = session.exec(clusters_stmt).all()
+    refinements_stmt = insert(Refinement.__table__).from_select(
+        ["cluster", "metagenome_id", "timestamp", "outdated", "initial_refinement"],
+        select(
+            [
+                clusters.c.cluster,
+                literal(metagenome_id),
+                literal(utc_now()),
+                literal(False),
+                literal(True),
+            ]
+        ),
+    )
+    links_stmt = insert(ContigRefinementLink.__table__).from_select(
+        ["refinement_id", "contig_id"],
+        select([Refinement.id, Contig.id])
+        .select_from(Contig)
+        .join(
+            Refinement,
+            and_(
+                Refinement.metagenome_id == Contig.metagenome_id,
+                Refinement.cluster == Contig.cluster,
+            ),
+        )
+        .where(
+            Contig.metagenome_id == metagenome_id,
+            Refinement.initial_refinement == True,
+        ),
+    )
+    with engine.begin() as connection:
+        connection.execute(refinements_stmt)
+        connection.execute(links_stmt)
+        update_refinement_metrics(
+            connection,
+            Refinement.metagenome_id == metagenome_id,
+            Refinement.initial_refinement == True,
+        )
 
-        for cluster in clusters:
-            contigs_stmt = select(Contig).where(Contig.cluster == cluster)
-            contigs = session.exec(contigs_stmt).all()
 
-            refinement = Refinement(
-                contigs=contigs,
-                outdated=False,
-                initial_refinement=True,
-                metagenome_id=metagenome_id,
-            )
-            session.add(refinement)
-        session.commit()
+def create_refinement(metagenome_id: int, contig_ids: Iterable[int]) -> int:
+    """Save contigs as a new user refinement, outdating the refinements they overlap
+
+    Overlapping refinements are outdated with one ``UPDATE ... WHERE id IN
+    (SELECT refinement_id ...)``, the refinement is inserted with one
+    ``INSERT`` and its ContigRefinementLink rows with one ``INSERT ... SELECT``
+    (along with its RefinementMetrics) in a single short transaction. No ORM
+    objects are loaded and only the overlapping refinement rows are locked.
+
+    Parameters
+    ----------
+    metagenome_id : int
+        Metagenome.id of the contigs
+    contig_ids : Iterable[int]
+        Contig.id values of the refinement
+
+    Returns
+    -------
+    int
+        Refinement.id of the new refinement
+    """
+    contig_ids = [int(contig_id) for contig_id in contig_ids]
+    overlapping = select([ContigRefinementLink.refinement_id]).where(
+        ContigRefinementLink.contig_id.in_(contig_ids)
+    )
+    outdate_stmt = (
+        update(Refinement.__table__)
+        .where(
+            Refinement.metagenome_id == metagenome_id,
+            Refinement.outdated == False,
+            Refinement.id.in_(overlapping),
+        )
+        .values(outdated=True)
+    )
+    refinement_stmt = insert(Refinement.__table__).values(
+        metagenome_id=metagenome_id,
+        timestamp=utc_now(),
+        outdated=False,
+        initial_refinement=False,
+    )
+    with engine.begin() as connection:
+        connection.execute(outdate_stmt)
+        refinement_id = connection.execute(refinement_stmt).inserted_primary_key[0]
+        links_stmt = insert(ContigRefinementLink.__table__).from_select(
+            ["refinement_id", "contig_id"],
+            select([literal(refinement_id), Contig.id]).where(
+                Contig.metagenome_id == metagenome_id, Contig.id.in_(contig_ids)
+            ),
+        )
+        connection.execute(links_stmt)
+        update_refinement_metrics(connection, Refinement.id == refinement_id)
+    return refinement_id
 
 
 def main():
@@ -492,21 +862,21 @@ def main():
 
     # CRUD sample (this will take some time with the connection mapping...)
     # NOTE: Create two samples for testing...
-    sponge_mg = create_sample_metagenome(
+    sponge_mg_id, _ = create_sample_metagenome(
         name="lasonolide",
         metagenome_fpath="data/lasonolide/metagenome.filtered.fna",
         binning_fpath="data/lasonolide/binning.tsv",
         markers_fpath="data/lasonolide/bacteria.markers.tsv",
         # connections_fpath="data/lasonolide/cytoscape.connections.tab",
     )
-    create_initial_refinements(sponge_mg.id)
-    nubbins_mg = create_sample_metagenome(
+    create_initial_refinements(sponge_mg_id)
+    nubbins_mg_id, _ = create_sample_metagenome(
         name="nubbins",
         metagenome_fpath="data/nubbins/scaffolds.fasta",
         binning_fpath="data/nubbins/nubbins.tsv",
         markers_fpath="data/nubbins/bacteria.markers.tsv",
     )
-    create_initial_refinements(nubbins_mg.id)
+    create_initial_refinements(nubbins_mg_id)
 
 
 if __name__ == "__main__":
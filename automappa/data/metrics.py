@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# Per-refinement metrics, computed once when refinement membership is written
+import logging
+from typing import Dict, Iterable, List, Literal, Mapping, Tuple, Union
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import ColumnElement
+
+from automappa.data.models import (
+    Contig,
+    ContigRefinementLink,
+    Marker,
+    Refinement,
+    RefinementMetrics,
+)
+
+logger = logging.getLogger(__name__)
+
+MARKER_SET_SIZE = 139
+HIGH_QUALITY_COMPLETENESS = 90  # gt
+HIGH_QUALITY_PURITY = 95  # gt
+MEDIUM_QUALITY_COMPLETENESS = 50  # gte
+MEDIUM_QUALITY_PURITY = 90  # gt
+# lt
+LOW_QUALITY_COMPLETENESS = 50
+LOW_QUALITY_PURITY = 90
+
+MimagTier = Literal["high_quality", "medium_quality", "low_quality"]
+
+
+def get_completeness_purity(
+    unique_marker_count: int, markers_count: int
+) -> Tuple[float, float]:
+    completeness = round(unique_marker_count / MARKER_SET_SIZE * 100, 2)
+    purity = (
+        round(unique_marker_count / markers_count * 100, 2) if markers_count else 0
+    )
+    return completeness, purity
+
+
+def get_mimag_tier(completeness: float, purity: float) -> MimagTier:
+    """MIMAG tier of a cluster
+
+    - High-quality >90% complete > 95% pure
+    - Medium-quality >=50% complete > 90% pure
+    - Low-quality <50% complete < 90% pure
+    """
+    if completeness > HIGH_QUALITY_COMPLETENESS and purity > HIGH_QUALITY_PURITY:
+        return "high_quality"
+    if completeness >= MEDIUM_QUALITY_COMPLETENESS and purity > MEDIUM_QUALITY_PURITY:
+        return "medium_quality"
+    # completeness < LOW_QUALITY_COMPLETENESS and purity < LOW_QUALITY_PURITY:
+    return "low_quality"
+
+
+def get_refinement_summaries_stmt(*clauses: ColumnElement) -> Select:
+    """Summarize every refinement matching `clauses` in a single grouped statement
+
+    Contig statistics (count, length sum and N50) and marker statistics (total
+    and distinct accessions) are grouped by refinement in separate subqueries,
+    so joining markers never multiplies contig lengths, and are then joined to
+    the refinements. N50 is the largest length at which the cumulative length
+    (longest first) reaches half of the refinement's length sum.
+
+    Parameters
+    ----------
+    *clauses : ColumnElement
+        Predicates on `Refinement`, e.g. ``Refinement.outdated == False``
+
+    Returns
+    -------
+    Select
+        Rows of (refinement_id, metagenome_id, contig_count, length_sum, n50,
+        marker_count, unique_marker_count)
+    """
+    refinement_ids = select(Refinement.id).where(*clauses)
+    refinement_id = ContigRefinementLink.refinement_id
+    length = func.coalesce(Contig.length, 0)
+    contigs = (
+        select(
+            refinement_id,
+            length.label("length"),
+            func.sum(length)
+            .over(partition_by=refinement_id, order_by=(length.desc(), Contig.id))
+            .label("cumulative_length"),
+            func.sum(length).over(partition_by=refinement_id).label("total_length"),
+        )
+        .join(Contig, Contig.id == ContigRefinementLink.contig_id)
+        .where(refinement_id.in_(refinement_ids))
+        .subquery()
+    )
+    is_past_half = contigs.c.cumulative_length * 2 >= contigs.c.total_length
+    contig_stats = (
+        select(
+            contigs.c.refinement_id,
+            func.count().label("contig_count"),
+            func.sum(contigs.c.length).label("length_sum"),
+            func.max(case([(is_past_half, contigs.c.length)])).label("n50"),
+        )
+        .group_by(contigs.c.refinement_id)
+        .subquery()
+    )
+    marker_stats = (
+        select(
+            refinement_id,
+            func.count(Marker.id).label("marker_count"),
+            func.count(func.distinct(Marker.sacc)).label("unique_marker_count"),
+        )
+        .join(Marker, Marker.contig_id == ContigRefinementLink.contig_id)
+        .where(refinement_id.in_(refinement_ids))
+        .group_by(refinement_id)
+        .subquery()
+    )
+    return (
+        select(
+            Refinement.id.label("refinement_id"),
+            Refinement.metagenome_id,
+            func.coalesce(contig_stats.c.contig_count, 0).label("contig_count"),
+            func.coalesce(contig_stats.c.length_sum, 0).label("length_sum"),
+            func.coalesce(contig_stats.c.n50, 0).label("n50"),
+            func.coalesce(marker_stats.c.marker_count, 0).label("marker_count"),
+            func.coalesce(marker_stats.c.unique_marker_count, 0).label(
+                "unique_marker_count"
+            ),
+        )
+        .outerjoin(contig_stats, contig_stats.c.refinement_id == Refinement.id)
+        .outerjoin(marker_stats, marker_stats.c.refinement_id == Refinement.id)
+        .where(*clauses)
+    )
+
+
+def get_metrics_records(
+    summaries: Iterable[Mapping[str, int]]
+) -> List[Dict[str, Union[int, float, str]]]:
+    """`RefinementMetrics` records of refinement summaries
+
+    Parameters
+    ----------
+    summaries : Iterable[Mapping[str, int]]
+        Rows of `get_refinement_summaries_stmt`
+
+    Returns
+    -------
+    List[Dict[str, Union[int, float, str]]]
+        Summaries with their completeness, purity and MIMAG tier
+    """
+    records = []
+    for summary in summaries:
+        completeness, purity = get_completeness_purity(
+            summary["unique_marker_count"], summary["marker_count"]
+        )
+        records.append(
+            dict(
+                summary,
+                completeness=completeness,
+                purity=purity,
+                mimag_tier=get_mimag_tier(completeness, purity),
+            )
+        )
+    return records
+
+
+def update_refinement_metrics(connection: Connection, *clauses: ColumnElement) -> int:
+    """(Re)compute the `RefinementMetrics` of the refinements matching `clauses`
+
+    Only refinements whose contig membership was written (i.e. newly created)
+    need to be passed, metrics of every other refinement are left untouched.
+
+    Parameters
+    ----------
+    connection : Connection
+        Connection (within the transaction) that wrote the refinements
+    *clauses : ColumnElement
+        Predicates on `Refinement` selecting the refinements to update,
+        e.g. ``Refinement.id == refinement_id``
+
+    Returns
+    -------
+    int
+        Number of refinements updated
+    """
+    summaries = connection.execute(get_refinement_summaries_stmt(*clauses))
+    rows = get_metrics_records(summaries.mappings())
+    if not rows:
+        return 0
+    refinement_ids = [row["refinement_id"] for row in rows]
+    connection.execute(
+        delete(RefinementMetrics).where(
+            RefinementMetrics.refinement_id.in_(refinement_ids)
+        )
+    )
+    connection.execute(insert(RefinementMetrics.__table__), rows)
+    logger.debug(f"Updated metrics of {len(rows):,} refinements")
+    return len(rows)
+
+
+def read_refinement_metrics(
+    connection: Connection, *clauses: ColumnElement
+) -> List[Dict[str, Union[int, float, str]]]:
+    """Metrics of the refinements matching `clauses`
+
+    Stored `RefinementMetrics` are read, refinements without stored metrics
+    (e.g. saved before metrics were written with their membership) are
+    summarized with `get_refinement_summaries_stmt` instead, so no refinement
+    is missing.
+
+    Parameters
+    ----------
+    connection : Connection
+        Connection to read the metrics with
+    *clauses : ColumnElement
+        Predicates on `Refinement`, e.g. ``Refinement.outdated == False``
+
+    Returns
+    -------
+    List[Dict[str, Union[int, float, str]]]
+        `RefinementMetrics` records ordered by refinement_id
+    """
+    refinement_ids = select(Refinement.id).where(*clauses)
+    stored = connection.execute(
+        select(RefinementMetrics.__table__).where(
+            RefinementMetrics.refinement_id.in_(refinement_ids)
+        )
+    )
+    records = [dict(metrics) for metrics in stored.mappings()]
+    missing = connection.execute(
+        get_refinement_summaries_stmt(*clauses, ~Refinement.metrics.has())
+    )
+    records += get_metrics_records(missing.mappings())
+    return sorted(records, key=lambda metrics: metrics["refinement_id"])
@@ -14,6 +14,9 @@ class Metagenome(SQLModel, table=True):
     contigs: List["Contig"] = Relationship(back_populates="metagenome")
     refinements: List["Refinement"] = Relationship(back_populates="metagenome")
     connections: List["CytoscapeConnection"] = Relationship(back_populates="metagenome")
+    refinement_metrics: List["RefinementMetrics"] = Relationship(
+        back_populates="metagenome"
+    )
 
 
 class ContigRefinementLink(SQLModel, table=True):
@@ -30,17 +33,61 @@ class Refinement(SQLModel, table=True):
     timestamp: datetime = Field(default=utc_now(), index=True)
     outdated: bool = False
     initial_refinement: bool = False
+    # Contig.cluster value an initial refinement was created from
+    cluster: Optional[str] = Field(default=None, index=True)
     contigs: List["Contig"] = Relationship(
         back_populates="refinements", link_model=ContigRefinementLink
     )
     metagenome_id: Optional[int] = Field(default=None, foreign_key="metagenome.id")
     metagenome: Optional[Metagenome] = Relationship(back_populates="refinements")
+    metrics: Optional["RefinementMetrics"] = Relationship(
+        back_populates="refinement",
+        sa_relationship_kwargs=dict(uselist=False, cascade="all, delete-orphan"),
+    )
+
+
+class RefinementMetrics(SQLModel, table=True):
+    # NOTE: Written together with a refinement's contig membership (see
+    # automappa.data.metrics.update_refinement_metrics) so summaries are reads
+    __tablename__ = "refinement_metrics"
+    refinement_id: Optional[int] = Field(
+        default=None, foreign_key="refinement.id", primary_key=True
+    )
+    metagenome_id: Optional[int] = Field(
+        default=None, foreign_key="metagenome.id", index=True
+    )
+    contig_count: int
+    length_sum: int
+    n50: int
+    marker_count: int
+    unique_marker_count: int
+    completeness: float
+    purity: float
+    # Literal["high_quality", "medium_quality", "low_quality"]
+    mimag_tier: str = Field(index=True)
+    refinement: Optional[Refinement] = Relationship(back_populates="metrics")
+    metagenome: Optional[Metagenome] = Relationship(
+        back_populates="refinement_metrics"
+    )
+
+
+class Lineage(SQLModel, table=True):
+    # NOTE: Lineages are shared between metagenomes and referenced by contigs
+    # through their taxid rather than repeating rank names on every contig
+    taxid: int = Field(primary_key=True)
+    superkingdom: Optional[str]
+    phylum: Optional[str]
+    klass: Optional[str]
+    order: Optional[str]
+    family: Optional[str]
+    genus: Optional[str]
+    species: Optional[str]
+    contigs: List["Contig"] = Relationship(back_populates="lineage")
 
 
 class Contig(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     header: str = Field(index=True)
-    seq: Optional[str]
     cluster: Optional[str] = Field(index=True)
     completeness: Optional[float]
     purity: Optional[float]
@@ -49,14 +96,7 @@ class Contig(SQLModel, table=True):
     coverage: Optional[float] = Field(index=True)
     gc_content: Optional[float]
     length: Optional[int]
-    superkingdom: Optional[str]
-    phylum: Optional[str]
-    klass: Optional[str]
-    order: Optional[str]
-    family: Optional[str]
-    genus: Optional[str]
-    species: Optional[str]
-    taxid: Optional[int]
+    taxid: Optional[int] = Field(default=None, foreign_key="lineage.taxid", index=True)
     x_1: Optional[float]
     x_2: Optional[float]
     marker_symbol: Optional[str]
@@ -66,7 +106,22 @@ class Contig(SQLModel, table=True):
     )
     metagenome_id: Optional[int] = Field(default=None, foreign_key="metagenome.id")
     metagenome: Optional[Metagenome] = Relationship(back_populates="contigs")
+    lineage: Optional[Lineage] = Relationship(back_populates="contigs")
     markers: Optional[List["Marker"]] = Relationship(back_populates="contig")
+    # NOTE: Sequences are kept in their own table so selecting Contig
+    # entities never transfers sequence data unless explicitly requested
+    sequence: Optional["ContigSequence"] = Relationship(
+        back_populates="contig", sa_relationship_kwargs=dict(uselist=False)
+    )
+
+
+class ContigSequence(SQLModel, table=True):
+    __tablename__ = "contig_sequence"
+    contig_id: Optional[int] = Field(
+        default=None, foreign_key="contig.id", primary_key=True
+    )
+    seq: str
+    contig: Optional[Contig] = Relationship(back_populates="sequence")
 
 
 class Marker(SQLModel, table=True):
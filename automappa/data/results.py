@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# Data source results memoized in redis and shared between web workers
+import functools
+import hashlib
+import hmac
+import inspect
+import logging
+import pickle
+import secrets
+from typing import Any, Callable, Dict, Literal, Optional, TypeVar
+
+import numpy as np
+import redis
+from pydantic import BaseModel
+
+from automappa import settings
+from automappa.data.filters import ContigSelection
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "automappa:results"
+# Size of the HMAC-SHA256 signature prefixed to every memoized result
+SIGNATURE_SIZE = 32
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def get_key_part(value: Any) -> str:
+    """Canonical (process independent) representation of a method argument
+
+    Selections are identified by their digest, other models by their sorted
+    fields and arrays by a digest of their contents.
+    """
+    if isinstance(value, ContigSelection):
+        return value.selection_id
+    if isinstance(value, BaseModel):
+        return get_key_part(value.dict())
+    if isinstance(value, np.ndarray):
+        digest = hashlib.blake2b(value.tobytes(), digest_size=16).hexdigest()
+        return f"{value.dtype}:{digest}"
+    if isinstance(value, dict):
+        items = sorted(value.items(), key=lambda item: repr(item[0]))
+        return "{%s}" % ",".join(f"{key!r}:{get_key_part(v)}" for key, v in items)
+    if isinstance(value, (set, frozenset)):
+        return "{%s}" % ",".join(sorted(get_key_part(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ",".join(get_key_part(v) for v in value)
+    return repr(value)
+
+
+def get_metagenome_id(arguments: Dict[str, Any]) -> Optional[int]:
+    """Metagenome of a call, either passed directly or carried by a filter/selection"""
+    if arguments.get("metagenome_id") is not None:
+        return arguments["metagenome_id"]
+    for value in arguments.values():
+        metagenome_id = getattr(value, "metagenome_id", None)
+        if metagenome_id is not None:
+            return metagenome_id
+    return None
+
+
+class ResultCache:
+    """Memoize data source methods in redis
+
+    Results are keyed by method, (canonical) arguments and the refinement
+    generation of the metagenome. Writes to a metagenome (saving or clearing
+    refinements, ingestion) bump its generation so stale entries are never read
+    again and simply expire after `ttl` seconds.
+
+    Every result expires, so the total size of memoized results is bounded by
+    the ``maxmemory`` of the redis instance with the ``volatile-lru`` eviction
+    policy (see docker-compose.yml): results are evicted under memory pressure
+    while generations (which never expire) are kept.
+
+    Results are pickled. Unpickling runs arbitrary code, so entries are signed
+    with an HMAC of `signing_key` and entries with an invalid signature are
+    discarded. Whoever knows `signing_key` and can write to redis can still
+    run code in the web workers, i.e. redis and the key must remain private.
+    Without a configured key results are signed with a random key of this
+    process, i.e. they are not shared with other workers.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Whether results are memoized at all, by default True
+    ttl : int, optional
+        Seconds a result is kept, by default 3600
+    max_entry_bytes : Optional[int], optional
+        Results larger than this (pickled) are not stored, by default None (no cap)
+    signing_key : Optional[str], optional
+        Secret signing the memoized results (shared by all workers), by default
+        None (a random key per process)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl: int = 3600,
+        max_entry_bytes: Optional[int] = None,
+        signing_key: Optional[str] = None,
+    ) -> None:
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        if not signing_key:
+            # NOTE: Never sign with an empty key, anyone able to write to redis
+            # could then forge results that are unpickled by the workers
+            logger.warning(
+                "No results signing key configured (CACHE_RESULTS_SIGNING_KEY),"
+                " memoized results are not shared between processes"
+            )
+            signing_key = secrets.token_hex(32)
+        self._signing_key = signing_key.encode()
+        # Entries signed with another key (e.g. by another process) are not read
+        self._key_id = self._sign(KEY_PREFIX.encode()).hex()[:16]
+        self._client: Optional[redis.Redis] = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis(
+                host=settings.redis.host,
+                port=settings.redis.port,
+                db=settings.redis.db,
+                # Fall back to computing results quickly when redis is down
+                socket_connect_timeout=1,
+            )
+        return self._client
+
+    def _generation_key(self, metagenome_id: int) -> str:
+        return f"{KEY_PREFIX}:generation:{metagenome_id}"
+
+    def get_generation(self, metagenome_id: int) -> int:
+        generation = self.client.get(self._generation_key(metagenome_id))
+        return int(generation) if generation else 0
+
+    def bump_generation(self, metagenome_id: int) -> None:
+        """Invalidate every memoized result of `metagenome_id`"""
+        try:
+            self.client.incr(self._generation_key(metagenome_id))
+        except redis.RedisError as err:
+            logger.error(f"Failed to invalidate results of {metagenome_id}: {err}")
+
+    def _sign(self, value: bytes) -> bytes:
+        return hmac.new(self._signing_key, value, hashlib.sha256).digest()
+
+    def dumps(self, result: Any) -> bytes:
+        value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        return self._sign(value) + value
+
+    def loads(self, cached: bytes) -> Any:
+        """Unpickle a memoized result
+
+        Raises
+        ------
+        ValueError
+            `cached` was not signed with the signing key of this cache
+        """
+        signature, value = cached[:SIGNATURE_SIZE], cached[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(value)):
+            raise ValueError("Invalid signature")
+        return pickle.loads(value)
+
+    def get_stats(self) -> Dict[str, Dict[Literal["hits", "misses"], int]]:
+        """Hit and miss counts per memoized method"""
+        hits = self.client.hgetall(f"{KEY_PREFIX}:hits")
+        misses = self.client.hgetall(f"{KEY_PREFIX}:misses")
+        return {
+            method.decode(): dict(
+                hits=int(hits.get(method, 0)), misses=int(misses.get(method, 0))
+            )
+            for method in sorted(hits.keys() | misses.keys())
+        }
+
+    def memoize(self, func: F) -> F:
+        """Decorate a data source method to share its results between workers
+
+        The metagenome is taken from a `metagenome_id` argument or from any
+        argument carrying one (e.g. `ContigFilter`, `ContigSelection`). The
+        method is simply called when caching is disabled or redis is unreachable.
+        """
+        signature = inspect.signature(func)
+        method = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {
+                name: value for name, value in bound.arguments.items() if name != "self"
+            }
+            metagenome_id = get_metagenome_id(arguments)
+            if metagenome_id is None:
+                return func(*args, **kwargs)
+            digest = hashlib.blake2b(
+                get_key_part(arguments).encode(), digest_size=16
+            ).hexdigest()
+            try:
+                generation = self.get_generation(metagenome_id)
+                namespace = f"{KEY_PREFIX}:{method}:{self._key_id}"
+                key = f"{namespace}:{metagenome_id}:{generation}:{digest}"
+                cached = self.client.get(key)
+                if cached is not None:
+                    result = self.loads(cached)
+                    self.client.hincrby(f"{KEY_PREFIX}:hits", method)
+                    return result
+            except redis.RedisError as err:
+                logger.warning(f"Result cache unavailable for {method}: {err}")
+                return func(*args, **kwargs)
+            except ValueError:
+                # Recomputed and overwritten below
+                logger.error(f"Discarded {method} result with an invalid signature")
+            result = func(*args, **kwargs)
+            value = self.dumps(result)
+            pipeline = self.client.pipeline(transaction=False)
+            pipeline.hincrby(f"{KEY_PREFIX}:misses", method)
+            if self.max_entry_bytes is None or len(value) <= self.max_entry_bytes:
+                pipeline.set(key, value, ex=self.ttl)
+            try:
+                pipeline.execute()
+            except redis.RedisError as err:
+                logger.warning(f"Failed to cache result of {method}: {err}")
+            return result
+
+        return wrapper
+
+
+result_cache = ResultCache(
+    enabled=settings.cache.results_enabled,
+    ttl=settings.cache.results_ttl,
+    max_entry_bytes=settings.cache.results_max_entry_bytes,
+    signing_key=settings.cache.results_signing_key or settings.redis.password,
+)
+memoize = result_cache.memoize
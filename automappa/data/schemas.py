@@ -25,6 +25,11 @@ class ContigSchema:
     TAXID = "taxid"
     X_1 = "x_1"
     X_2 = "x_2"
+    CONTIG_ID = "contig_id"
+    MARKER_SYMBOL = "marker_symbol"
+    MARKER_SIZE = "marker_size"
+    MARKER_COUNT = "marker_count"
+    CONTIG_COUNT = "contig_count"
 
 
 class MarkerSchema:
@@ -2,60 +2,24 @@ from dash_iconify import DashIconify
 import dash_mantine_components as dmc
 
 from automappa.components import ids
-from typing import Optional, Protocol, Tuple, Union
-
-
-class SampleCardDataSource(Protocol):
-    def get_metagenome_name(self, metagenome_id: int) -> str:
-        """Get Metagenome.name where Metagenome.id == metagenome_id"""
-        ...
-
-    def contig_count(self, metagenome_id: int) -> int:
-        ...
-
-    def marker_count(self, metagenome_id: int) -> int:
-        ...
-
-    def connections_count(self, metagenome_id: int) -> int:
-        ...
-
-    def get_approximate_marker_sets(self, metagenome_id: int) -> int:
-        ...
-
-    def get_mimag_counts(self, metagenome_id: int) -> Tuple[int, int, int]:
-        """Retrieve counts of clusters following MIMAG standards.
-
-        standards:
-
-        - High-quality >90% complete > 95% pure
-        - Medium-quality >=50% complete > 90% pure
-        - Low-quality <50% complete < 90% pure
-
-        """
-        ...
-
-    def get_refinements_count(
-        self, metagenome_id: int, initial: Optional[bool], outdated: Optional[bool]
-    ) -> int:
-        """Get Refinement count where Refinement.metagenome_id == metagenome_id
-
-        Providing `initial` will add where(Refinement.initial_refinement == True)
-        otherwise will omit this filter
-
-        Providing `outdated` will add where(Refinement.outdated == outdated)
-        otherwise will omit this filter
-        """
-        ...
-
-    def get_refined_contig_count(self, metagenome_id: int) -> int:
-        ...
+from typing import Dict, Union
 
 
 def get_badge(label: str, id: dict[str, Union[str, int]], color: str) -> dmc.Badge:
     return dmc.Badge(label, id=id, color=color, variant="dot", size="xs")
 
 
-def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
+def render(metagenome_id: int, summary: Dict[str, Union[str, int]]) -> dmc.Card:
+    """Render the card of a sample from its precomputed statistics
+
+    Parameters
+    ----------
+    metagenome_id : int
+        Metagenome of the sample
+    summary : Dict[str, Union[str, int]]
+        Card statistics of the metagenome, e.g. from
+        `HomeDataSource.get_sample_card_summaries`
+    """
     metagenome_badge = get_badge(
         label=ids.SAMPLE_CARD_METAGENOME_BADGE_LABEL,
         id={
@@ -64,7 +28,7 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         },
         color="lime",
     )
-    contig_count = source.contig_count(metagenome_id)
+    contig_count = summary["contig_count"]
     binning_badge = get_badge(
         label=f"{ids.SAMPLE_CARD_BINNING_BADGE_LABEL}: {contig_count:,}",
         id={
@@ -73,7 +37,7 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         },
         color="lime",
     )
-    marker_count = source.marker_count(metagenome_id)
+    marker_count = summary["marker_count"]
     marker_badge = get_badge(
         label=f"{ids.SAMPLE_CARD_MARKERS_BADGE_LABEL}: {marker_count:,}",
         id={
@@ -82,7 +46,7 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         },
         color="lime",
     )
-    connections_count = source.connections_count(metagenome_id)
+    connections_count = summary["connections_count"]
     connections_badge = get_badge(
         label=ids.SAMPLE_CARD_CONNECTIONS_BADGE_LABEL,
         id={
@@ -108,7 +72,9 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         radius="xl",
         checked=False,
     )
-    high_quality, medium_quality, low_quality = source.get_mimag_counts(metagenome_id)
+    high_quality = summary["high_quality"]
+    medium_quality = summary["medium_quality"]
+    low_quality = summary["low_quality"]
     hiqh_quality_badge = dmc.Tooltip(
         label=">95% complete & >90% pure",
         position="top-end",
@@ -142,7 +108,7 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         [
             dmc.Text(f"Approx. Markers Sets:", size="xs"),
             dmc.Badge(
-                source.get_approximate_marker_sets(metagenome_id),
+                summary["approximate_marker_sets"],
                 size="xs",
                 variant="outline",
                 color="gray",
@@ -154,7 +120,7 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         [
             dmc.Text(f"Uploaded Clusters:", size="xs"),
             dmc.Badge(
-                source.get_refinements_count(metagenome_id, initial=True),
+                summary["initial_refinements_count"],
                 size="xs",
                 variant="outline",
                 color="gray",
@@ -166,9 +132,7 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         [
             dmc.Text(f"User Refinements:", size="xs"),
             dmc.Badge(
-                source.get_refinements_count(
-                    metagenome_id, initial=False, outdated=False
-                ),
+                summary["user_refinements_count"],
                 size="xs",
                 variant="outline",
                 color="gray",
@@ -180,14 +144,14 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
         [
             dmc.Text(f"Current Refinements:", size="xs"),
             dmc.Badge(
-                source.get_refinements_count(metagenome_id, outdated=False),
+                summary["current_refinements_count"],
                 size="xs",
                 variant="outline",
             ),
         ],
         position="apart",
     )
-    refined_contig_count = source.get_refined_contig_count(metagenome_id)
+    refined_contig_count = summary["refined_contig_count"]
     percent_clustered = round(refined_contig_count / contig_count * 100, 2)
     percent_clustered_text = dmc.Group(
         [
@@ -203,7 +167,7 @@ def render(source: SampleCardDataSource, metagenome_id: int) -> dmc.Card:
                 dmc.Group(
                     [
                         dmc.Text(
-                            source.get_metagenome_name(metagenome_id)
+                            summary["name"]
                             .replace("_", " ")
                             .title(),
                             weight=500,
@@ -46,10 +46,18 @@ class SampleCardsDataSource(Protocol):
     def remove_metagenome(self, metagenome_id: int) -> None:
         ...
 
-    def get_metagenome_ids(self) -> List[int]:
+    def get_sample_card_summaries(self) -> Dict[int, Dict[str, Union[str, int]]]:
+        """Card statistics of every metagenome keyed by Metagenome.id"""
         ...
 
 
+def render_sample_cards(source: SampleCardsDataSource) -> List[dmc.Card]:
+    return [
+        sample_card.render(metagenome_id, summary)
+        for metagenome_id, summary in source.get_sample_card_summaries().items()
+    ]
+
+
 def render(app: DashProxy, source: SampleCardsDataSource) -> html.Div:
     @app.callback(
         Output(
@@ -178,10 +186,7 @@ def render(app: DashProxy, source: SampleCardsDataSource) -> html.Div:
     def get_sample_cards(task_ids: List[str]) -> List[dmc.Card]:
         if task_ids:
             raise PreventUpdate
-        return [
-            sample_card.render(source, metagenome_id=mg_id)
-            for mg_id in source.get_metagenome_ids()
-        ]
+        return render_sample_cards(source)
 
     @app.callback(
         Output(ids.SAMPLE_CARDS_CONTAINER, "children", allow_duplicate=True),
@@ -202,10 +207,7 @@ def render(app: DashProxy, source: SampleCardsDataSource) -> html.Div:
         ][0]
         metagenome_id = remove_btn_ids[sample_card_index].get(ids.SAMPLE_CARD_INDEX)
         source.remove_metagenome(metagenome_id)
-        return [
-            sample_card.render(source, metagenome_id=mg_id)
-            for mg_id in source.get_metagenome_ids()
-        ]
+        return render_sample_cards(source)
 
     @app.callback(
         Output(ids.SAMPLE_CARDS_CONTAINER, "children", allow_duplicate=True),
@@ -213,10 +215,7 @@ def render(app: DashProxy, source: SampleCardsDataSource) -> html.Div:
         prevent_initial_call="initial_duplicate",
     )
     def get_sample_cards(submit_btn: int) -> List[dmc.Card]:
-        return [
-            sample_card.render(source, metagenome_id=mg_id)
-            for mg_id in source.get_metagenome_ids()
-        ]
+        return render_sample_cards(source)
 
     # TODO Callback to delete sample card
     return html.Div(
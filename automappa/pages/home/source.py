@@ -4,10 +4,11 @@ from functools import partial
 import uuid
 import logging
 from pydantic import BaseModel
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Literal, Tuple, Union
 
-from sqlmodel import Session, and_, select, func
+from sqlmodel import Session, and_, case, select, func
 
+from sqlalchemy import delete
 from sqlalchemy.exc import NoResultFound, MultipleResultsFound
 
 from celery import group
@@ -15,32 +16,28 @@ from celery.result import GroupResult, AsyncResult
 from automappa.data import loader
 
 
+from automappa.data.cache import contig_cache
 from automappa.data.database import engine
+from automappa.data.results import result_cache
 from automappa.data.models import (
     Metagenome,
     Contig,
+    ContigRefinementLink,
+    ContigSequence,
     Marker,
     CytoscapeConnection,
     Refinement,
+    RefinementMetrics,
 )
+from automappa.data.metrics import MARKER_SET_SIZE, read_refinement_metrics
 from automappa.pages.home.tasks.sample_cards import (
-    assign_contigs_marker_size,
-    assign_contigs_marker_symbol,
+    assign_contigs_marker_attributes,
     create_metagenome_model,
     initialize_refinement,
 )
 
 logger = logging.getLogger(__name__)
 
-MARKER_SET_SIZE = 139
-HIGH_QUALITY_COMPLETENESS = 90  # gt
-HIGH_QUALITY_PURITY = 95  # gt
-MEDIUM_QUALITY_COMPLETENESS = 50  # gte
-MEDIUM_QUALITY_PURITY = 90  # gt
-# lt
-LOW_QUALITY_COMPLETENESS = 50
-LOW_QUALITY_PURITY = 90
-
 
 class HomeDataSource(BaseModel):
     def name_is_unique(self, name: str) -> bool:
@@ -66,13 +63,6 @@ class HomeDataSource(BaseModel):
                 is_unique = False
         return is_unique
 
-    def get_metagenome_name(self, metagenome_id: int) -> str:
-        with Session(engine) as session:
-            name = session.exec(
-                select(Metagenome.name).where(Metagenome.id == metagenome_id)
-            ).one()
-        return name
-
     def get_metagenome_ids(self) -> List[int]:
         """Get all unique Metagenome names in database
 
@@ -110,8 +100,7 @@ class HomeDataSource(BaseModel):
     ) -> GroupResult:
         task_chain = create_metagenome_model.s() | group(
             [
-                assign_contigs_marker_size.s(),
-                assign_contigs_marker_symbol.s(),
+                assign_contigs_marker_attributes.s(),
                 initialize_refinement.s(),
             ]
         )
@@ -128,185 +117,167 @@ class HomeDataSource(BaseModel):
         return result
 
     def get_preprocess_metagenome_tasks(
-        self, task_ids: Tuple[str, str, str, str]
+        self, task_ids: Tuple[str, str, str]
     ) -> List[Tuple[str, AsyncResult]]:
         (
             mg_model_task_id,
-            marker_size_task_id,
-            marker_symbol_task_id,
+            marker_attributes_task_id,
             refinement_task_id,
         ) = task_ids
         mg_model_task = create_metagenome_model.AsyncResult(mg_model_task_id)
-        marker_size_task = assign_contigs_marker_size.AsyncResult(marker_size_task_id)
-        marker_symbol_task = assign_contigs_marker_symbol.AsyncResult(
-            marker_symbol_task_id
+        marker_attributes_task = assign_contigs_marker_attributes.AsyncResult(
+            marker_attributes_task_id
         )
         refinement_task = initialize_refinement.AsyncResult(refinement_task_id)
         return (
             ("ingesting metagenome data", mg_model_task),
-            ("pre-computing marker sizes", marker_size_task),
-            ("pre-computing marker symbols", marker_symbol_task),
+            ("pre-computing marker symbols and sizes", marker_attributes_task),
             ("initializing user refinements", refinement_task),
         )
 
     def remove_metagenome(self, metagenome_id: int) -> None:
-        with Session(engine) as session:
-            metagenome = session.exec(
-                select(Metagenome).where(Metagenome.id == metagenome_id)
-            ).one()
-            session.delete(metagenome)
-            session.commit()
-
-    def marker_count(self, metagenome_id: int) -> int:
-        with Session(engine) as session:
-            statement = (
-                select([func.count(Marker.id)])
-                .join(Contig)
-                .join(Metagenome)
-                .where(Metagenome.id == metagenome_id)
-            )
-            marker_count = session.exec(statement).one()
-        return marker_count
-
-    def get_approximate_marker_sets(self, metagenome_id: int) -> int:
-        marker_count_stmt = (
-            select(func.count(Marker.id))
-            .join(Contig)
-            .where(Contig.metagenome_id == metagenome_id)
-        )
-        with Session(engine) as session:
-            total_markers = session.exec(marker_count_stmt).first()
+        """Delete a metagenome along with every row it owns
 
-        return total_markers // MARKER_SET_SIZE
-
-    def contig_count(self, metagenome_id: int) -> int:
-        with Session(engine) as session:
-            statement = (
-                select([func.count(Metagenome.contigs)])
-                .join(Contig)
-                .where(Metagenome.id == metagenome_id)
-            )
-            contig_count = session.exec(statement).one()
-        return contig_count
-
-    def connections_count(self, metagenome_id: int) -> int:
-        with Session(engine) as session:
-            statement = (
-                select([func.count(Metagenome.connections)])
-                .join(CytoscapeConnection)
-                .where(Metagenome.id == metagenome_id)
-            )
-            connection_count = session.exec(statement).first()
-        return connection_count
-
-    def get_refined_contig_count(self, metagenome_id: int) -> int:
-        stmt = (
-            select(func.count(Contig.id))
-            .where(Contig.metagenome_id == metagenome_id)
-            .where(Contig.refinements.any(Refinement.outdated == False))
-        )
-        with Session(engine) as session:
-            count = session.exec(stmt).first() or 0
-        return count
-
-    def get_refinements_count(
-        self,
-        metagenome_id: int,
-        initial: Optional[bool] = None,
-        outdated: Optional[bool] = None,
-    ) -> int:
-        """Get Refinement count where Refinement.metagenome_id == metagenome_id
+        Rows are deleted explicitly (children first) rather than through the
+        ORM relationships, which would only unset their metagenome_id and
+        leave orphaned refinements, metrics and contigs behind. Lineages are
+        shared between metagenomes and kept.
 
-        Providing `initial` will add where(Refinement.initial_refinement == True)
-        otherwise will omit this filter and retrieve all.
+        Parameters
+        ----------
+        metagenome_id : int
+            Metagenome.id to remove
         """
-        stmt = select(func.count(Refinement.id)).where(
+        contig_ids = select(Contig.id).where(Contig.metagenome_id == metagenome_id)
+        refinement_ids = select(Refinement.id).where(
             Refinement.metagenome_id == metagenome_id
         )
-        if isinstance(initial, bool):
-            stmt = stmt.where(Refinement.initial_refinement == initial)
-        if isinstance(outdated, bool):
-            stmt = stmt.where(Refinement.outdated == outdated)
-        with Session(engine) as session:
-            count = session.exec(stmt).first() or 0
-        return count
+        stmts = [
+            delete(ContigRefinementLink).where(
+                ContigRefinementLink.refinement_id.in_(refinement_ids)
+            ),
+            delete(RefinementMetrics).where(
+                RefinementMetrics.refinement_id.in_(refinement_ids)
+            ),
+            delete(Refinement).where(Refinement.metagenome_id == metagenome_id),
+            delete(Marker).where(Marker.contig_id.in_(contig_ids)),
+            delete(ContigSequence).where(ContigSequence.contig_id.in_(contig_ids)),
+            delete(Contig).where(Contig.metagenome_id == metagenome_id),
+            delete(CytoscapeConnection).where(
+                CytoscapeConnection.metagenome_id == metagenome_id
+            ),
+            delete(Metagenome).where(Metagenome.id == metagenome_id),
+        ]
+        with engine.begin() as connection:
+            for stmt in stmts:
+                connection.execute(stmt)
+        contig_cache.evict(metagenome_id)
+        result_cache.bump_generation(metagenome_id)
+
+    def get_sample_card_summaries(
+        self,
+    ) -> Dict[
+        int,
+        Dict[
+            Literal[
+                "name",
+                "contig_count",
+                "marker_count",
+                "connections_count",
+                "approximate_marker_sets",
+                "high_quality",
+                "medium_quality",
+                "low_quality",
+                "initial_refinements_count",
+                "user_refinements_count",
+                "current_refinements_count",
+                "refined_contig_count",
+            ],
+            Union[str, int],
+        ],
+    ]:
+        """Retrieve the statistics of every sample card with grouped queries
+
+        Each statistic is computed for all metagenomes at once (grouped by
+        metagenome) rather than per card, i.e. a constant number of queries
+        regardless of the number of samples or refinements.
 
-    def compute_completeness_purity_metrics(
-        self, metagenome_id: int, refinement_id: int
-    ) -> Tuple[float, float]:
+        Returns
+        -------
+        Dict[int, Dict[str, Union[str, int]]]
+            Card statistics keyed by Metagenome.id (ordered by id)
+        """
+        contig_count_stmt = select(
+            Contig.metagenome_id, func.count(Contig.id)
+        ).group_by(Contig.metagenome_id)
         marker_count_stmt = (
-            select(func.count(Marker.id))
+            select(Contig.metagenome_id, func.count(Marker.id))
+            .select_from(Marker)
             .join(Contig)
-            .where(
-                Contig.metagenome_id == metagenome_id,
-                Contig.refinements.any(
-                    and_(
-                        Refinement.outdated == False,
-                        Refinement.id == refinement_id,
-                    )
-                ),
-            )
+            .group_by(Contig.metagenome_id)
         )
-        unique_marker_stmt = (
-            select(Marker.sacc)
-            .join(Contig)
-            .distinct()
-            .where(
-                Contig.metagenome_id == metagenome_id,
-                Contig.refinements.any(
-                    and_(
-                        Refinement.outdated == False,
-                        Refinement.id == refinement_id,
-                    )
-                ),
+        connections_count_stmt = select(
+            CytoscapeConnection.metagenome_id, func.count(CytoscapeConnection.id)
+        ).group_by(CytoscapeConnection.metagenome_id)
+        is_current = Refinement.outdated == False
+        is_initial = Refinement.initial_refinement == True
+        refinements_count_stmt = select(
+            Refinement.metagenome_id,
+            func.sum(case([(is_initial, 1)], else_=0)),
+            func.sum(case([(and_(~is_initial, is_current), 1)], else_=0)),
+            func.sum(case([(is_current, 1)], else_=0)),
+        ).group_by(Refinement.metagenome_id)
+        refined_contig_count_stmt = (
+            select(
+                Refinement.metagenome_id,
+                func.count(func.distinct(ContigRefinementLink.contig_id)),
             )
+            .select_from(ContigRefinementLink)
+            .join(Refinement)
+            .where(is_current)
+            .group_by(Refinement.metagenome_id)
         )
         with Session(engine) as session:
-            markers_count = session.exec(marker_count_stmt).first() or 0
-            unique_marker_count = session.exec(
-                select(func.count()).select_from(unique_marker_stmt)
-            ).first()
-
-        completeness = round(unique_marker_count / MARKER_SET_SIZE * 100, 2)
-        purity = (
-            round(unique_marker_count / markers_count * 100, 2) if markers_count else 0
-        )
-        return completeness, purity
-
-    def get_mimag_counts(self, metagenome_id: int) -> Tuple[int, int, int]:
-        """Retrieve counts of clusters following MIMAG standards.
-
-        standards:
-
-        - High-quality >90% complete > 95% pure
-        - Medium-quality >=50% complete > 90% pure
-        - Low-quality <50% complete < 90% pure
+            metagenomes = session.exec(
+                select(Metagenome.id, Metagenome.name).order_by(Metagenome.id)
+            ).all()
+            contig_counts = dict(session.exec(contig_count_stmt).all())
+            marker_counts = dict(session.exec(marker_count_stmt).all())
+            connections_counts = dict(session.exec(connections_count_stmt).all())
+            refinements_counts = {
+                metagenome_id: counts
+                for metagenome_id, *counts in session.exec(refinements_count_stmt)
+            }
+            refined_contig_counts = dict(session.exec(refined_contig_count_stmt).all())
+            refinement_metrics = read_refinement_metrics(
+                session.connection(),
+                is_current,
+                Refinement.metagenome_id.in_(
+                    [metagenome_id for metagenome_id, _ in metagenomes]
+                ),
+            )
 
-        """
-        stmt = select(Refinement.id).where(
-            Refinement.metagenome_id == metagenome_id,
-            Refinement.outdated == False,
-        )
-        high_quality_count = 0
-        medium_quality_count = 0
-        low_quality_count = 0
-        with Session(engine) as session:
-            refinement_ids = session.exec(stmt).all()
-            for refinement_id in refinement_ids:
-                completeness, purity = self.compute_completeness_purity_metrics(
-                    metagenome_id, refinement_id
-                )
-                if (
-                    completeness > HIGH_QUALITY_COMPLETENESS
-                    and purity > HIGH_QUALITY_PURITY
-                ):
-                    high_quality_count += 1
-                elif (
-                    completeness >= MEDIUM_QUALITY_COMPLETENESS
-                    and purity > MEDIUM_QUALITY_PURITY
-                ):
-                    medium_quality_count += 1
-                else:
-                    # completeness < LOW_QUALITY_COMPLETENESS and purity < LOW_QUALITY_PURITY:
-                    low_quality_count += 1
-        return high_quality_count, medium_quality_count, low_quality_count
+        summaries = {}
+        for metagenome_id, name in metagenomes:
+            marker_count = marker_counts.get(metagenome_id, 0)
+            initial_count, user_count, current_count = (
+                int(count or 0)
+                for count in refinements_counts.get(metagenome_id, (0, 0, 0))
+            )
+            summaries[metagenome_id] = dict(
+                name=name,
+                contig_count=contig_counts.get(metagenome_id, 0),
+                marker_count=marker_count,
+                connections_count=connections_counts.get(metagenome_id, 0),
+                approximate_marker_sets=marker_count // MARKER_SET_SIZE,
+                high_quality=0,
+                medium_quality=0,
+                low_quality=0,
+                initial_refinements_count=initial_count,
+                user_refinements_count=user_count,
+                current_refinements_count=current_count,
+                refined_contig_count=refined_contig_counts.get(metagenome_id, 0),
+            )
+        for metrics in refinement_metrics:
+            summaries[metrics["metagenome_id"]][metrics["mimag_tier"]] += 1
+        return summaries
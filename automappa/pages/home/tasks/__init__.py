@@ -2,8 +2,7 @@ from .status_badge import set_badge_color
 from .sample_cards import (
     create_metagenome_model,
     initialize_refinement,
-    assign_contigs_marker_size,
-    assign_contigs_marker_symbol,
+    assign_contigs_marker_attributes,
     create_metagenome,
 )
 
@@ -12,6 +11,5 @@ __all__ = [
     "create_metagenome",
     "create_metagenome_model",
     "initialize_refinement",
-    "assign_contigs_marker_symbol",
-    "assign_contigs_marker_size",
+    "assign_contigs_marker_attributes",
 ]
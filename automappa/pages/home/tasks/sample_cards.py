@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 
-from typing import List, Optional, Tuple, Union
-from sqlmodel import Session, case, func, select
+from typing import Dict, List, Optional, Tuple, Union
+from sqlalchemy.sql.elements import ColumnElement
+from sqlmodel import Session, case, func, select, update
 from automappa.data import loader
 from automappa.data.database import engine
 from automappa.data.models import Contig, Marker
+from automappa.data.results import result_cache
 from automappa.tasks import queue
+from automappa.utils.markers import MARKER_SIZES, MARKER_SYMBOLS
 
 
 @queue.task(bind=True)
@@ -20,11 +23,12 @@ def create_metagenome(
     # TODO Create sample should be async so sample_card with loader
     # is displayed and user can continue with navigation
     # TODO Disable "new sample" button while create sample is in progress
-    metagenome = loader.create_sample_metagenome(
+    metagenome_id, _ = loader.create_sample_metagenome(
         name, metagenome_fpath, binning_fpath, markers_fpath, connections_fpath
     )
-    loader.create_initial_refinements(metagenome.id)
-    return metagenome.name, metagenome.id
+    loader.create_initial_refinements(metagenome_id)
+    result_cache.bump_generation(metagenome_id)
+    return name, metagenome_id
 
 
 @queue.task(bind=True)
@@ -35,95 +39,77 @@ def create_metagenome_model(
     binning_fpath: str,
     markers_fpath: str,
     connections_fpath: Optional[str] = None,
-) -> int:
-    metagenome = loader.create_sample_metagenome(
+) -> Dict[str, Union[int, loader.ThroughputReport]]:
+    """Ingest sample tables and report ingestion throughput (rows/s per table)
+
+    The result is passed on to each task of the pre-processing group, e.g.
+    ``{"metagenome_id": 1, "throughput": {"contig": {"rows": ..., ...}}}``
+    """
+    metagenome_id, throughput = loader.create_sample_metagenome(
         name, metagenome_fpath, binning_fpath, markers_fpath, connections_fpath
     )
-    return metagenome.id
+    return dict(metagenome_id=metagenome_id, throughput=throughput)
 
 
 @queue.task(bind=True)
-def initialize_refinement(self, metagenome_id: int) -> None:
-    loader.create_initial_refinements(metagenome_id)
+def initialize_refinement(
+    self, ingestion: Dict[str, Union[int, loader.ThroughputReport]]
+) -> None:
+    loader.create_initial_refinements(ingestion["metagenome_id"])
+    result_cache.bump_generation(ingestion["metagenome_id"])
 
 
-@queue.task(bind=True)
-def assign_contigs_marker_symbol(self, metagenome_id: int) -> None:
-    subquery = (
-        select(
-            [
-                Contig.id,
-                case(
-                    [
-                        (func.count(Marker.id) == 0, "circle"),
-                        (func.count(Marker.id) == 1, "square"),
-                        (func.count(Marker.id) == 2, "diamond"),
-                        (func.count(Marker.id) == 3, "triangle-up"),
-                        (func.count(Marker.id) == 4, "x"),
-                        (func.count(Marker.id) == 5, "pentagon"),
-                        (func.count(Marker.id) == 6, "hexagon2"),
-                        (func.count(Marker.id) >= 7, "hexagram"),
-                    ],
-                    else_="circle",
-                ).label("symbol"),
-            ]
-        )
-        .select_from(Contig)
-        .join(Marker, isouter=True)
-        .group_by(Contig.id)
-        .subquery()
+def get_marker_attributes(marker_count: ColumnElement) -> Dict[str, ColumnElement]:
+    """Contig.marker_symbol and Contig.marker_size expressions of a marker count"""
+    # The last symbol and size apply to every count beyond the others
+    last = len(MARKER_SYMBOLS) - 1
+    marker_symbol = case(
+        [(marker_count == count, symbol) for count, symbol in enumerate(MARKER_SYMBOLS)]
+        + [(marker_count > last, MARKER_SYMBOLS[last])],
+        else_=MARKER_SYMBOLS[0],
     )
-    stmt = (
-        select(Contig, subquery.c.symbol)
-        .select_from(Contig)
-        .join(subquery, subquery.c.id == Contig.id)
+    marker_size = case(
+        [(marker_count == count, size) for count, size in enumerate(MARKER_SIZES)]
+        + [(marker_count > last, MARKER_SIZES[last])],
+        else_=MARKER_SIZES[0],
     )
-    stmt = stmt.where(Contig.metagenome_id == metagenome_id)
-    with Session(engine) as session:
-        results = session.exec(stmt).all()
-        for contig, symbol in results:
-            contig.marker_symbol = symbol
-            session.add(contig)
-
-        session.commit()
+    return dict(marker_symbol=marker_symbol, marker_size=marker_size)
 
 
 @queue.task(bind=True)
-def assign_contigs_marker_size(self, metagenome_id: int) -> None:
-    subquery = (
-        select(
-            [
-                Contig.id,
-                case(
-                    [
-                        (func.count(Marker.id) == 0, 7),
-                        (func.count(Marker.id) == 1, 8),
-                        (func.count(Marker.id) == 2, 9),
-                        (func.count(Marker.id) == 3, 10),
-                        (func.count(Marker.id) == 4, 11),
-                        (func.count(Marker.id) == 5, 12),
-                        (func.count(Marker.id) == 6, 13),
-                        (func.count(Marker.id) >= 7, 14),
-                    ],
-                    else_=7,
-                ).label("size"),
-            ]
+def assign_contigs_marker_attributes(
+    self, ingestion: Dict[str, Union[int, loader.ThroughputReport]]
+) -> None:
+    """Assign Contig.marker_symbol and Contig.marker_size from marker counts
+
+    On Postgres, marker counts are computed once per contig and both attributes
+    are applied with a single ``UPDATE ... FROM (subquery)`` statement. Other
+    dialects (e.g. SQLite) do not support ``UPDATE ... FROM`` with SQLAlchemy
+    1.4 and fall back to a correlated marker count subquery.
+    """
+    metagenome_id = ingestion["metagenome_id"]
+    if engine.dialect.name == "postgresql":
+        marker_counts = (
+            select([Contig.id, func.count(Marker.id).label("marker_count")])
+            .select_from(Contig)
+            .join(Marker, isouter=True)
+            .where(Contig.metagenome_id == metagenome_id)
+            .group_by(Contig.id)
+            .subquery()
         )
-        .select_from(Contig)
-        .join(Marker, isouter=True)
-        .group_by(Contig.id)
-        .subquery()
-    )
-    stmt = (
-        select(Contig, subquery.c.size)
-        .select_from(Contig)
-        .join(subquery, subquery.c.id == Contig.id)
+        stmt = update(Contig).where(Contig.id == marker_counts.c.id)
+        marker_count = marker_counts.c.marker_count
+    else:
+        stmt = update(Contig).where(Contig.metagenome_id == metagenome_id)
+        marker_count = (
+            select([func.count(Marker.id)])
+            .where(Marker.contig_id == Contig.id)
+            .scalar_subquery()
+        )
+    stmt = stmt.values(**get_marker_attributes(marker_count)).execution_options(
+        synchronize_session=False
     )
-    stmt = stmt.where(Contig.metagenome_id == metagenome_id)
     with Session(engine) as session:
-        results = session.exec(stmt).all()
-        for contig, size in results:
-            contig.marker_size = size
-            session.add(contig)
-
+        session.execute(stmt)
         session.commit()
+    result_cache.bump_generation(metagenome_id)
@@ -1,13 +1,14 @@
 from typing import Dict, List, Literal, Optional, Protocol, Union
 import dash_cytoscape as cyto
-from dash_extensions.enrich import DashProxy, html, Output, Input, dcc
+from dash_extensions.enrich import DashProxy, html, Output, Input, State, dcc
 
 from automappa.components import ids
+from automappa.data.filters import ContigSelection
 
 
 class ContigCytoscapeDataSource(Protocol):
     def get_cytoscape_elements(
-        self, metagenome_id: int, headers: Optional[List[str]]
+        self, metagenome_id: int, selection: Optional[ContigSelection]
     ) -> List[
         Dict[
             Literal["data"],
@@ -20,7 +21,7 @@ class ContigCytoscapeDataSource(Protocol):
         ...
 
     def get_cytoscape_stylesheet(
-        self, metagenome_id: int, headers: Optional[List[str]]
+        self, metagenome_id: int, selection: Optional[ContigSelection]
     ) -> List[
         Dict[
             Literal["selector", "style"],
@@ -33,23 +34,20 @@ class ContigCytoscapeDataSource(Protocol):
 def render(app: DashProxy, source: ContigCytoscapeDataSource) -> html.Div:
     @app.callback(
         Output(ids.CONTIG_CYTOSCAPE, "stylesheet"),
-        [
-            Input(ids.METAGENOME_ID_STORE, "data"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
-        ],
+        Input(ids.CONTIG_SELECTION_STORE, "data"),
+        State(ids.METAGENOME_ID_STORE, "data"),
         prevent_initial_call=True,
     )
     def highlight_selected_contigs(
+        selection: Optional[ContigSelection],
         metagenome_id: int,
-        selected_contigs: Dict[str, List[Dict[str, str]]],
     ) -> List[
         Dict[
             Literal["selector", "style"],
             Union[Literal["node", "edge"], Dict[str, Union[str, int, float]]],
         ]
     ]:
-        headers = {point["text"] for point in selected_contigs["points"]}
-        stylesheet = source.get_cytoscape_stylesheet(metagenome_id, headers)
+        stylesheet = source.get_cytoscape_stylesheet(metagenome_id, selection)
 
         SELECTED_COLOR = "#B10DC9"
         stylesheet += [
@@ -80,15 +78,13 @@ def render(app: DashProxy, source: ContigCytoscapeDataSource) -> html.Div:
 
     @app.callback(
         Output(ids.CONTIG_CYTOSCAPE, "elements"),
-        [
-            Input(ids.METAGENOME_ID_STORE, "data"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
-        ],
+        Input(ids.CONTIG_SELECTION_STORE, "data"),
+        State(ids.METAGENOME_ID_STORE, "data"),
         prevent_initial_call=True,
     )
     def update_cytoscape_elements(
+        selection: Optional[ContigSelection],
         metagenome_id: int,
-        selected_contigs: Dict[str, List[Dict[str, str]]],
     ) -> List[
         Dict[
             Literal["data"],
@@ -98,8 +94,7 @@ def render(app: DashProxy, source: ContigCytoscapeDataSource) -> html.Div:
             ],
         ]
     ]:
-        headers = {point["text"] for point in selected_contigs["points"]}
-        records = source.get_cytoscape_elements(metagenome_id, headers)
+        records = source.get_cytoscape_elements(metagenome_id, selection)
         return records
 
     return html.Div(
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Dict, Optional, Protocol
+from dash_extensions.enrich import DashProxy, Input, Output, Serverside, State, dcc
+
+from automappa.components import ids
+from automappa.data.database import redis_backend
+from automappa.data.filters import ContigSelection
+from automappa.utils.stats import BoxSummary
+
+
+class ContigDistributionsStoreDataSource(Protocol):
+    def get_contig_distributions(
+        self, metagenome_id: int, selection: Optional[ContigSelection]
+    ) -> Dict[str, BoxSummary]:
+        ...
+
+
+def render(app: DashProxy, source: ContigDistributionsStoreDataSource) -> dcc.Store:
+    @app.callback(
+        Output(ids.CONTIG_DISTRIBUTIONS_STORE, "data"),
+        Input(ids.CONTIG_SELECTION_STORE, "data"),
+        State(ids.METAGENOME_ID_STORE, "data"),
+        prevent_initial_call=True,
+    )
+    def summarize_contig_distributions(
+        selection: Optional[ContigSelection],
+        metagenome_id: int,
+    ) -> Dict[str, BoxSummary]:
+        # NOTE: Summaries of every boxplot metric are computed together and each
+        # boxplot draws its metric from this store
+        distributions = source.get_contig_distributions(metagenome_id, selection)
+        return Serverside(distributions, backend=redis_backend)
+
+    return dcc.Store(id=ids.CONTIG_DISTRIBUTIONS_STORE)
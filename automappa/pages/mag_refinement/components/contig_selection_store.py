@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Dict, Iterable, List, Optional, Protocol, Union
+from dash_extensions.enrich import DashProxy, Input, Output, Serverside, dcc
+
+from automappa.components import ids
+from automappa.data.database import redis_backend
+from automappa.data.filters import ContigSelection
+
+
+class ContigSelectionStoreDataSource(Protocol):
+    def get_selection(
+        self, metagenome_id: int, rows: Optional[Iterable[int]]
+    ) -> Optional[ContigSelection]:
+        ...
+
+
+def render(app: DashProxy, source: ContigSelectionStoreDataSource) -> dcc.Store:
+    @app.callback(
+        Output(ids.CONTIG_SELECTION_STORE, "data"),
+        [
+            Input(ids.METAGENOME_ID_STORE, "data"),
+            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
+        ],
+    )
+    def resolve_contig_selection(
+        metagenome_id: int,
+        selected_data: Optional[Dict[str, List[Dict[str, Union[int, float]]]]],
+    ) -> Optional[ContigSelection]:
+        # NOTE: The selection is resolved once here and shared with every component
+        # subset by the 2D scatterplot selection (None selects all contigs)
+        # Points carry their contig row as customdata (density bins carry none)
+        rows = (
+            [
+                point["customdata"]
+                for point in selected_data["points"]
+                if isinstance(point.get("customdata"), int)
+            ]
+            if selected_data
+            else None
+        )
+        selection = source.get_selection(metagenome_id, rows)
+        return Serverside(selection, backend=redis_backend)
+
+    return dcc.Store(id=ids.CONTIG_SELECTION_STORE)
@@ -2,10 +2,11 @@
 # -*- coding: utf-8 -*-
 
 from typing import Dict, List, Literal, Optional, Protocol, Union
-from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
+from dash_extensions.enrich import DashProxy, Input, Output, State, dcc, html
 import dash_ag_grid as dag
 
 from automappa.components import ids
+from automappa.data.filters import ContigSelection
 
 
 class MagMetricsTableDataSource(Protocol):
@@ -15,7 +16,7 @@ class MagMetricsTableDataSource(Protocol):
         ...
 
     def get_mag_metrics_row_data(
-        self, metagenome_id: int, headers: Optional[List[str]]
+        self, metagenome_id: int, selection: Optional[ContigSelection]
     ) -> List[Dict[Literal["metric", "metric_value"], Union[str, int, float]]]:
         ...
 
@@ -23,23 +24,16 @@ class MagMetricsTableDataSource(Protocol):
 def render(app: DashProxy, source: MagMetricsTableDataSource) -> html.Div:
     @app.callback(
         Output(ids.MAG_METRICS_DATATABLE, "rowData", allow_duplicate=True),
-        [
-            Input(ids.METAGENOME_ID_STORE, "data"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
-        ],
+        Input(ids.CONTIG_SELECTION_STORE, "data"),
+        State(ids.METAGENOME_ID_STORE, "data"),
         prevent_initial_call=True,
     )
     def compute_mag_metrics(
+        selection: Optional[ContigSelection],
         metagenome_id: int,
-        selected_contigs: Optional[Dict[str, List[Dict[str, str]]]],
     ) -> List[Dict[Literal["metric", "metric_value"], Union[str, int, float]]]:
-        headers = (
-            {point["text"] for point in selected_contigs["points"]}
-            if selected_contigs
-            else None
-        )
         row_data = source.get_mag_metrics_row_data(
-            metagenome_id=metagenome_id, headers=headers
+            metagenome_id=metagenome_id, selection=selection
         )
         return row_data
 
@@ -1,41 +1,27 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from typing import Dict, List, Optional, Protocol, Tuple
+from typing import Dict
 from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
 from plotly import graph_objects as go
 
 from automappa.utils.figures import metric_boxplot
+from automappa.utils.stats import BoxSummary
 
 from automappa.components import ids
+from automappa.data.schemas import ContigSchema
 
 
-class RefinementCoverageBoxplotDataSource(Protocol):
-    def get_coverage_boxplot_records(
-        self, metagenome_id: int, headers: Optional[List[str]]
-    ) -> List[Tuple[str, List[float]]]:
-        ...
-
-
-def render(app: DashProxy, source: RefinementCoverageBoxplotDataSource) -> html.Div:
+def render(app: DashProxy) -> html.Div:
     @app.callback(
         Output(ids.MAG_REFINEMENT_COVERAGE_BOXPLOT, "figure"),
-        [
-            Input(ids.METAGENOME_ID_STORE, "data"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
-        ],
+        Input(ids.CONTIG_DISTRIBUTIONS_STORE, "data"),
+        prevent_initial_call=True,
     )
     def subset_coverage_boxplot_by_scatterplot_selection(
-        metagenome_id: int,
-        selected_data: Dict[str, List[Dict[str, str]]],
+        distributions: Dict[str, BoxSummary],
     ) -> go.Figure:
-        headers = (
-            {point["text"] for point in selected_data["points"]}
-            if selected_data
-            else None
-        )
-        data = source.get_coverage_boxplot_records(metagenome_id, headers=headers)
-        fig = metric_boxplot(data, boxmean="sd")
+        fig = metric_boxplot([distributions[ContigSchema.COVERAGE]], boxmean="sd")
         return fig
 
     graph_config = dict(
@@ -1,45 +1,27 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from typing import Dict, List, Optional, Protocol, Tuple
+from typing import Dict
 from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
 from plotly import graph_objects as go
 
-from automappa.utils.figures import (
-    metric_boxplot,
-)
+from automappa.utils.figures import metric_boxplot
+from automappa.utils.stats import BoxSummary
 
 from automappa.components import ids
+from automappa.data.schemas import ContigSchema
 
 
-class RefinementLengthBoxplotDataSource(Protocol):
-    def get_length_boxplot_records(
-        self, metagenome_id: int, headers: Optional[List[str]]
-    ) -> List[Tuple[str, List[int]]]:
-        ...
-
-
-def render(app: DashProxy, source: RefinementLengthBoxplotDataSource) -> html.Div:
+def render(app: DashProxy) -> html.Div:
     @app.callback(
         Output(ids.MAG_REFINEMENT_LENGTH_BOXPLOT, "figure"),
-        [
-            Input(ids.METAGENOME_ID_STORE, "data"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
-        ],
+        Input(ids.CONTIG_DISTRIBUTIONS_STORE, "data"),
+        prevent_initial_call=True,
     )
     def subset_length_boxplot_by_scatterplot_selection(
-        metagenome_id: int,
-        selected_data: Dict[str, List[Dict[str, str]]],
+        distributions: Dict[str, BoxSummary],
     ) -> go.Figure:
-        headers = (
-            {point["text"] for point in selected_data["points"]}
-            if selected_data
-            else None
-        )
-        data = source.get_length_boxplot_records(
-            metagenome_id=metagenome_id, headers=headers
-        )
-        fig = metric_boxplot(data=data)
+        fig = metric_boxplot([distributions[ContigSchema.LENGTH]])
         return fig
 
     graph_config = dict(
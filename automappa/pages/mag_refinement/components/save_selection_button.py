@@ -1,56 +1,48 @@
-from typing import Dict, List, Protocol
+from typing import Optional, Protocol, Tuple
 import dash_mantine_components as dmc
 from dash.exceptions import PreventUpdate
 from dash_iconify import DashIconify
 
-from dash_extensions.enrich import DashProxy, html, Output, Input
+from dash_extensions.enrich import DashProxy, html, Output, Input, State
 from automappa.components import ids
+from automappa.data.filters import ContigSelection
 
 
 class SaveSelectionButtonDataSource(Protocol):
-    def save_selections_to_refinement(
-        self, metagenome_id: int, headers: List[str]
-    ) -> None:
+    def save_selections_to_refinement(self, selection: ContigSelection) -> None:
         ...
 
 
 def render(app: DashProxy, source: SaveSelectionButtonDataSource) -> html.Div:
     @app.callback(
         Output(ids.MAG_REFINEMENTS_SAVE_BUTTON, "disabled"),
-        Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
+        Input(ids.CONTIG_SELECTION_STORE, "data"),
     )
-    def disable_save_button(
-        selected_data: Dict[str, List[Dict[str, str]]],
-    ) -> bool:
-        if (
-            selected_data
-            and len({point["text"] for point in selected_data["points"]}) > 0
-        ):
+    def disable_save_button(selection: Optional[ContigSelection]) -> bool:
+        if selection and len(selection) > 0:
             return False
         return True
 
     @app.callback(
-        Output(ids.MAG_REFINEMENTS_SAVE_BUTTON, "n_clicks"),
         [
-            Input(ids.METAGENOME_ID_STORE, "data"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
-            Input(ids.MAG_REFINEMENTS_SAVE_BUTTON, "n_clicks"),
+            Output(ids.CONTIG_SELECTION_STORE, "data", allow_duplicate=True),
+            Output(ids.SCATTERPLOT_2D_FIGURE, "selectedData", allow_duplicate=True),
         ],
+        Input(ids.MAG_REFINEMENTS_SAVE_BUTTON, "n_clicks"),
+        State(ids.CONTIG_SELECTION_STORE, "data"),
         prevent_initial_call=True,
     )
     def store_binning_refinement_selections(
-        metagenome_id: int,
-        selected_data: Dict[str, List[Dict[str, str]]],
-        n_clicks: int,
-    ) -> int:
+        n_clicks: int, selection: Optional[ContigSelection]
+    ) -> Tuple[None, None]:
         # Initial load...
-        if not n_clicks or (n_clicks and not selected_data) or not selected_data:
+        if not n_clicks or not selection:
             raise PreventUpdate
-        headers = {point["text"] for point in selected_data["points"]}
-        source.save_selections_to_refinement(
-            metagenome_id=metagenome_id, headers=headers
-        )
-        return 0
+        source.save_selections_to_refinement(selection=selection)
+        # Clearing the saved selection disables the save button so the same
+        # contigs can not be saved twice (the figure selection is cleared
+        # in the browser, see `HIDE_SAVED_POINTS_CLIENTSIDE_CALLBACK`)
+        return None, None
 
     return html.Div(
         dmc.Tooltip(
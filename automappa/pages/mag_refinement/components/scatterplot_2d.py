@@ -1,9 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from typing import Dict, List, Literal, Optional, Protocol, Set, Tuple, Union
-from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
+from typing import Dict, List, Literal, Optional, Protocol, Tuple, Union
+import numpy as np
+from dash import Patch, ctx
+from dash.exceptions import PreventUpdate
+from dash_extensions.enrich import DashProxy, Input, Output, State, dcc, html
 from plotly import graph_objects as go
+from plotly.colors import qualitative
+from automappa import settings
+from automappa.data.filters import ContigFilter
 from automappa.data.schemas import ContigSchema
 
 from automappa.utils.figures import format_axis_title
@@ -14,67 +20,202 @@ from automappa.components import ids
 class Scatterplot2dDataSource(Protocol):
     def get_scatterplot2d_records(
         self,
-        metagenome_id: int,
+        contig_filter: ContigFilter,
         x_axis: str,
         y_axis: str,
         color_by_col: str,
-        headers: Optional[List[str]],
     ) -> Dict[
-        Literal["x", "y", "marker_symbol", "marker_size", "text", "customdata"],
-        List[Union[float, str, Tuple[float, float, int]]],
+        Optional[str],
+        Dict[
+            Literal["x", "y", "marker_symbol", "marker_size", "customdata"],
+            np.ndarray,
+        ],
     ]:
         ...
 
-    def get_contig_headers_from_coverage_range(
-        self, metagenome_id: int, coverage_range: Tuple[float, float]
-    ) -> Set[str]:
+    def get_contig_lookup(
+        self, metagenome_id: int
+    ) -> Dict[
+        Literal["header", "coverage", "gc_content", "length"],
+        List[Union[str, float, int]],
+    ]:
         ...
 
-    def get_user_refinements_contig_headers(self, metagenome_id: int) -> Set[str]:
-        """Retrieve all contig headers for Refinements that are not outdated and that were not initially uploaded by the user"""
+    def get_scatterplot2d_density_records(
+        self,
+        contig_filter: ContigFilter,
+        x_axis: str,
+        y_axis: str,
+        color_by_col: str,
+        bins: int,
+    ) -> Dict[Optional[str], Dict[Literal["x", "y", "count"], np.ndarray]]:
         ...
 
+    def get_scatterplot2d_category_records(
+        self,
+        contig_filter: ContigFilter,
+        x_axis: str,
+        y_axis: str,
+        color_by_col: str,
+    ) -> Dict[
+        Literal[
+            "x",
+            "y",
+            "marker_symbol",
+            "marker_size",
+            "customdata",
+            "color",
+            "categories",
+            "counts",
+        ],
+        Union[np.ndarray, List[Optional[str]]],
+    ]:
+        ...
 
-def get_hovertemplate(x_axis: str, y_axis: str) -> str:
-    # Hovertemplate
-    x_hover_title = format_axis_title(x_axis)
-    y_hover_title = format_axis_title(y_axis)
-    text_hover_label = "Contig: %{text}"
-    coverage_label = "Coverage: %{customdata[0]:.2f}"
-    gc_content_label = "GC%: %{customdata[1]:.2f}"
-    length_label = "Length: %{customdata[2]:,} bp"
-    x_hover_label = f"{x_hover_title}: " + "%{x:.2f}"
-    y_hover_label = f"{y_hover_title}: " + "%{y:.2f}"
-    hovertemplate = "<br>".join(
-        [
-            text_hover_label,
-            coverage_label,
-            gc_content_label,
-            length_label,
-            x_hover_label,
-            y_hover_label,
-        ]
-    )
-    return hovertemplate
+    def get_color_by_cardinality(
+        self, contig_filter: ContigFilter, color_by_col: str
+    ) -> int:
+        ...
+
+    def get_contig_count(self, contig_filter: ContigFilter) -> int:
+        ...
+
+
+# Colors of the most abundant categories when drawn as a single trace
+CATEGORY_COLORS = qualitative.Dark24 + qualitative.Light24
+OTHER_CATEGORY_COLOR = "lightgrey"
+
+
+# Only the contig row (customdata) of each point is sent with the figure, hover
+# details are resolved in the browser from the contig lookup store (sent once
+# per metagenome, see `get_contig_lookup`)
+HOVER_TOOLTIP_CLIENTSIDE_CALLBACK = """
+function(hoverData, lookup, figure) {
+    const noUpdate = window.dash_clientside.no_update;
+    if (!hoverData || !lookup) {
+        return [false, noUpdate, noUpdate];
+    }
+    const point = hoverData.points[0];
+    // Binned density points do not carry a contig row
+    const row = point.customdata;
+    if (typeof row !== "number" || row < 0 || row >= lookup.header.length) {
+        return [false, noUpdate, noUpdate];
+    }
+    const meta = (figure && figure.layout && figure.layout.meta) || {};
+    const lines = [
+        `Contig: ${lookup.header[row]}`,
+        `Coverage: ${Number(lookup.coverage[row]).toFixed(2)}`,
+        `GC%: ${Number(lookup.gc_content[row]).toFixed(2)}`,
+        `Length: ${Number(lookup.length[row]).toLocaleString()} bp`,
+        `${meta.x_title || "x"}: ${Number(point.x).toFixed(2)}`,
+        `${meta.y_title || "y"}: ${Number(point.y).toFixed(2)}`,
+    ];
+    // Single trace coloring: marker colors are codes of the categories
+    const code = point["marker.color"];
+    if (meta.categories && typeof code === "number") {
+        lines.push(`${meta.color_by}: ${meta.categories[code] ?? "unclassified"}`);
+    }
+    return [true, point.bbox, lines.join("\\n")];
+}
+"""
+
+# The saved selection is cleared from the figure in the browser and, when
+# refinements are hidden, the saved contigs are removed from it as well. Only the
+# points of the saved contig rows (customdata) are dropped from the traces
+# containing them, the figure is not re-queried.
+HIDE_SAVED_POINTS_CLIENTSIDE_CALLBACK = """
+function(nClicks, hideRefinements, selectedData, figure) {
+    const noUpdate = window.dash_clientside.no_update;
+    if (!nClicks || !selectedData || !figure) {
+        return noUpdate;
+    }
+    const saved = new Set(
+        hideRefinements
+            ? selectedData.points
+                  .map((point) => point.customdata)
+                  .filter((row) => typeof row === "number")
+            : []
+    );
+    // plotly (>= 6) sends numpy arrays as base64 typed arrays {dtype, bdata}
+    const arrayTypes = {
+        i1: Int8Array,
+        u1: Uint8Array,
+        i2: Int16Array,
+        u2: Uint16Array,
+        i4: Int32Array,
+        u4: Uint32Array,
+        f4: Float32Array,
+        f8: Float64Array,
+    };
+    const decode = (values) => {
+        if (!values || !values.bdata) {
+            return values;
+        }
+        const bytes = Uint8Array.from(atob(values.bdata), (c) => c.charCodeAt(0));
+        return new arrayTypes[values.dtype](bytes.buffer);
+    };
+    const data = figure.data.map((trace) => {
+        const unselected = Object.assign({}, trace, {selectedpoints: null});
+        const rows = saved.size ? decode(trace.customdata) : null;
+        if (!rows || typeof rows.length !== "number") {
+            return unselected;
+        }
+        const kept = [];
+        rows.forEach((row, i) => {
+            if (!saved.has(row)) {
+                kept.push(i);
+            }
+        });
+        if (kept.length === rows.length) {
+            return unselected;
+        }
+        // Per-point arrays are subset, scalar (and other) values are kept as is
+        const subset = (values) => {
+            values = decode(values);
+            if (
+                !values ||
+                typeof values === "string" ||
+                values.length !== rows.length
+            ) {
+                return values;
+            }
+            return kept.map((i) => values[i]);
+        };
+        const marker = Object.assign({}, trace.marker);
+        ["size", "symbol", "color"].forEach((key) => {
+            marker[key] = subset(marker[key]);
+        });
+        return Object.assign({}, trace, {
+            x: subset(trace.x),
+            y: subset(trace.y),
+            customdata: subset(trace.customdata),
+            marker: marker,
+            selectedpoints: null,
+        });
+    });
+    // Drop the box/lasso selection outlines
+    const layout = Object.assign({}, figure.layout, {selections: []});
+    return Object.assign({}, figure, {data: data, layout: layout});
+}
+"""
 
 
 def get_traces(
     data: Dict[
-        str,
+        Optional[str],
         Dict[
-            Literal[
-                "x", "y", "z", "marker_size", "marker_symbol", "text", "customdata"
-            ],
-            List[Union[float, str, Tuple[float, float, int]]],
+            Literal["x", "y", "marker_size", "marker_symbol", "customdata"],
+            np.ndarray,
         ],
     ],
-    hovertemplate: Optional[str] = "Contig: %{text}",
 ) -> List[go.Scattergl]:
+    # NOTE: Numeric arrays are passed as numpy arrays, which plotly (>= 6) sends
+    # as base64 typed arrays rather than lists of numbers. This greatly reduces
+    # the size (and encoding time) of the figure
     return [
         go.Scattergl(
             x=trace["x"],
             y=trace["y"],
-            text=trace["text"],  # contig header
             name=name,  # groupby (color by column) value
             mode="markers",
             marker=dict(
@@ -82,74 +223,281 @@ def get_traces(
                 line=dict(width=0.1, color="black"),
                 symbol=trace["marker_symbol"],
             ),
-            customdata=trace["customdata"],
+            customdata=trace["customdata"],  # contig row
             opacity=0.45,
+            # See HOVER_TOOLTIP_CLIENTSIDE_CALLBACK
+            hoverinfo="none",
+        )
+        for name, trace in data.items()
+    ]
+
+
+def get_discrete_colorscale(
+    colors: List[str], n_categories: int
+) -> List[Tuple[float, str]]:
+    """Colorscale mapping category codes (0..n_categories-1) to `colors`
+
+    Codes beyond `colors` (i.e. the least abundant categories) all share
+    `OTHER_CATEGORY_COLOR`. Use with cmin=-0.5 and cmax=n_categories-0.5.
+    """
+    colorscale = []
+    for code, color in enumerate(colors):
+        colorscale.extend(
+            [(code / n_categories, color), ((code + 1) / n_categories, color)]
+        )
+    if len(colors) < n_categories:
+        colorscale.extend(
+            [
+                (len(colors) / n_categories, OTHER_CATEGORY_COLOR),
+                (1.0, OTHER_CATEGORY_COLOR),
+            ]
+        )
+    return colorscale
+
+
+def get_category_traces(
+    data: Dict[
+        Literal[
+            "x",
+            "y",
+            "marker_symbol",
+            "marker_size",
+            "customdata",
+            "color",
+            "categories",
+            "counts",
+        ],
+        Union[np.ndarray, List[Optional[str]]],
+    ],
+    max_legend_categories: int,
+) -> List[go.Scattergl]:
+    # NOTE: All contigs are drawn by one trace, the remaining (empty) traces only
+    # provide legend entries for the most abundant categories
+    categories = data["categories"]
+    n_categories = max(len(categories), 1)
+    n_colors = min(max_legend_categories, len(CATEGORY_COLORS), len(categories))
+    colors = CATEGORY_COLORS[:n_colors]
+    trace = go.Scattergl(
+        x=data["x"],
+        y=data["y"],
+        mode="markers",
+        marker=dict(
+            size=data["marker_size"],
+            line=dict(width=0.1, color="black"),
+            symbol=data["marker_symbol"],
+            color=data["color"],
+            colorscale=get_discrete_colorscale(colors, n_categories),
+            cmin=-0.5,
+            cmax=n_categories - 0.5,
+            showscale=False,
+        ),
+        customdata=data["customdata"],  # contig row
+        opacity=0.45,
+        # See HOVER_TOOLTIP_CLIENTSIDE_CALLBACK
+        hoverinfo="none",
+        showlegend=False,
+    )
+    legend_entries = [
+        (f"{category or 'unclassified'} ({count:,})", color)
+        for category, count, color in zip(categories, data["counts"], colors)
+    ]
+    if n_colors < len(categories):
+        n_other = len(categories) - n_colors
+        other_count = int(data["counts"][n_colors:].sum())
+        legend_entries.append(
+            (f"{n_other:,} other ({other_count:,})", OTHER_CATEGORY_COLOR)
+        )
+    legend_traces = [
+        go.Scattergl(
+            x=[None],
+            y=[None],
+            name=name,
+            mode="markers",
+            marker=dict(color=color, size=8),
+            hoverinfo="skip",
+        )
+        for name, color in legend_entries
+    ]
+    return [trace, *legend_traces]
+
+
+def get_density_traces(
+    data: Dict[Optional[str], Dict[Literal["x", "y", "count"], np.ndarray]],
+) -> List[go.Scattergl]:
+    # Bins are drawn as squares shaded by their (log-scaled) number of contigs
+    max_count = max((trace["count"].max() for trace in data.values()), default=1)
+    return [
+        go.Scattergl(
+            x=trace["x"],
+            y=trace["y"],
+            name=name,  # groupby (color by column) value
+            mode="markers",
+            marker=dict(
+                size=4,
+                symbol="square",
+                opacity=(
+                    0.2 + 0.8 * np.log1p(trace["count"]) / np.log1p(max_count)
+                ).astype(np.float32),
+            ),
+            text=trace["count"].tolist(),
             hoverinfo="all",
-            hovertemplate=hovertemplate,
+            hovertemplate="Contigs: %{text:,}",
         )
         for name, trace in data.items()
     ]
 
 
+def get_viewport_ranges(
+    relayout_data: Dict[str, Union[float, bool, List[float]]]
+) -> Dict[Literal["xaxis", "yaxis"], Tuple[float, float]]:
+    """Parse the axes ranges of the visible window from `relayoutData`
+
+    Returns
+    -------
+    Dict[Literal["xaxis", "yaxis"], Tuple[float, float]]
+        (min, max) range of each zoomed (or panned) axis
+
+    Raises
+    ------
+    PreventUpdate
+        The event did not change the visible window (e.g. the dragmode was changed)
+    """
+    ranges = {}
+    for axis in ["xaxis", "yaxis"]:
+        if f"{axis}.range[0]" in relayout_data:
+            axis_range = (
+                relayout_data[f"{axis}.range[0]"],
+                relayout_data[f"{axis}.range[1]"],
+            )
+        elif f"{axis}.range" in relayout_data:
+            axis_range = relayout_data[f"{axis}.range"]
+        else:
+            continue
+        ranges[axis] = tuple(sorted(axis_range))
+    if not ranges and not any(key.endswith("autorange") for key in relayout_data):
+        raise PreventUpdate
+    return ranges
+
+
 def render(app: DashProxy, source: Scatterplot2dDataSource) -> html.Div:
+    @app.callback(
+        Output(ids.SCATTERPLOT_2D_VIEWPORT_STORE, "data"),
+        Input(ids.SCATTERPLOT_2D_FIGURE, "relayoutData"),
+        State(ids.AXES_2D_DROPDOWN, "value"),
+        prevent_initial_call=True,
+    )
+    def scatterplot_2d_viewport_callback(
+        relayout_data: Optional[Dict[str, Union[float, bool, List[float]]]],
+        axes_columns: str,
+    ) -> Dict[Literal["axes", "ranges"], Union[str, Dict[str, Tuple[float, float]]]]:
+        if not relayout_data:
+            raise PreventUpdate
+        return dict(axes=axes_columns, ranges=get_viewport_ranges(relayout_data))
+
     @app.callback(
         Output(ids.SCATTERPLOT_2D_FIGURE, "figure"),
         [
             Input(ids.METAGENOME_ID_STORE, "data"),
             Input(ids.AXES_2D_DROPDOWN, "value"),
-            Input(ids.SCATTERPLOT_2D_LEGEND_TOGGLE, "checked"),
             Input(ids.COLOR_BY_COLUMN_DROPDOWN, "value"),
             Input(ids.HIDE_SELECTIONS_TOGGLE, "checked"),
             Input(ids.COVERAGE_RANGE_SLIDER, "value"),
-            Input(ids.MAG_REFINEMENTS_SAVE_BUTTON, "n_clicks"),
+            Input(ids.SCATTERPLOT_2D_VIEWPORT_STORE, "data"),
         ],
+        State(ids.SCATTERPLOT_2D_LEGEND_TOGGLE, "checked"),
     )
     def scatterplot_2d_figure_callback(
         metagenome_id: int,
         axes_columns: str,
-        show_legend: bool,
         color_by_col: str,
         hide_selection_toggle: bool,
         coverage_range: Tuple[float, float],
-        btn_clicks: int,
+        viewport: Optional[
+            Dict[Literal["axes", "ranges"], Union[str, Dict[str, Tuple[float, float]]]]
+        ],
+        show_legend: bool,
     ) -> go.Figure:
-        # NOTE: btn_clicks is an input so this figure is updated when new refinements are saved
+        # NOTE: Legend visibility and saved refinements are applied as partial
+        # updates of the current figure (see below) rather than re-building it
         # data:
         # - data.x_axis # continuous values
         # - data.y_axis # continuous values
-        # - data.text # Contig.header
         # - data.groupby_value # Categoricals
         # - data.marker_size
-        # - data.marker_symbol
-        # - data.customdata i.e. List[Tuple(coverage, gc_content, length)]
+        # - data.marker_symbol # plotly marker symbol numbers
+        # - data.customdata # contig rows (see `get_contig_lookup`)
 
         x_axis, y_axis = axes_columns.split("|")
-        hovertemplate = get_hovertemplate(x_axis, y_axis)
 
-        headers = source.get_contig_headers_from_coverage_range(
-            metagenome_id, coverage_range
-        )
-
-        if hide_selection_toggle:
-            refinements_headers = source.get_user_refinements_contig_headers(
-                metagenome_id
-            )
-            headers = headers.difference(refinements_headers)
-
-        records = source.get_scatterplot2d_records(
+        contig_filter = ContigFilter(
             metagenome_id=metagenome_id,
-            x_axis=x_axis,
-            y_axis=y_axis,
-            color_by_col=color_by_col,
-            headers=headers,
+            coverage_range=coverage_range,
+            exclude_refined=hide_selection_toggle,
         )
+        # Level of detail: When there are more contigs than can be drawn as points
+        # only the visible window is queried and it is drawn as binned densities
+        # until it is zoomed in to fewer than `scatterplot_max_points` contigs.
+        max_points = settings.figure.scatterplot_max_points
+        viewport_changed = ctx.triggered_id == ids.SCATTERPLOT_2D_VIEWPORT_STORE
+        if source.get_contig_count(contig_filter) <= max_points:
+            if viewport_changed:
+                # All contigs are already drawn
+                raise PreventUpdate
+            density = False
+        else:
+            if viewport and viewport["axes"] == axes_columns:
+                axes_ranges = viewport["ranges"]
+                contig_filter.ranges = {
+                    column: axes_ranges[axis]
+                    for axis, column in [("xaxis", x_axis), ("yaxis", y_axis)]
+                    if axis in axes_ranges
+                }
+            density = source.get_contig_count(contig_filter) > max_points
 
-        traces = get_traces(records, hovertemplate=hovertemplate)
+        # High cardinality color-by columns (e.g. species) are drawn by a single
+        # trace colored by category code rather than one trace per category
+        single_trace = (
+            source.get_color_by_cardinality(contig_filter, color_by_col)
+            > settings.figure.scatterplot_max_traces
+        )
+        categories = None
+        if density:
+            records = source.get_scatterplot2d_density_records(
+                contig_filter=contig_filter,
+                x_axis=x_axis,
+                y_axis=y_axis,
+                # Binned densities of high cardinality columns are not colored
+                color_by_col=None if single_trace else color_by_col,
+                bins=settings.figure.scatterplot_density_bins,
+            )
+            traces = get_density_traces(records)
+        elif single_trace:
+            records = source.get_scatterplot2d_category_records(
+                contig_filter=contig_filter,
+                x_axis=x_axis,
+                y_axis=y_axis,
+                color_by_col=color_by_col,
+            )
+            traces = get_category_traces(
+                records, settings.figure.scatterplot_legend_max_categories
+            )
+            categories = records["categories"]
+        else:
+            records = source.get_scatterplot2d_records(
+                contig_filter=contig_filter,
+                x_axis=x_axis,
+                y_axis=y_axis,
+                color_by_col=color_by_col,
+            )
+            traces = get_traces(records)
         RIGHT_MARGIN = 20
         LEFT_MARGIN = 20
         BOTTOM_MARGIN = 20
         TOP_MARGIN = 20
         legend = go.layout.Legend(visible=show_legend, x=1, y=1)
+        if categories is not None:
+            # Legend entries of the single trace can not toggle its points
+            legend.update(itemclick=False, itemdoubleclick=False)
 
         # NOTE: Changing `uirevision` will trigger the graph to change
         # graph properties state (like zooming, panning, clicking on legend items).
@@ -169,14 +517,68 @@ def render(app: DashProxy, source: Scatterplot2dDataSource) -> html.Div:
             legend=legend,
             margin=dict(r=RIGHT_MARGIN, b=BOTTOM_MARGIN, l=LEFT_MARGIN, t=TOP_MARGIN),
             hovermode="closest",
-            clickmode="event+select",
+            # Binned densities may only be zoomed, selections require points
+            clickmode="event" if density else "event+select",
+            dragmode="zoom" if density else None,
+            modebar=dict(remove=["select2d", "lasso2d"] if density else []),
             uirevision=axes_columns,
             xaxis=go.layout.XAxis(title=dict(text=format_title(x_axis))),
             yaxis=go.layout.YAxis(title=dict(text=format_title(y_axis))),
             height=600,
+            # Axes titles of the hover tooltip
+            meta=dict(
+                x_title=format_axis_title(x_axis),
+                y_title=format_axis_title(y_axis),
+                color_by=format_axis_title(color_by_col),
+                categories=categories,
+            ),
         )
         return go.Figure(data=traces, layout=layout)
 
+    @app.callback(
+        Output(ids.SCATTERPLOT_2D_FIGURE, "figure", allow_duplicate=True),
+        Input(ids.SCATTERPLOT_2D_LEGEND_TOGGLE, "checked"),
+        prevent_initial_call=True,
+    )
+    def scatterplot_2d_legend_callback(show_legend: bool) -> Patch:
+        patched_figure = Patch()
+        patched_figure["layout"]["legend"]["visible"] = show_legend
+        return patched_figure
+
+    app.clientside_callback(
+        HIDE_SAVED_POINTS_CLIENTSIDE_CALLBACK,
+        Output(ids.SCATTERPLOT_2D_FIGURE, "figure", allow_duplicate=True),
+        Input(ids.MAG_REFINEMENTS_SAVE_BUTTON, "n_clicks"),
+        State(ids.HIDE_SELECTIONS_TOGGLE, "checked"),
+        State(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
+        State(ids.SCATTERPLOT_2D_FIGURE, "figure"),
+        prevent_initial_call=True,
+    )
+
+    @app.callback(
+        Output(ids.CONTIG_LOOKUP_STORE, "data"),
+        Input(ids.METAGENOME_ID_STORE, "data"),
+    )
+    def contig_lookup_callback(
+        metagenome_id: int,
+    ) -> Dict[
+        Literal["header", "coverage", "gc_content", "length"],
+        List[Union[str, float, int]],
+    ]:
+        return source.get_contig_lookup(metagenome_id)
+
+    app.clientside_callback(
+        HOVER_TOOLTIP_CLIENTSIDE_CALLBACK,
+        [
+            Output(ids.SCATTERPLOT_2D_TOOLTIP, "show"),
+            Output(ids.SCATTERPLOT_2D_TOOLTIP, "bbox"),
+            Output(ids.SCATTERPLOT_2D_TOOLTIP, "children"),
+        ],
+        Input(ids.SCATTERPLOT_2D_FIGURE, "hoverData"),
+        State(ids.CONTIG_LOOKUP_STORE, "data"),
+        State(ids.SCATTERPLOT_2D_FIGURE, "figure"),
+    )
+
     graph_config = {
         "toImageButtonOptions": dict(
             format="svg",
@@ -189,6 +591,8 @@ def render(app: DashProxy, source: Scatterplot2dDataSource) -> html.Div:
     return html.Div(
         [
             html.Label("Figure 1: 2D Metagenome Overview"),
+            dcc.Store(id=ids.SCATTERPLOT_2D_VIEWPORT_STORE),
+            dcc.Store(id=ids.CONTIG_LOOKUP_STORE),
             dcc.Loading(
                 dcc.Graph(
                     id=ids.SCATTERPLOT_2D_FIGURE,
@@ -199,5 +603,10 @@ def render(app: DashProxy, source: Scatterplot2dDataSource) -> html.Div:
                 id=ids.LOADING_SCATTERPLOT_2D,
                 type="graph",
             ),
+            dcc.Tooltip(
+                id=ids.SCATTERPLOT_2D_TOOLTIP,
+                direction="right",
+                style={"whiteSpace": "pre-line"},
+            ),
         ]
     )
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from typing import Dict, List, Literal, Optional, Protocol, Union
+from typing import Dict, List, Literal, Optional, Protocol
+import numpy as np
 from dash.exceptions import PreventUpdate
-from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
+from dash_extensions.enrich import DashProxy, Input, Output, State, dcc, html
 from plotly import graph_objects as go
 
 from automappa.components import ids
+from automappa.data.filters import ContigSelection
 
 from automappa.utils.figures import format_axis_title
 
@@ -18,10 +20,10 @@ class Scatterplot3dDataSource(Protocol):
         y_axis: str,
         z_axis: str,
         color_by_col: str,
-        headers: Optional[List[str]],
+        selection: Optional[ContigSelection],
     ) -> Dict[
-        str,
-        Dict[Literal["x", "y", "z", "marker_size", "text"], List[Union[float, str]]],
+        Optional[str],
+        Dict[Literal["x", "y", "z", "marker_size", "text"], np.ndarray],
     ]:
         ...
 
@@ -39,8 +41,8 @@ def get_hovertemplate(x_axis_label: str, y_axis_label: str, z_axis_label: str) -
 
 def get_traces(
     data: Dict[
-        str,
-        Dict[Literal["x", "y", "z", "marker_size", "text"], List[Union[float, str]]],
+        Optional[str],
+        Dict[Literal["x", "y", "z", "marker_size", "text"], np.ndarray],
     ],
     hovertemplate: Optional[str] = "Contig: %{text}",
 ) -> List[go.Scatter3d]:
@@ -49,10 +51,13 @@ def get_traces(
             x=trace["x"],
             y=trace["y"],
             z=trace["z"],
-            text=trace["text"],  # contig header
+            text=trace["text"].tolist(),  # contig header
             name=name,  # groupby (color by column) value
             mode="markers",
-            marker=dict(size=trace["marker_size"], line=dict(width=0.1, color="black")),
+            marker=dict(
+                size=trace["marker_size"],
+                line=dict(width=0.1, color="black"),
+            ),
             opacity=0.45,
             hoverinfo="all",
             hovertemplate=hovertemplate,
@@ -65,28 +70,24 @@ def render(app: DashProxy, source: Scatterplot3dDataSource) -> html.Div:
     @app.callback(
         Output(ids.SCATTERPLOT_3D, "figure"),
         [
-            Input(ids.METAGENOME_ID_STORE, "data"),
             Input(ids.AXES_2D_DROPDOWN, "value"),
             Input(ids.SCATTERPLOT_3D_ZAXIS_DROPDOWN, "value"),
             Input(ids.SCATTERPLOT_3D_LEGEND_TOGGLE, "checked"),
             Input(ids.COLOR_BY_COLUMN_DROPDOWN, "value"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
+            Input(ids.CONTIG_SELECTION_STORE, "data"),
         ],
+        State(ids.METAGENOME_ID_STORE, "data"),
+        prevent_initial_call=True,
     )
     def scatterplot_3d_figure_callback(
-        metagenome_id: int,
         axes_columns: str,
         z_axis: str,
         show_legend: bool,
         color_by_col: str,
-        selected_contigs: Dict[str, List[Dict[str, str]]],
+        selection: Optional[ContigSelection],
+        metagenome_id: int,
     ) -> go.Figure:
-        headers = (
-            {point["text"] for point in selected_contigs["points"]}
-            if selected_contigs
-            else None
-        )
-        if headers and len(headers) == 1:
+        if selection and len(selection) == 1:
             raise PreventUpdate
         x_axis, y_axis = axes_columns.split("|")
         traces_data = source.get_scaterplot3d_records(
@@ -95,7 +96,7 @@ def render(app: DashProxy, source: Scatterplot3dDataSource) -> html.Div:
             y_axis=y_axis,
             z_axis=z_axis,
             color_by_col=color_by_col,
-            headers=headers,
+            selection=selection,
         )
         x_axis_title, y_axis_title, z_axis_title, color_by_col_title = map(
             format_axis_title, [x_axis, y_axis, z_axis, color_by_col]
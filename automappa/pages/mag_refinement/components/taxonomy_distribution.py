@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-from typing import Dict, List, Optional, Protocol
-from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
+from typing import Optional, Protocol
+from dash_extensions.enrich import DashProxy, Input, Output, State, dcc, html
 import pandas as pd
 from plotly import graph_objects as go
 
@@ -11,14 +11,17 @@ from automappa.utils.figures import (
     taxonomy_sankey,
 )
 
+from automappa import settings
 from automappa.components import ids
+from automappa.data.schemas import ContigSchema
+from automappa.data.filters import ContigSelection
 
 
 class TaxonomyDistributionDataSource(Protocol):
     def get_sankey_records(
         self,
         metagenome_id: int,
-        headers: Optional[List[str]],
+        selection: Optional[ContigSelection],
         selected_rank: Optional[str],
     ) -> pd.DataFrame:
         ...
@@ -28,24 +31,25 @@ def render(app: DashProxy, source: TaxonomyDistributionDataSource) -> html.Div:
     @app.callback(
         Output(ids.TAXONOMY_DISTRIBUTION, "figure"),
         [
-            Input(ids.METAGENOME_ID_STORE, "data"),
-            Input(ids.SCATTERPLOT_2D_FIGURE, "selectedData"),
+            Input(ids.CONTIG_SELECTION_STORE, "data"),
             Input(ids.TAXONOMY_DISTRIBUTION_DROPDOWN, "value"),
         ],
+        State(ids.METAGENOME_ID_STORE, "data"),
+        prevent_initial_call=True,
     )
     def taxonomy_distribution_figure_callback(
-        metagenome_id: int,
-        selected_contigs: Dict[str, List[Dict[str, str]]],
+        selection: Optional[ContigSelection],
         selected_rank: str,
+        metagenome_id: int,
     ) -> go.Figure:
-        if selected_contigs and selected_contigs["points"]:
-            headers = {point["text"] for point in selected_contigs["points"]}
-        else:
-            headers = None
         df = source.get_sankey_records(
-            metagenome_id, headers=headers, selected_rank=selected_rank
+            metagenome_id, selection=selection, selected_rank=selected_rank
+        )
+        fig = taxonomy_sankey(
+            df,
+            counts=ContigSchema.CONTIG_COUNT,
+            max_taxa_per_rank=settings.figure.sankey_max_taxa_per_rank,
         )
-        fig = taxonomy_sankey(df)
         return fig
 
     graph_config = dict(
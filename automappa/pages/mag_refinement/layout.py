@@ -7,6 +7,8 @@ from automappa.pages.mag_refinement.source import RefinementDataSource
 from automappa.components import ids
 from automappa.pages.mag_refinement.components import (
     marker_symbols_legend,
+    contig_selection_store,
+    contig_distributions_store,
     scatterplot_2d,
     settings_button,
     save_selection_button,
@@ -35,6 +37,8 @@ def render(source: RefinementDataSource) -> DashBlueprint:
     app.layout = dbc.Container(
         children=[
             dmc.Space(h=10),
+            contig_selection_store.render(app, source),
+            contig_distributions_store.render(app, source),
             dmc.Affix(
                 settings_button.render(app, source), position=dict(bottom=10, left=10)
             ),
@@ -73,13 +77,9 @@ def render(source: RefinementDataSource) -> DashBlueprint:
             ),
             dbc.Row(
                 [
-                    dbc.Col(
-                        mag_refinement_coverage_boxplot.render(app, source), width=4
-                    ),
-                    dbc.Col(
-                        mag_refinement_gc_content_boxplot.render(app, source), width=4
-                    ),
-                    dbc.Col(mag_refinement_length_boxplot.render(app, source), width=4),
+                    dbc.Col(mag_refinement_coverage_boxplot.render(app), width=4),
+                    dbc.Col(mag_refinement_gc_content_boxplot.render(app), width=4),
+                    dbc.Col(mag_refinement_length_boxplot.render(app), width=4),
                 ]
             ),
             # TODO Uncomment when cytoscape functionality implemented
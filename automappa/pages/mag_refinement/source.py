@@ -1,212 +1,270 @@
 #!/usr/bin/env python
 
 import logging
+import numpy as np
 import pandas as pd
 from pydantic import BaseModel
-from typing import Dict, List, Literal, Optional, Set, Tuple, Union
+from typing import Dict, Iterable, List, Literal, Optional, Tuple, Union
 from dash import html
 
-from sqlmodel import Session, and_, or_, select, func
+from sqlmodel import Session, or_, select, func
 
+from automappa import settings
+from automappa.data import loader
+from automappa.data.cache import (
+    MetagenomeContigs,
+    contig_cache,
+    load_refinement_bitmaps,
+)
 from automappa.data.database import engine
+from automappa.data.filters import ContigFilter, ContigSelection
+from automappa.data.results import memoize, result_cache
 from automappa.data.models import (
-    Metagenome,
     Contig,
     Marker,
     CytoscapeConnection,
     Refinement,
 )
+from automappa.data.metrics import MARKER_SET_SIZE, get_completeness_purity
 from automappa.data.schemas import ContigSchema
+from automappa.pages.mag_refinement.tasks import save_refinement
+from automappa.utils.figures import MARKER_SYMBOL_NUMBERS
+from automappa.utils.stats import BoxSummary, summarize
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-MARKER_SET_SIZE = 139
+# Per-contig metrics summarized for the refinement boxplots: (name, decimals)
+DISTRIBUTION_METRICS = {
+    ContigSchema.COVERAGE: (ContigSchema.COVERAGE.title(), 2),
+    ContigSchema.GC_CONTENT: ("GC Content", 2),
+    ContigSchema.LENGTH: (ContigSchema.LENGTH.title(), None),
+}
 
 
 class RefinementDataSource(BaseModel):
+    @memoize
     def get_sankey_records(
         self,
         metagenome_id: int,
-        headers: Optional[List[str]],
+        selection: Optional[ContigSelection],
         selected_rank: Literal[
             "superkingdom", "phylum", "class", "order", "family", "genus", "species"
         ] = ContigSchema.SPECIES,
     ) -> pd.DataFrame:
         ranks = [
-            "superkingdom",
-            "phylum",
-            "class",
-            "order",
-            "family",
-            "genus",
-            "species",
+            ContigSchema.SUPERKINGDOM,
+            ContigSchema.PHYLUM,
+            ContigSchema.CLASS,
+            ContigSchema.ORDER,
+            ContigSchema.FAMILY,
+            ContigSchema.GENUS,
+            ContigSchema.SPECIES,
         ]
         ranks = ranks[: ranks.index(selected_rank) + 1]
-        model_ranks = {
-            "superkingdom": Contig.superkingdom,
-            "phylum": Contig.phylum,
-            "class": Contig.klass,
-            "order": Contig.order,
-            "family": Contig.family,
-            "genus": Contig.genus,
-            "species": Contig.species,
-        }
-        selections = [model_ranks.get(rank) for rank in ranks]
-        selections.insert(0, Contig.header)
-        with Session(engine) as session:
-            statement = (
-                select(*selections)
-                .join(Metagenome)
-                .where(Metagenome.id == metagenome_id)
-            )
-            if headers:
-                statement = statement.where(Contig.header.in_(headers))
-            results = session.exec(statement).all()
-
-        schema_ranks = {
-            "superkingdom": ContigSchema.DOMAIN,
-            "phylum": ContigSchema.PHYLUM,
-            "class": ContigSchema.CLASS,
-            "order": ContigSchema.ORDER,
-            "family": ContigSchema.FAMILY,
-            "genus": ContigSchema.GENUS,
-            "species": ContigSchema.SPECIES,
-        }
-        columns = [schema_ranks[rank] for rank in ranks]
-        columns.insert(0, ContigSchema.HEADER)
+        contigs = contig_cache.get(metagenome_id)
+        mask = contigs.selection_mask(selection)
+        # Only lineage counts are needed for the sankey links
+        df = (
+            contigs.lineage_counts(ranks, mask)
+            .astype({rank: object for rank in ranks})
+            .rename(columns={ContigSchema.SUPERKINGDOM: ContigSchema.DOMAIN})
+        )
+        ranks = df.columns.drop(ContigSchema.CONTIG_COUNT)
+        df[ranks] = df[ranks].fillna("unclassified")
+        for rank in ranks:
+            df[rank] = f"{rank[0]}_" + df[rank]
 
-        df = pd.DataFrame.from_records(
-            results,
-            index=ContigSchema.HEADER,
-            columns=columns,
-        ).fillna("unclassified")
+        return df
 
-        for rank in df.columns:
-            df[rank] = df[rank].map(lambda taxon: f"{rank[0]}_{taxon}")
+    def get_selection(
+        self, metagenome_id: int, rows: Optional[Iterable[int]]
+    ) -> Optional[ContigSelection]:
+        if not rows:
+            return None
+        return contig_cache.get(metagenome_id).get_selection(rows)
 
-        return df
+    def get_contig_lookup(
+        self, metagenome_id: int
+    ) -> Dict[
+        Literal["header", "coverage", "gc_content", "length"],
+        List[Union[str, float, int]],
+    ]:
+        """Hover details of every contig indexed by row (i.e. point customdata)
+
+        Columns are sent to the browser once per metagenome (rather than with
+        every figure or hover event), values are rounded to the precision shown.
+        """
+        contigs = contig_cache.get(metagenome_id)
+        return {
+            ContigSchema.HEADER: contigs.headers.tolist(),
+            ContigSchema.COVERAGE: contigs.column(ContigSchema.COVERAGE)
+            .round(2)
+            .tolist(),
+            ContigSchema.GC_CONTENT: contigs.column(ContigSchema.GC_CONTENT)
+            .round(2)
+            .tolist(),
+            ContigSchema.LENGTH: contigs.column(ContigSchema.LENGTH).tolist(),
+        }
 
     def get_coverage_min_max_values(self, metagenome_id: int) -> Tuple[float, float]:
-        with Session(engine) as session:
-            statement = select(
-                func.min(Contig.coverage), func.max(Contig.coverage)
-            ).where(Contig.metagenome_id == metagenome_id)
-            min_cov, max_cov = session.exec(statement).first()
-        return min_cov, max_cov
-
-    def get_contig_headers_from_coverage_range(
-        self, metagenome_id: int, coverage_range: Tuple[float, float]
-    ) -> Set[str]:
-        min_cov, max_cov = coverage_range
-        with Session(engine) as session:
-            headers = session.exec(
-                select([Contig.header]).where(
-                    Contig.metagenome_id == metagenome_id,
-                    Contig.coverage >= min_cov,
-                    Contig.coverage <= max_cov,
-                )
-            ).all()
-        return set(headers)
-
-    def get_user_refinements_contig_headers(self, metagenome_id: int) -> Set[str]:
-        stmt = select(Contig.header).where(
-            Contig.metagenome_id == metagenome_id,
-            Contig.refinements.any(
-                and_(
-                    Refinement.initial_refinement == False,
-                    Refinement.outdated == False,
-                )
-            ),
-        )
-        with Session(engine) as session:
-            headers = session.exec(stmt).all()
-        return set(headers)
+        coverages = contig_cache.get(metagenome_id).column(ContigSchema.COVERAGE)
+        return float(np.nanmin(coverages)), float(np.nanmax(coverages))
 
     def get_scatterplot2d_records(
         self,
-        metagenome_id: int,
+        contig_filter: ContigFilter,
         x_axis: str,
         y_axis: str,
         color_by_col: str,
-        headers: Optional[List[str]] = [],
     ) -> Dict[
-        Literal["x", "y", "marker_symbol", "marker_size", "text", "customdata"],
-        List[Union[float, str, Tuple[float, float, int]]],
+        Optional[str],
+        Dict[
+            Literal["x", "y", "marker_symbol", "marker_size", "customdata"],
+            np.ndarray,
+        ],
     ]:
-        axes = {
-            ContigSchema.LENGTH: Contig.length,
-            ContigSchema.COVERAGE: Contig.coverage,
-            ContigSchema.GC_CONTENT: Contig.gc_content,
-            ContigSchema.X_1: Contig.x_1,
-            ContigSchema.X_2: Contig.x_2,
-        }
-        # Set color by column
-        categoricals = {
-            ContigSchema.CLUSTER: Contig.cluster,
-            ContigSchema.SUPERKINGDOM: Contig.superkingdom,
-            ContigSchema.PHYLUM: Contig.phylum,
-            ContigSchema.CLASS: Contig.klass,
-            ContigSchema.ORDER: Contig.order,
-            ContigSchema.FAMILY: Contig.family,
-            ContigSchema.GENUS: Contig.genus,
-            ContigSchema.SPECIES: Contig.species,
-        }
-
-        name_select = categoricals[color_by_col]
-        x_select = axes[x_axis]
-        y_select = axes[y_axis]
-        stmt = select(
-            x_select,
-            y_select,
-            Contig.marker_size,
-            Contig.marker_symbol,
-            Contig.coverage,
-            Contig.gc_content,
-            Contig.length,
-            Contig.header,
-            name_select,
-        ).select_from(Contig)
-
-        if headers:
-            stmt = stmt.where(Contig.header.in_(headers))
-
-        stmt = stmt.where(Contig.metagenome_id == metagenome_id)
-
-        # query db
-        with Session(engine) as session:
-            results = session.exec(stmt).all()
+        contigs = contig_cache.get(contig_filter.metagenome_id)
+        x = contigs.column(x_axis).astype(np.float32)
+        y = contigs.column(y_axis).astype(np.float32)
+        marker_size, marker_symbol = self._get_marker_arrays(contigs)
 
         # format for traces
         data = {}
-        for (
-            x,
-            y,
-            marker_size,
-            marker_symbol,
-            coverage,
-            gc_content,
-            length,
-            header,
-            name,
-        ) in results:
-            customdata = (coverage, gc_content, length)
-            if name not in data:
-                data[name] = dict(
-                    x=[x],
-                    y=[y],
-                    marker_size=[marker_size],
-                    marker_symbol=[marker_symbol],
-                    customdata=[customdata],
-                    text=[header],
-                )
-            else:
-                data[name]["x"].append(x)
-                data[name]["y"].append(y)
-                data[name]["marker_size"].append(marker_size)
-                data[name]["marker_symbol"].append(marker_symbol)
-                data[name]["customdata"].append(customdata)
-                data[name]["text"].append(header)
+        mask = contig_filter.mask(contigs)
+        for name, positions in contigs.groups(color_by_col, mask):
+            data[name] = dict(
+                x=x[positions],
+                y=y[positions],
+                marker_size=marker_size[positions],
+                marker_symbol=marker_symbol[positions],
+                # Contigs are referenced by their (stable) row in the contig cache
+                customdata=positions.astype(np.uint32),
+            )
+        return data
+
+    def get_scatterplot2d_category_records(
+        self,
+        contig_filter: ContigFilter,
+        x_axis: str,
+        y_axis: str,
+        color_by_col: str,
+    ) -> Dict[
+        Literal[
+            "x",
+            "y",
+            "marker_symbol",
+            "marker_size",
+            "customdata",
+            "color",
+            "categories",
+            "counts",
+        ],
+        Union[np.ndarray, List[Optional[str]]],
+    ]:
+        """Records of all filtered contigs for a single trace colored by category
+
+        Contigs are colored by the integer code of their `color_by_col` value
+        (`color`), codes index `categories` which are ranked by their number of
+        contigs (`counts`).
+        """
+        contigs = contig_cache.get(contig_filter.metagenome_id)
+        mask = contig_filter.mask(contigs)
+        marker_size, marker_symbol = self._get_marker_arrays(contigs)
+        color, categories, counts = contigs.category_codes(color_by_col, mask)
+        return dict(
+            x=contigs.column(x_axis)[mask].astype(np.float32),
+            y=contigs.column(y_axis)[mask].astype(np.float32),
+            marker_size=marker_size[mask],
+            marker_symbol=marker_symbol[mask],
+            customdata=np.flatnonzero(mask).astype(np.uint32),
+            color=color,
+            categories=categories,
+            counts=counts,
+        )
+
+    def get_color_by_cardinality(
+        self, contig_filter: ContigFilter, color_by_col: str
+    ) -> int:
+        contigs = contig_cache.get(contig_filter.metagenome_id)
+        _, categories, _ = contigs.category_codes(
+            color_by_col, contig_filter.mask(contigs)
+        )
+        return len(categories)
+
+    def _get_marker_arrays(
+        self, contigs: MetagenomeContigs
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        marker_size = contigs.column(ContigSchema.MARKER_SIZE)
+        marker_symbols = contigs.df[ContigSchema.MARKER_SYMBOL].cat
+        symbol_numbers = (
+            marker_symbols.categories.map(MARKER_SYMBOL_NUMBERS)
+            .fillna(0)
+            .to_numpy(dtype=np.uint8)
+        )
+        # Missing symbols (code -1) are drawn as circles (symbol number 0)
+        marker_symbol = np.append(symbol_numbers, 0).astype(np.uint8)[
+            marker_symbols.codes.to_numpy()
+        ]
+        return marker_size, marker_symbol
+
+    def get_contig_count(self, contig_filter: ContigFilter) -> int:
+        contigs = contig_cache.get(contig_filter.metagenome_id)
+        return int(contig_filter.mask(contigs).sum())
+
+    def get_scatterplot2d_density_records(
+        self,
+        contig_filter: ContigFilter,
+        x_axis: str,
+        y_axis: str,
+        color_by_col: Optional[str],
+        bins: int,
+    ) -> Dict[Optional[str], Dict[Literal["x", "y", "count"], np.ndarray]]:
+        """Bin contigs into a `bins` x `bins` grid per `color_by_col` category
+
+        All contigs are binned into a single grid (keyed by None) when
+        `color_by_col` is None.
+
+        The grid spans `contig_filter.ranges` of `x_axis` and `y_axis` when
+        provided (i.e. the visible window), otherwise the extent of the
+        filtered contigs.
+
+        Returns
+        -------
+        Dict[Optional[str], Dict[Literal["x", "y", "count"], np.ndarray]]
+            Centers and contig counts of the non-empty bins of each category
+        """
+        contigs = contig_cache.get(contig_filter.metagenome_id)
+        x = contigs.column(x_axis)
+        y = contigs.column(y_axis)
+        mask = contig_filter.mask(contigs) & np.isfinite(x) & np.isfinite(y)
+        if not mask.any():
+            return {}
+        x_min, x_max = contig_filter.ranges.get(
+            x_axis, (x[mask].min(), x[mask].max())
+        )
+        y_min, y_max = contig_filter.ranges.get(
+            y_axis, (y[mask].min(), y[mask].max())
+        )
+        x_width = (x_max - x_min) / bins or 1.0
+        y_width = (y_max - y_min) / bins or 1.0
+        x_bins = np.clip(((x - x_min) // x_width).astype(np.int64), 0, bins - 1)
+        y_bins = np.clip(((y - y_min) // y_width).astype(np.int64), 0, bins - 1)
+        cells = x_bins * bins + y_bins
+
+        groups = (
+            contigs.groups(color_by_col, mask)
+            if color_by_col
+            else [(None, np.flatnonzero(mask))]
+        )
+        data = {}
+        for name, positions in groups:
+            group_cells, counts = np.unique(cells[positions], return_counts=True)
+            data[name] = dict(
+                x=(x_min + (group_cells // bins + 0.5) * x_width).astype(np.float32),
+                y=(y_min + (group_cells % bins + 0.5) * y_width).astype(np.float32),
+                count=counts.astype(np.uint32),
+            )
         return data
 
     def get_scaterplot3d_records(
@@ -216,74 +274,40 @@ class RefinementDataSource(BaseModel):
         y_axis: str,
         z_axis: str,
         color_by_col: str,
-        headers: Optional[List[str]] = [],
+        selection: Optional[ContigSelection] = None,
     ) -> Dict[
-        str,
-        Dict[Literal["x", "y", "z", "marker_size", "text"], List[Union[float, str]]],
+        Optional[str],
+        Dict[Literal["x", "y", "z", "marker_size", "text"], np.ndarray],
     ]:
-        # Set x,y,z axes
-        axes = {
-            ContigSchema.LENGTH: Contig.length,
-            ContigSchema.COVERAGE: Contig.coverage,
-            ContigSchema.GC_CONTENT: Contig.gc_content,
-            ContigSchema.X_1: Contig.x_1,
-            ContigSchema.X_2: Contig.x_2,
-        }
-        # Set color by column
-        categoricals = {
-            ContigSchema.CLUSTER: Contig.cluster,
-            ContigSchema.SUPERKINGDOM: Contig.superkingdom,
-            ContigSchema.PHYLUM: Contig.phylum,
-            ContigSchema.CLASS: Contig.klass,
-            ContigSchema.ORDER: Contig.order,
-            ContigSchema.FAMILY: Contig.family,
-            ContigSchema.GENUS: Contig.genus,
-            ContigSchema.SPECIES: Contig.species,
-        }
-        name_select = categoricals[color_by_col]
-        x_select = axes[x_axis]
-        y_select = axes[y_axis]
-        z_select = axes[z_axis]
-        stmt = select(
-            x_select,
-            y_select,
-            z_select,
-            (
-                (
-                    func.ceil(
-                        (Contig.length - func.min(Contig.length).over())
-                        / (
-                            func.max(Contig.length).over()
-                            - func.min(Contig.length).over()
-                        )
-                    )
-                    * 2
-                    + 4
-                ).label("marker_size")
-            ),
-            Contig.header,
-            name_select,
+        contigs = contig_cache.get(metagenome_id)
+        mask = contigs.selection_mask(selection)
+        x = contigs.column(x_axis).astype(np.float32)
+        y = contigs.column(y_axis).astype(np.float32)
+        z = contigs.column(z_axis).astype(np.float32)
+        headers_array = contigs.headers.to_numpy()
+        # Marker sizes are scaled by contig length within the selection
+        lengths = contigs.column(ContigSchema.LENGTH)
+        selected_lengths = lengths[mask]
+        min_length = selected_lengths.min() if selected_lengths.size else 0
+        length_range = (
+            selected_lengths.max() - min_length if selected_lengths.size else 0
         )
-
-        if headers:
-            stmt = stmt.where(Contig.header.in_(headers))
-
-        stmt = stmt.where(Contig.metagenome_id == metagenome_id)
-        with Session(engine) as session:
-            results = session.exec(stmt).all()
+        scaled_lengths = (
+            (lengths - min_length) // length_range
+            if length_range
+            else np.zeros_like(lengths)
+        )
+        marker_size = (scaled_lengths * 2 + 4).astype(np.uint8)
 
         data = {}
-        for x, y, z, marker_size, header, name in results:
-            if name not in data:
-                data[name] = dict(
-                    x=[x], y=[y], z=[z], marker_size=[marker_size], text=[header]
-                )
-            else:
-                data[name]["x"].append(x)
-                data[name]["y"].append(y)
-                data[name]["z"].append(z)
-                data[name]["marker_size"].append(marker_size)
-                data[name]["text"].append(header)
+        for name, positions in contigs.groups(color_by_col, mask):
+            data[name] = dict(
+                x=x[positions],
+                y=y[positions],
+                z=z[positions],
+                marker_size=marker_size[positions],
+                text=headers_array[positions],
+            )
         return data
 
     def get_color_by_column_options(self) -> List[Dict[Literal["label", "value"], str]]:
@@ -335,6 +359,7 @@ class RefinementDataSource(BaseModel):
         ]
         return [dict(label=rank.title(), value=rank) for rank in ranks]
 
+    @memoize
     def get_marker_overview(
         self, metagenome_id: int
     ) -> List[Dict[Literal["metric", "metric_value"], Union[str, int, float]]]:
@@ -361,89 +386,27 @@ class RefinementDataSource(BaseModel):
             {"metric": "Marker Contigs", "metric_value": marker_contigs_count},
         ]
 
+    @memoize
     def get_mag_metrics_row_data(
-        self, metagenome_id: int, headers: Optional[List[str]]
+        self, metagenome_id: int, selection: Optional[ContigSelection]
     ) -> List[Dict[Literal["metric", "metric_value"], Union[str, int, float]]]:
-        contig_count_stmt = select(func.count(Contig.id)).where(
-            Contig.metagenome_id == metagenome_id
-        )
-        contig_length_stmt = select(func.sum(Contig.length)).where(
-            Contig.metagenome_id == metagenome_id
-        )
-        marker_contig_count_stmt = (
-            select(func.count(func.distinct(Marker.contig_id)))
-            .join(Contig)
-            .where(Contig.metagenome_id == metagenome_id)
-        )
-        # - single-copy marker contig count
-        single_copy_stmt = (
-            select(Contig.id)
-            .where(Contig.metagenome_id == metagenome_id)
-            .join(Marker)
-            .group_by(Contig.id)
-            .having(func.count(Marker.id) == 1)
-        )
-        # - multi-copy marker contig count
-        multi_copy_stmt = (
-            select(Contig.id)
-            .where(Contig.metagenome_id == metagenome_id)
-            .join(Marker)
-            .group_by(Contig.id)
-            .having(func.count(Marker.id) > 1)
-        )
-        marker_count_stmt = (
-            select(func.count(Marker.id))
-            .join(Contig)
-            .where(Contig.metagenome_id == metagenome_id)
-        )
-        unique_marker_stmt = (
-            select(Marker.sacc)
-            .join(Contig)
-            .distinct()
-            .where(Contig.metagenome_id == metagenome_id)
-        )
-        redundant_marker_sacc_stmt = (
-            select(Marker.sacc)
-            .join(Contig)
-            .where(Contig.metagenome_id == metagenome_id)
-            .group_by(Marker.sacc)
-            .having(func.count(Marker.id) > 1)
-        )
-        if headers:
-            contig_count_stmt = contig_count_stmt.where(Contig.header.in_(headers))
-            contig_length_stmt = contig_length_stmt.where(Contig.header.in_(headers))
-            marker_contig_count_stmt = marker_contig_count_stmt.where(
-                Contig.header.in_(headers)
-            )
-            multi_copy_stmt = multi_copy_stmt.where(Contig.header.in_(headers))
-            single_copy_stmt = single_copy_stmt.where(Contig.header.in_(headers))
-            redundant_marker_sacc_stmt = redundant_marker_sacc_stmt.where(
-                Contig.header.in_(headers)
-            )
-            marker_count_stmt = marker_count_stmt.where(Contig.header.in_(headers))
-            unique_marker_stmt = unique_marker_stmt.where(Contig.header.in_(headers))
-
-        with Session(engine) as session:
-            contig_count = session.exec(contig_count_stmt).first() or 0
-            length_sum = session.exec(contig_length_stmt).first() or 0
-            marker_contigs_count = session.exec(marker_contig_count_stmt).first() or 0
-            single_copy_contig_count = (
-                session.exec(select(func.count()).select_from(single_copy_stmt)).first()
-                or 0
-            )
-            multi_copy_contig_count = (
-                session.exec(select(func.count()).select_from(multi_copy_stmt)).first()
-                or 0
-            )
-            markers_count = session.exec(marker_count_stmt).first() or 0
-            unique_marker_count = session.exec(
-                select(func.count()).select_from(unique_marker_stmt)
-            ).first()
-            redundant_marker_sacc = session.exec(redundant_marker_sacc_stmt).all()
-
-        completeness = round(unique_marker_count / MARKER_SET_SIZE * 100, 2)
-        purity = (
-            round(unique_marker_count / markers_count * 100, 2) if markers_count else 0
+        contigs = contig_cache.get(metagenome_id)
+        mask = contigs.selection_mask(selection)
+        marker_counts = contigs.column(ContigSchema.MARKER_COUNT)[mask]
+        contig_count = int(mask.sum())
+        length_sum = int(contigs.column(ContigSchema.LENGTH)[mask].sum())
+        marker_contigs_count = int((marker_counts > 0).sum())
+        single_copy_contig_count = int((marker_counts == 1).sum())
+        multi_copy_contig_count = int((marker_counts > 1).sum())
+        markers_count = int(marker_counts.sum())
+
+        markers = contigs.markers
+        accession_counts = markers.accession_counts(mask)
+        unique_marker_count = int((accession_counts > 0).sum())
+        redundant_marker_sacc = markers.accessions[accession_counts > 1].tolist()
+
+        completeness, purity = get_completeness_purity(
+            unique_marker_count, markers_count
         )
         length_sum_mbp = round(length_sum / 1_000_000, 3)
 
@@ -472,50 +435,42 @@ class RefinementDataSource(BaseModel):
                 "metric_value": ", ".join(redundant_marker_sacc),
             },
         ]
-        if headers:
+        if selection:
             row_data.insert(0, {"metric": "Purity (%)", "metric_value": purity})
             row_data.insert(
                 0, {"metric": "Completeness (%)", "metric_value": completeness}
             )
         return row_data
 
-    def get_coverage_boxplot_records(
-        self, metagenome_id: int, headers: Optional[List[str]]
-    ) -> List[Tuple[str, List[float]]]:
-        with Session(engine) as session:
-            stmt = select(Contig.coverage).where(Contig.metagenome_id == metagenome_id)
-            if headers:
-                stmt = stmt.where(Contig.header.in_(headers))
-            coverages = session.exec(stmt).all()
-        coverages = [round(coverage, 2) for coverage in coverages]
-        return [(ContigSchema.COVERAGE.title(), coverages)]
-
-    def get_gc_content_boxplot_records(
-        self, metagenome_id: int, headers: Optional[List[str]]
-    ) -> List[Tuple[str, List[float]]]:
-        with Session(engine) as session:
-            stmt = select(Contig.gc_content).where(
-                Contig.metagenome_id == metagenome_id
-            )
-            if headers:
-                stmt = stmt.where(Contig.header.in_(headers))
-            gc_contents = session.exec(stmt).all()
-
-        gc_contents = [round(gc_content, 2) for gc_content in gc_contents]
-        return [("GC Content", gc_contents)]
+    @memoize
+    def get_contig_distributions(
+        self, metagenome_id: int, selection: Optional[ContigSelection]
+    ) -> Dict[str, BoxSummary]:
+        """Summarize the distribution of each per-contig metric of the selection
+
+        The selection is resolved to a mask once and shared by every metric in
+        `DISTRIBUTION_METRICS` (i.e. one summary per refinement boxplot).
+        """
+        contigs = contig_cache.get(metagenome_id)
+        mask = contigs.selection_mask(selection)
+        return {
+            column: self._summarize(name, contigs.column(column)[mask], decimals)
+            for column, (name, decimals) in DISTRIBUTION_METRICS.items()
+        }
 
-    def get_length_boxplot_records(
-        self, metagenome_id: int, headers: Optional[List[str]]
-    ) -> List[Tuple[str, List[int]]]:
-        with Session(engine) as session:
-            stmt = select(Contig.length).where(Contig.metagenome_id == metagenome_id)
-            if headers:
-                stmt = stmt.where(Contig.header.in_(headers))
-            lengths = session.exec(stmt).all()
-        return [(ContigSchema.LENGTH.title(), lengths)]
+    def _summarize(
+        self, name: str, values: np.ndarray, decimals: Optional[int] = None
+    ) -> BoxSummary:
+        return summarize(
+            name,
+            values,
+            max_outliers=settings.figure.boxplot_max_outliers,
+            decimals=decimals,
+        )
 
+    @memoize
     def get_cytoscape_elements(
-        self, metagenome_id: int, headers: Optional[List[str]] = []
+        self, metagenome_id: int, selection: Optional[ContigSelection] = None
     ) -> List[
         Dict[
             Literal["data"],
@@ -534,7 +489,9 @@ class RefinementDataSource(BaseModel):
             .select_from(CytoscapeConnection)
             .where(CytoscapeConnection.metagenome_id == metagenome_id)
         )
-        if headers:
+        if selection:
+            contigs = contig_cache.get(metagenome_id)
+            headers = contigs.headers[contigs.selection_mask(selection)]
             start_nodes = {f"{header}s" for header in headers}
             end_nodes = {f"{header}e" for header in headers}
             nodes = start_nodes.union(end_nodes)
@@ -561,8 +518,9 @@ class RefinementDataSource(BaseModel):
         ]
         return nodes + edges
 
+    @memoize
     def get_cytoscape_stylesheet(
-        self, metagenome_id: int, headers: Optional[List[str]]
+        self, metagenome_id: int, selection: Optional[ContigSelection]
     ) -> List:
         stmt = (
             select(
@@ -573,7 +531,9 @@ class RefinementDataSource(BaseModel):
             .select_from(CytoscapeConnection)
             .where(CytoscapeConnection.metagenome_id == metagenome_id)
         )
-        if headers:
+        if selection:
+            contigs = contig_cache.get(metagenome_id)
+            headers = contigs.headers[contigs.selection_mask(selection)]
             start_nodes = {f"{header}s" for header in headers}
             end_nodes = {f"{header}e" for header in headers}
             nodes = start_nodes.union(end_nodes)
@@ -601,6 +561,7 @@ class RefinementDataSource(BaseModel):
         ]
         return stylesheet
 
+    @memoize
     def has_user_refinements(self, metagenome_id: int) -> bool:
         with Session(engine) as session:
             refinement = session.exec(
@@ -626,8 +587,11 @@ class RefinementDataSource(BaseModel):
             for refinement in refinements:
                 session.delete(refinement)
             session.commit()
+        contig_cache.invalidate_refinements(metagenome_id)
+        result_cache.bump_generation(metagenome_id)
         return n_refinements
 
+    @memoize
     def get_refinements_row_data(
         self, metagenome_id: int
     ) -> List[
@@ -641,6 +605,8 @@ class RefinementDataSource(BaseModel):
             Refinement.outdated == False,
             Refinement.initial_refinement == False,
         )
+        # Contig counts are bitmap cardinalities (no lazy loading of contigs)
+        counts = load_refinement_bitmaps(metagenome_id).counts()
         data = []
         with Session(engine) as session:
             refinements = session.exec(stmt).all()
@@ -648,32 +614,33 @@ class RefinementDataSource(BaseModel):
                 row = dict(
                     refinement_id=refinement.id,
                     timestamp=refinement.timestamp.strftime("%d-%b-%Y, %H:%M:%S"),
-                    contigs=len(refinement.contigs),
+                    contigs=counts.get(refinement.id, 0),
                 )
                 data.append(row)
         return data
 
-    def save_selections_to_refinement(
-        self, metagenome_id: int, headers: List[str]
-    ) -> None:
-        with Session(engine) as session:
-            contigs = session.exec(
-                select(Contig).where(
-                    Contig.metagenome_id == metagenome_id, Contig.header.in_(headers)
-                )
-            ).all()
-            for contig in contigs:
-                for refinement in contig.refinements:
-                    refinement.outdated = True
-            refinement = Refinement(
-                contigs=contigs,
-                metagenome_id=metagenome_id,
-                outdated=False,
-                initial_refinement=False,
-            )
-            session.add(refinement)
-            session.commit()
-
+    def save_selections_to_refinement(self, selection: ContigSelection) -> None:
+        """Save the selected contigs as a new user refinement
+
+        With ``CELERY_ASYNC_REFINEMENT_SAVE`` the refinement is created by the
+        `save_refinement` task and this returns once the task is dispatched.
+        The cached refinements and memoized results of this process are
+        invalidated either way, however reads made before the task commits
+        still see the previous refinements (and may cache them again). The
+        task bumps the refinement generation once more after committing, so
+        every worker reloads the saved refinement on its next read, i.e.
+        pages are eventually consistent within the runtime of the task.
+        """
+        metagenome_id = selection.metagenome_id
+        contig_ids = selection.contig_ids.tolist()
+        if settings.celery.async_refinement_save:
+            save_refinement.delay(metagenome_id, contig_ids)
+        else:
+            loader.create_refinement(metagenome_id, contig_ids)
+        contig_cache.invalidate_refinements(metagenome_id)
+        result_cache.bump_generation(metagenome_id)
+
+    @memoize
     def get_refinements_dataframe(self, metagenome_id: int) -> pd.DataFrame:
         stmt = select(Refinement).where(
             Refinement.metagenome_id == metagenome_id,
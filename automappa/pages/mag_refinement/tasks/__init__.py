@@ -0,0 +1,5 @@
+from .refinements import save_refinement
+
+__all__ = [
+    "save_refinement",
+]
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+
+from typing import List
+
+from automappa.data import loader
+from automappa.data.results import result_cache
+from automappa.tasks import queue
+
+
+@queue.task(bind=True)
+def save_refinement(self, metagenome_id: int, contig_ids: List[int]) -> int:
+    """Save contigs as a new user refinement (see `loader.create_refinement`)
+
+    Bumping the refinement generation invalidates the memoized results and
+    the cached refinement membership of every web worker.
+    """
+    refinement_id = loader.create_refinement(metagenome_id, contig_ids)
+    result_cache.bump_generation(metagenome_id)
+    return refinement_id
@@ -3,16 +3,17 @@
 from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
 
 from plotly import graph_objects as go
-from typing import Protocol, List, Tuple
+from typing import Protocol, List
 
 from automappa.utils.figures import metric_boxplot
+from automappa.utils.stats import BoxSummary
 from automappa.components import ids
 
 
 class GcContentBoxplotDataSource(Protocol):
     def get_gc_content_boxplot_records(
         self, metagenome_id: int, refinement_id: int
-    ) -> List[Tuple[str, List[float]]]:
+    ) -> List[BoxSummary]:
         ...
 
 
@@ -2,17 +2,18 @@
 
 from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
 
-from typing import Protocol, List, Tuple, Optional
+from typing import Protocol, List, Optional
 from plotly import graph_objects as go
 
 from automappa.utils.figures import metric_boxplot
+from automappa.utils.stats import BoxSummary
 from automappa.components import ids
 
 
 class OverviewCoverageBoxplotDataSource(Protocol):
     def get_coverage_boxplot_records(
         self, metagenome_id: int, cluster: Optional[str]
-    ) -> List[Tuple[str, List[float]]]:
+    ) -> List[BoxSummary]:
         ...
 
 
@@ -1,19 +1,20 @@
 # -*- coding: utf-8 -*-
 
-from typing import List, Optional, Protocol, Tuple
+from typing import List, Optional, Protocol
 from dash.exceptions import PreventUpdate
 from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
 
 from plotly import graph_objects as go
 
 from automappa.utils.figures import metric_boxplot
+from automappa.utils.stats import BoxSummary
 from automappa.components import ids
 
 
 class GcContentBoxplotDataSource(Protocol):
     def get_gc_content_boxplot_records(
         self, metagenome_id: int, cluster: Optional[str]
-    ) -> List[Tuple[str, List[float]]]:
+    ) -> List[BoxSummary]:
         ...
 
 
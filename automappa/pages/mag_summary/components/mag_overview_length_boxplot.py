@@ -1,17 +1,18 @@
 # -*- coding: utf-8 -*-
 
 from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
-from typing import Protocol, Optional, List, Tuple
+from typing import Protocol, Optional, List
 from plotly import graph_objects as go
 
 from automappa.utils.figures import metric_boxplot
+from automappa.utils.stats import BoxSummary
 from automappa.components import ids
 
 
 class LengthOverviewBoxplotDataSource(Protocol):
     def get_length_boxplot_records(
         self, metagenome_id: int, cluster: Optional[str]
-    ) -> List[Tuple[str, List[int]]]:
+    ) -> List[BoxSummary]:
         ...
 
 
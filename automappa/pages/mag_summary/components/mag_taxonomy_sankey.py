@@ -5,7 +5,9 @@ from dash_extensions.enrich import DashProxy, Input, Output, dcc, html
 from plotly import graph_objects as go
 
 from automappa.utils.figures import taxonomy_sankey
+from automappa import settings
 from automappa.components import ids
+from automappa.data.schemas import ContigSchema
 
 
 class ClusterTaxonomySankeyDataSource(Protocol):
@@ -26,7 +28,11 @@ def render(app: DashProxy, source: ClusterTaxonomySankeyDataSource) -> html.Div:
         data = source.get_taxonomy_sankey_records(
             metagenome_id, refinement_id=refinement_id
         )
-        fig = taxonomy_sankey(data)
+        fig = taxonomy_sankey(
+            data,
+            counts=ContigSchema.CONTIG_COUNT,
+            max_taxa_per_rank=settings.figure.sankey_max_taxa_per_rank,
+        )
         return fig
     
     graph_config = dict(
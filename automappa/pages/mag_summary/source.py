@@ -1,105 +1,82 @@
 #!/usr/bin/env python
 import logging
+import numpy as np
 import pandas as pd
 from pydantic import BaseModel
 from typing import Dict, List, Literal, Optional, Tuple, Union
 
-from sqlmodel import Session, and_, select, func
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlmodel import Session, and_, or_, select, func
+
+from automappa import settings
 from automappa.data.database import engine
-from automappa.data.models import Refinement, Contig, Marker
+from automappa.data.metrics import read_refinement_metrics
+from automappa.data.models import Refinement, Contig, Lineage
+from automappa.data.results import memoize
 from automappa.data.schemas import ContigSchema
+from automappa.utils.stats import BoxSummary, get_fence_bounds, thin_outliers
 
 logger = logging.getLogger(__name__)
 
-MARKER_SET_SIZE = 139
-
 
 class SummaryDataSource(BaseModel):
+    def get_refinement_metrics(
+        self, metagenome_id: int, refinement_id: Optional[int] = None
+    ) -> List[Dict[str, Union[int, float, str]]]:
+        """Metrics of the current refinements (or of `refinement_id`)"""
+        clauses = [
+            Refinement.metagenome_id == metagenome_id,
+            Refinement.outdated == False,
+        ]
+        if refinement_id is not None:
+            clauses.append(Refinement.id == refinement_id)
+        with engine.connect() as connection:
+            return read_refinement_metrics(connection, *clauses)
+
+    @memoize
     def compute_completeness_purity_metrics(
         self, metagenome_id: int, refinement_id: int
     ) -> Tuple[float, float]:
-        marker_count_stmt = (
-            select(func.count(Marker.id))
-            .join(Contig)
-            .where(
-                Contig.metagenome_id == metagenome_id,
-                Contig.refinements.any(
-                    and_(
-                        Refinement.outdated == False,
-                        Refinement.id == refinement_id,
-                    )
-                ),
-            )
-        )
-        unique_marker_stmt = (
-            select(Marker.sacc)
-            .join(Contig)
-            .distinct()
-            .where(
-                Contig.metagenome_id == metagenome_id,
-                Contig.refinements.any(
-                    and_(
-                        Refinement.outdated == False,
-                        Refinement.id == refinement_id,
-                    )
-                ),
-            )
-        )
-        with Session(engine) as session:
-            markers_count = session.exec(marker_count_stmt).first() or 0
-            unique_marker_count = session.exec(
-                select(func.count()).select_from(unique_marker_stmt)
-            ).first()
-
-        completeness = round(unique_marker_count / MARKER_SET_SIZE * 100, 2)
-        purity = (
-            round(unique_marker_count / markers_count * 100, 2) if markers_count else 0
-        )
-        return completeness, purity
+        metrics = self.get_refinement_metrics(metagenome_id, refinement_id)
+        if not metrics:
+            return 0, 0
+        return metrics[0]["completeness"], metrics[0]["purity"]
 
+    @memoize
     def compute_length_sum_mbp(self, metagenome_id: int, refinement_id: int) -> float:
-        contig_length_stmt = select(func.sum(Contig.length)).where(
-            Contig.metagenome_id == metagenome_id,
-            Contig.refinements.any(
-                and_(
-                    Refinement.outdated == False,
-                    Refinement.id == refinement_id,
-                )
-            ),
-        )
-        with Session(engine) as session:
-            length_sum = session.exec(contig_length_stmt).first() or 0
+        metrics = self.get_refinement_metrics(metagenome_id, refinement_id)
+        length_sum = metrics[0]["length_sum"] if metrics else 0
         length_sum_mbp = round(length_sum / 1_000_000, 3)
         return length_sum_mbp
 
+    @memoize
     def get_completeness_purity_boxplot_records(
         self, metagenome_id: int
     ) -> List[Tuple[str, List[float]]]:
-        completeness_metrics = []
-        purities = []
-        with Session(engine) as session:
-            stmt = select(Refinement.id).where(
-                Refinement.outdated == False, Refinement.metagenome_id == metagenome_id
-            )
-            refinement_ids = session.exec(stmt).all()
-        for refinement_id in refinement_ids:
-            (
-                completeness,
-                purity,
-            ) = self.compute_completeness_purity_metrics(metagenome_id, refinement_id)
-            completeness_metrics.append(completeness)
-            purities.append(purity)
+        metrics = self.get_refinement_metrics(metagenome_id)
+        completeness_metrics = [refinement["completeness"] for refinement in metrics]
+        purities = [refinement["purity"] for refinement in metrics]
         return [
             (ContigSchema.COMPLETENESS.title(), completeness_metrics),
             (ContigSchema.PURITY.title(), purities),
         ]
 
-    def get_gc_content_boxplot_records(
-        self, metagenome_id: int, refinement_id: Optional[int] = 0
-    ) -> List[Tuple[str, List[float]]]:
-        stmt = select([Contig.gc_content]).where(Contig.metagenome_id == metagenome_id)
+    def get_box_summary(
+        self,
+        name: str,
+        column: InstrumentedAttribute,
+        metagenome_id: int,
+        refinement_id: Optional[int] = 0,
+        decimals: Optional[int] = None,
+    ) -> BoxSummary:
+        """Summarize `column` of the metagenome (or refinement) contigs in SQL
+
+        Quartiles, mean and sd are aggregated by the database so only the box
+        statistics and the outliers are retrieved.
+        """
+        clauses = [Contig.metagenome_id == metagenome_id, column.isnot(None)]
         if refinement_id:
-            stmt = stmt.where(
+            clauses.append(
                 Contig.refinements.any(
                     and_(
                         Refinement.outdated == False,
@@ -107,44 +84,76 @@ class SummaryDataSource(BaseModel):
                     )
                 )
             )
+        stats_stmt = select(
+            func.count(column),
+            func.percentile_cont(0.25).within_group(column),
+            func.percentile_cont(0.5).within_group(column),
+            func.percentile_cont(0.75).within_group(column),
+            func.avg(column),
+            func.stddev_samp(column),
+        ).where(*clauses)
         with Session(engine) as session:
-            results = session.exec(stmt).all()
-        return [("GC Content", results)]
+            count, q1, median, q3, mean, sd = session.exec(stats_stmt).one()
+            if not count:
+                return BoxSummary(name=name)
+            lower, upper = get_fence_bounds(q1, q3)
+            fences_stmt = select(func.min(column), func.max(column)).where(
+                *clauses, column.between(lower, upper)
+            )
+            lowerfence, upperfence = session.exec(fences_stmt).one()
+            outliers_stmt = select(column).where(
+                *clauses, or_(column < lower, column > upper)
+            )
+            outliers = session.exec(outliers_stmt).all()
+        summary = BoxSummary(
+            name=name,
+            count=count,
+            q1=q1,
+            median=median,
+            q3=q3,
+            lowerfence=q1 if lowerfence is None else lowerfence,
+            upperfence=q3 if upperfence is None else upperfence,
+            mean=mean,
+            sd=sd or 0.0,
+            outliers=thin_outliers(
+                np.array(outliers, dtype=np.float64),
+                settings.figure.boxplot_max_outliers,
+            ).tolist(),
+        )
+        return summary.round(decimals) if decimals is not None else summary
+
+    @memoize
+    def get_gc_content_boxplot_records(
+        self, metagenome_id: int, refinement_id: Optional[int] = 0
+    ) -> List[BoxSummary]:
+        summary = self.get_box_summary(
+            "GC Content", Contig.gc_content, metagenome_id, refinement_id, decimals=2
+        )
+        return [summary]
 
+    @memoize
     def get_length_boxplot_records(
         self, metagenome_id: int, refinement_id: Optional[int] = 0
-    ) -> List[Tuple[str, List[int]]]:
-        stmt = select([Contig.length]).where(Contig.metagenome_id == metagenome_id)
-        if refinement_id:
-            stmt = stmt.where(
-                Contig.refinements.any(
-                    and_(
-                        Refinement.outdated == False,
-                        Refinement.id == refinement_id,
-                    )
-                )
-            )
-        with Session(engine) as session:
-            results = session.exec(stmt).all()
-        return [(ContigSchema.LENGTH.title(), results)]
+    ) -> List[BoxSummary]:
+        summary = self.get_box_summary(
+            ContigSchema.LENGTH.title(), Contig.length, metagenome_id, refinement_id
+        )
+        return [summary]
 
+    @memoize
     def get_coverage_boxplot_records(
         self, metagenome_id: int, refinement_id: Optional[int] = 0
-    ) -> List[Tuple[str, List[float]]]:
-        stmt = select([Contig.coverage]).where(Contig.metagenome_id == metagenome_id)
-        if refinement_id:
-            stmt = stmt.where(
-                Contig.refinements.any(
-                    and_(
-                        Refinement.outdated == False,
-                        Refinement.id == refinement_id,
-                    )
-                )
-            )
-        with Session(engine) as session:
-            results = session.exec(stmt).all()
-        return [(ContigSchema.COVERAGE.title(), results)]
+    ) -> List[BoxSummary]:
+        summary = self.get_box_summary(
+            ContigSchema.COVERAGE.title(),
+            Contig.coverage,
+            metagenome_id,
+            refinement_id,
+            decimals=2,
+        )
+        return [summary]
 
+    @memoize
     def get_metrics_barplot_records(
         self, metagenome_id: int, refinement_id: int
     ) -> Tuple[str, List[float], List[float]]:
@@ -156,6 +165,7 @@ class SummaryDataSource(BaseModel):
         y = [completeness, purity]
         return name, x, y
 
+    @memoize
     def get_mag_stats_summary_row_data(
         self, metagenome_id: int
     ) -> List[
@@ -171,36 +181,19 @@ class SummaryDataSource(BaseModel):
             Union[str, int, float],
         ]
     ]:
-        stmt = select(Refinement).where(
-            Refinement.metagenome_id == metagenome_id,
-            Refinement.outdated == False,
-        )
-        row_data = {}
-        with Session(engine) as session:
-            refinements = session.exec(stmt).all()
-            for refinement in refinements:
-                contig_count = len(refinement.contigs)
-                row_data[refinement.id] = {
-                    "refinement_id": refinement.id,
-                    "refinement_label": f"bin_{refinement.id}",
-                    "contig_count": contig_count,
-                }
-            for refinement_id in row_data:
-                completeness, purity = self.compute_completeness_purity_metrics(
-                    metagenome_id, refinement_id
-                )
-                length_sum_mbp = self.compute_length_sum_mbp(
-                    metagenome_id, refinement_id
-                )
-                row_data[refinement_id].update(
-                    {
-                        "completeness": completeness,
-                        "purity": purity,
-                        "length_sum_mbp": length_sum_mbp,
-                    }
-                )
-        return list(row_data.values())
+        return [
+            {
+                "refinement_id": metrics["refinement_id"],
+                "refinement_label": f"bin_{metrics['refinement_id']}",
+                "contig_count": metrics["contig_count"],
+                "completeness": metrics["completeness"],
+                "purity": metrics["purity"],
+                "length_sum_mbp": round(metrics["length_sum"] / 1_000_000, 3),
+            }
+            for metrics in self.get_refinement_metrics(metagenome_id)
+        ]
 
+    @memoize
     def get_refinement_selection_dropdown_options(
         self, metagenome_id: int
     ) -> List[Dict[Literal["label", "value"], str]]:
@@ -216,43 +209,47 @@ class SummaryDataSource(BaseModel):
             results = session.exec(stmt).all()
         return [dict(label=f"bin_{result}", value=result) for result in results]
 
+    @memoize
     def get_taxonomy_sankey_records(
         self, metagenome_id: int, refinement_id: int
     ) -> pd.DataFrame:
-        statement = select(
-            Contig.header,
-            Contig.superkingdom,
-            Contig.phylum,
-            Contig.klass,
-            Contig.order,
-            Contig.family,
-            Contig.genus,
-            Contig.species,
-        ).where(
-            Contig.metagenome_id == metagenome_id,
-            Contig.refinements.any(Refinement.id == refinement_id),
+        # Count contigs per taxid (integer key) before joining their lineages
+        taxid_counts = (
+            select(Contig.taxid, func.count(Contig.id).label(ContigSchema.CONTIG_COUNT))
+            .where(
+                Contig.metagenome_id == metagenome_id,
+                Contig.refinements.any(Refinement.id == refinement_id),
+            )
+            .group_by(Contig.taxid)
+            .subquery()
+        )
+        lineage = [
+            func.coalesce(rank, "unclassified").label(name)
+            for rank, name in [
+                (Lineage.superkingdom, ContigSchema.DOMAIN),
+                (Lineage.phylum, ContigSchema.PHYLUM),
+                (Lineage.klass, ContigSchema.CLASS),
+                (Lineage.order, ContigSchema.ORDER),
+                (Lineage.family, ContigSchema.FAMILY),
+                (Lineage.genus, ContigSchema.GENUS),
+                (Lineage.species, ContigSchema.SPECIES),
+            ]
+        ]
+        statement = select(*lineage, taxid_counts.c.contig_count).join_from(
+            taxid_counts,
+            Lineage,
+            Lineage.taxid == taxid_counts.c.taxid,
+            isouter=True,
         )
         with Session(engine) as session:
             results = session.exec(statement).all()
 
-        columns = [
-            ContigSchema.HEADER,
-            ContigSchema.DOMAIN,
-            ContigSchema.PHYLUM,
-            ContigSchema.CLASS,
-            ContigSchema.ORDER,
-            ContigSchema.FAMILY,
-            ContigSchema.GENUS,
-            ContigSchema.SPECIES,
-        ]
-
+        columns = [rank.name for rank in lineage]
         df = pd.DataFrame.from_records(
-            results,
-            index=ContigSchema.HEADER,
-            columns=columns,
-        ).fillna("unclassified")
+            results, columns=[*columns, ContigSchema.CONTIG_COUNT]
+        )
 
-        for rank in df.columns:
-            df[rank] = df[rank].map(lambda taxon: f"{rank[0]}_{taxon}")
+        for rank in columns:
+            df[rank] = f"{rank[0]}_" + df[rank]
 
         return df
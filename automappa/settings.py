@@ -49,6 +49,9 @@ class RabbitmqSettings(BaseSettings):
 class CelerySettings(BaseSettings):
     backend_url: RedisDsn
     broker_url: AmqpDsn
+    # Save MAG refinements in a worker task so the save button returns immediately
+    # (refinement views are stale until the task commits the refinement)
+    async_refinement_save: Optional[bool] = False
 
     class Config:
         env_prefix: str = "CELERY_"
@@ -65,6 +68,47 @@ class FlowerSettings(BaseSettings):
         env_file_encoding: str = "utf-8"
 
 
+class CacheSettings(BaseSettings):
+    # Memory budget (bytes) of the per-process contig attribute cache
+    contig_cache_max_bytes: Optional[int] = 1_073_741_824
+    # Data source results memoized in redis (shared between web workers)
+    results_enabled: Optional[bool] = True
+    # Seconds a memoized result is kept
+    results_ttl: Optional[int] = 3600
+    # Results larger than this many (pickled) bytes are not memoized
+    results_max_entry_bytes: Optional[int] = 16_777_216
+    # Key signing memoized (pickled) results, entries with an invalid signature
+    # are never unpickled. Defaults to the redis password (REDIS_BACKEND_PASSWORD),
+    # without either a random key is generated per process (results not shared)
+    results_signing_key: Optional[str] = None
+
+    class Config:
+        env_prefix: str = "CACHE_"
+        env_file: str = ".env"
+        env_file_encoding: str = "utf-8"
+
+
+class FigureSettings(BaseSettings):
+    # Above this many visible contigs the 2D scatterplot shows binned densities
+    scatterplot_max_points: Optional[int] = 200_000
+    # Number of bins per axis of the 2D scatterplot density raster
+    scatterplot_density_bins: Optional[int] = 200
+    # Above this many color-by categories the 2D scatterplot is drawn as a single
+    # trace colored by category code (rather than one trace per category)
+    scatterplot_max_traces: Optional[int] = 50
+    # Number of (most abundant) categories listed in the single trace legend
+    scatterplot_legend_max_categories: Optional[int] = 20
+    # Maximum number of outliers drawn as points on a summarized boxplot
+    boxplot_max_outliers: Optional[int] = 5_000
+    # Taxonomy sankeys collapse the least abundant taxa of a rank beyond this many
+    sankey_max_taxa_per_rank: Optional[int] = 50
+
+    class Config:
+        env_prefix: str = "FIGURE_"
+        env_file: str = ".env"
+        env_file_encoding: str = "utf-8"
+
+
 class ServerSettings(BaseSettings):
     root_upload_folder: Path
     # Dash/Plotly
@@ -84,3 +128,5 @@ redis = RedisSettings()
 database = DatabaseSettings()
 rabbitmq = RabbitmqSettings()
 celery = CelerySettings()
+cache = CacheSettings()
+figure = FigureSettings()
@@ -1,55 +1,123 @@
 #!/usr/bin/env python
 
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 import numpy as np
 import pandas as pd
 from dash.exceptions import PreventUpdate
 from plotly import graph_objects as go
+from plotly.colors import qualitative
 
+from automappa.utils.stats import BoxSummary
 
-def taxonomy_sankey(df: pd.DataFrame) -> go.Figure:
-    ranks = df.columns.tolist()
-    n_ranks = len(ranks)
-    label = []
+
+def taxonomy_sankey(
+    df: pd.DataFrame,
+    counts: Optional[str] = None,
+    max_taxa_per_rank: Optional[int] = None,
+) -> go.Figure:
+    """Generate a sankey of contig counts flowing between adjacent taxonomic ranks
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Contig taxa with one column per rank ordered from the highest rank,
+        taxon names must be non-null and unique across ranks (e.g. prefixed with
+        the rank)
+    counts : Optional[str], optional
+        Column of contig counts when each row is an aggregated lineage rather
+        than a single contig, by default None (one contig per row)
+    max_taxa_per_rank : Optional[int], optional
+        Keep at most this many nodes per rank, collapsing the least abundant taxa
+        into a single "other" node, by default None (keep all taxa)
+
+    Returns
+    -------
+    go.Figure
+        Sankey figure of the taxonomic ranks
+    """
+    weights = df[counts].to_numpy() if counts else None
+    ranks = df.columns.drop(counts) if counts else df.columns
+    labels = []
+    rank_codes = []
     for rank in ranks:
-        label.extend(df[rank].unique().tolist())
+        # Dictionary-encode each rank and offset its codes to global node indices
+        codes, taxa = pd.factorize(df[rank])
+        taxa = taxa.tolist()
+        if max_taxa_per_rank is not None and len(taxa) > max_taxa_per_rank:
+            taxa_counts = np.bincount(codes, weights=weights, minlength=len(taxa))
+            n_kept = max(max_taxa_per_rank - 1, 0)
+            kept = np.argsort(-taxa_counts, kind="stable")[:n_kept]
+            collapsed = np.full(len(taxa), kept.size)
+            collapsed[kept] = np.arange(kept.size)
+            codes = collapsed[codes]
+            other = f"other ({len(taxa) - kept.size} taxa)"
+            taxa = [taxa[i] for i in kept] + [other]
+        rank_codes.append(codes.astype(np.int64) + len(labels))
+        labels.extend(taxa)
+    n_nodes = len(labels)
     source = []
     target = []
     value = []
-    for rank in ranks:
-        for rank_name, rank_df in df.groupby(rank):
-            source_index = label.index(rank_name)
-            next_rank_i = ranks.index(rank) + 1
-            if next_rank_i >= len(ranks[:n_ranks]):
-                continue
-            next_rank = ranks[next_rank_i]
-            # all source is from label rank name index
-            for rank_n in rank_df[next_rank].unique():
-                target_index = label.index(rank_n)
-                value_count = len(rank_df[rank_df[next_rank] == rank_n])
-                label.append(source_index)
-                source.append(source_index)
-                target.append(target_index)
-                value.append(value_count)
+    for source_codes, target_codes in zip(rank_codes, rank_codes[1:]):
+        # Count every (source, target) link of the rank pair at once
+        links, link_index = np.unique(
+            source_codes * n_nodes + target_codes, return_inverse=True
+        )
+        source.append(links // n_nodes)
+        target.append(links % n_nodes)
+        value.append(np.bincount(link_index, weights=weights).astype(np.int64))
+    empty = np.empty(0, dtype=np.int64)
     return go.Figure(
         go.Sankey(
             node=dict(
                 pad=8,
                 thickness=13,
                 line=dict(width=0.3),
-                label=label,
+                label=labels,
             ),
             link=dict(
-                source=source,
-                target=target,
-                value=value,
+                source=np.concatenate([empty, *source]),
+                target=np.concatenate([empty, *target]),
+                value=np.concatenate([empty, *value]),
             ),
         ),
     )
 
 
+def get_box_summary_traces(
+    summary: BoxSummary, horizontal: bool, boxmean: Union[bool, str], color: str
+) -> List[Union[go.Box, go.Scatter]]:
+    stats = summary.dict(exclude={"name", "count", "outliers"})
+    if not boxmean:
+        stats.update(mean=None, sd=None)
+    elif boxmean != "sd":
+        stats.update(sd=None)
+    position = "y" if horizontal else "x"
+    value = "x" if horizontal else "y"
+    box = go.Box(
+        name=summary.name,
+        legendgroup=summary.name,
+        marker_color=color,
+        boxmean=boxmean,
+        **{position: [summary.name]},
+        **{stat: [value] for stat, value in stats.items() if value is not None},
+    )
+    # Only the outliers are shipped as points, the box itself is drawn from its stats
+    outliers = go.Scatter(
+        name=summary.name,
+        legendgroup=summary.name,
+        mode="markers",
+        marker=dict(color=color, size=4),
+        showlegend=False,
+        hovertemplate=f"%{{{value}}}<extra>{summary.name}</extra>",
+        **{position: [summary.name] * len(summary.outliers)},
+        **{value: summary.outliers},
+    )
+    return [box, outliers]
+
+
 def metric_boxplot(
-    data: List[Tuple[str, pd.Series]],
+    data: List[Union[BoxSummary, Tuple[str, pd.Series]]],
     horizontal: bool = False,
     boxmean: Union[bool, str] = True,
 ) -> go.Figure:
@@ -57,8 +125,8 @@ def metric_boxplot(
 
     Parameters
     ----------
-    data : List[Tuple[str,pd.Series]]
-        MAG annotations dataframe
+    data : List[Union[BoxSummary, Tuple[str,pd.Series]]]
+        Precomputed box statistics or (metric, values) to be summarized client-side
     horizontal : bool, optional
         Whether to generate horizontal or vertical boxplot traces in the figure.
     boxmean : Union[bool,str], optional
@@ -78,7 +146,14 @@ def metric_boxplot(
     if not data:
         raise PreventUpdate
     traces = []
-    for metric, series in data:
+    for i, metric_data in enumerate(data):
+        if isinstance(metric_data, BoxSummary):
+            color = qualitative.Plotly[i % len(qualitative.Plotly)]
+            traces.extend(
+                get_box_summary_traces(metric_data, horizontal, boxmean, color)
+            )
+            continue
+        metric, series = metric_data
         if horizontal:
             trace = go.Box(x=series, name=metric, boxmean=boxmean)
         else:
@@ -99,6 +174,19 @@ def metric_barplot(
     return go.Figure([trace])
 
 
+# Plotly marker symbol numbers of the symbols assigned from contig marker counts
+MARKER_SYMBOL_NUMBERS = {
+    "circle": 0,
+    "square": 1,
+    "diamond": 2,
+    "x": 4,
+    "triangle-up": 5,
+    "pentagon": 13,
+    "hexagon2": 15,
+    "hexagram": 18,
+}
+
+
 def format_axis_title(axis_title: str) -> str:
     """Format axis title depending on title text. Converts embed methods to uppercase then x_dim.
 
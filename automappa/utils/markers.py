@@ -2,6 +2,19 @@
 
 import pandas as pd
 
+# Plotly marker symbol and size of contigs by marker count (the last entries
+# apply to contigs with 7 or more markers), see https://plotly.com/python/marker-style/
+MARKER_SYMBOLS = (
+    "circle",
+    "square",
+    "diamond",
+    "triangle-up",
+    "x",
+    "pentagon",
+    "hexagon2",
+    "hexagram",
+)
+MARKER_SIZES = (7, 8, 9, 10, 11, 12, 13, 14)
 
 def get_cluster_marker_counts(
     df: pd.DataFrame, markers_df: pd.DataFrame
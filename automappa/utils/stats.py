@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# Summary statistics computed server-side so figures do not ship raw values
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+# Tukey's fences (as used by plotly to draw box whiskers)
+WHISKER_IQR_MULTIPLIER = 1.5
+
+
+class BoxSummary(BaseModel):
+    """Precomputed statistics of a single box of a boxplot
+
+    Parameters
+    ----------
+    name : str
+        Name of the box (i.e. the metric)
+    count : int
+        Number of (non-null) values summarized
+    q1, median, q3 : Optional[float]
+        Quartiles of the values
+    lowerfence, upperfence : Optional[float]
+        Most extreme values within 1.5 IQR of the quartiles (whisker ends)
+    mean, sd : Optional[float]
+        Mean and sample standard deviation of the values
+    outliers : List[float]
+        Values beyond the fences (possibly thinned, see `thin_outliers`)
+    """
+
+    name: str
+    count: int = 0
+    q1: Optional[float] = None
+    median: Optional[float] = None
+    q3: Optional[float] = None
+    lowerfence: Optional[float] = None
+    upperfence: Optional[float] = None
+    mean: Optional[float] = None
+    sd: Optional[float] = None
+    outliers: List[float] = []
+
+    def round(self, decimals: int) -> "BoxSummary":
+        stats = self.dict(exclude={"name", "count", "outliers"})
+        rounded = {
+            stat: float(round(value, decimals))
+            for stat, value in stats.items()
+            if value is not None
+        }
+        outliers = np.round(self.outliers, decimals).tolist()
+        return self.copy(update=dict(outliers=outliers, **rounded))
+
+
+def get_fence_bounds(q1: float, q3: float) -> Tuple[float, float]:
+    iqr = q3 - q1
+    return q1 - WHISKER_IQR_MULTIPLIER * iqr, q3 + WHISKER_IQR_MULTIPLIER * iqr
+
+
+def thin_outliers(outliers: np.ndarray, max_outliers: Optional[int]) -> np.ndarray:
+    """Evenly subsample sorted `outliers` down to `max_outliers` keeping extremes"""
+    outliers = np.sort(outliers)
+    if max_outliers is None or outliers.size <= max_outliers:
+        return outliers
+    keep = np.linspace(0, outliers.size - 1, num=max_outliers).round().astype(int)
+    return outliers[np.unique(keep)]
+
+
+def summarize(
+    name: str,
+    values: Iterable[float],
+    max_outliers: Optional[int] = None,
+    decimals: Optional[int] = None,
+) -> BoxSummary:
+    """Summarize `values` into the statistics of a single box
+
+    Parameters
+    ----------
+    name : str
+        Name of the box
+    values : Iterable[float]
+        Values to summarize, nulls are ignored
+    max_outliers : Optional[int], optional
+        Maximum number of outliers to keep, by default None (keep all)
+    decimals : Optional[int], optional
+        Round statistics and outliers to this many decimals, by default None
+
+    Returns
+    -------
+    BoxSummary
+        Box statistics of `values`
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if not values.size:
+        return BoxSummary(name=name)
+    # Values are already in memory, exact quantiles are cheaper than a sketch
+    q1, median, q3 = np.quantile(values, [0.25, 0.5, 0.75]).tolist()
+    lower, upper = get_fence_bounds(q1, q3)
+    is_inlier = (values >= lower) & (values <= upper)
+    inliers = values[is_inlier]
+    outliers = thin_outliers(values[~is_inlier], max_outliers)
+    summary = BoxSummary(
+        name=name,
+        count=int(values.size),
+        q1=q1,
+        median=median,
+        q3=q3,
+        lowerfence=float(inliers.min()) if inliers.size else q1,
+        upperfence=float(inliers.max()) if inliers.size else q3,
+        mean=float(values.mean()),
+        sd=float(values.std(ddof=1)) if values.size > 1 else 0.0,
+        outliers=outliers.tolist(),
+    )
+    return summary.round(decimals) if decimals is not None else summary
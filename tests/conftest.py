@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from automappa.data import cache, loader
+from automappa.data.results import result_cache
+from automappa.pages.home import source as home_source
+from automappa.pages.home.tasks import sample_cards
+from automappa.pages.mag_refinement import source as mag_refinement_source
+from automappa.pages.mag_summary import source as mag_summary_source
+
+N_CONTIGS = 60
+N_CLUSTERS = 3
+RANKS = ["superkingdom", "phylum", "class", "order", "family", "genus", "species"]
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """SQLite database used by every data module in place of postgres"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'automappa.db'}")
+    SQLModel.metadata.create_all(engine)
+    for module in (
+        cache,
+        loader,
+        home_source,
+        sample_cards,
+        mag_refinement_source,
+        mag_summary_source,
+    ):
+        monkeypatch.setattr(module, "engine", engine)
+    # Results are always computed rather than read from redis and contigs are
+    # never read from a previous test's database
+    monkeypatch.setattr(result_cache, "enabled", False)
+    monkeypatch.setattr(cache.contig_cache, "_entries", OrderedDict())
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def sample_fpaths(tmp_path):
+    """Metagenome, binning and markers files of a small sample"""
+    rng = np.random.default_rng(0)
+    metagenome_fpath = tmp_path / "metagenome.fna"
+    binning_fpath = tmp_path / "binning.tsv"
+    markers_fpath = tmp_path / "markers.tsv"
+    with open(metagenome_fpath, "w") as fh:
+        for i in range(N_CONTIGS):
+            fh.write(f">contig_{i}\n{''.join(rng.choice(list('ACGT'), 60))}\n")
+    columns = [
+        "contig",
+        "cluster",
+        "completeness",
+        "purity",
+        "coverage_stddev",
+        "gc_content_stddev",
+        "coverage",
+        "gc_content",
+        "length",
+        *RANKS,
+        "taxid",
+        "x_1",
+        "x_2",
+    ]
+    with open(binning_fpath, "w") as fh:
+        fh.write("\t".join(columns) + "\n")
+        for i in range(N_CONTIGS):
+            cluster = f"bin_{i % N_CLUSTERS}" if i % 4 else ""
+            taxid = i % 5
+            lineage = [f"{rank}_{taxid}" for rank in RANKS]
+            values = [
+                f"contig_{i}",
+                cluster,
+                50.0,
+                90.0,
+                1.0,
+                1.0,
+                rng.uniform(1, 100),
+                rng.uniform(30, 70),
+                int(rng.integers(1_000, 100_000)),
+                *lineage,
+                taxid,
+                rng.normal(),
+                rng.normal(),
+            ]
+            fh.write("\t".join(map(str, values)) + "\n")
+    with open(markers_fpath, "w") as fh:
+        fh.write("contig\tqname\tsname\tsacc\tfull_seq_score\tcutoff\n")
+        for i in range(2 * N_CONTIGS):
+            contig = f"contig_{i % N_CONTIGS}"
+            fh.write(f"{contig}\t{contig}_{i}\tname\tPF{i % 139:05d}\t30.0\t20.0\n")
+    return dict(
+        metagenome_fpath=str(metagenome_fpath),
+        binning_fpath=str(binning_fpath),
+        markers_fpath=str(markers_fpath),
+    )
+
+
+@pytest.fixture
+def create_sample(engine, sample_fpaths):
+    """Ingest the sample as a new metagenome with its initial refinements"""
+
+    def create_sample(name: str = "sample") -> int:
+        metagenome_id, _ = loader.create_sample_metagenome(name, **sample_fpaths)
+        loader.create_initial_refinements(metagenome_id)
+        return metagenome_id
+
+    return create_sample
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+import itertools
+
+import numpy as np
+import pytest
+
+from automappa.data.bitmaps import ARRAY_CONTAINER_MAX_SIZE, RoaringBitmap
+
+
+def get_values(seed: int, dense: bool) -> set:
+    """Values spanning several containers, either sparse or dense (bitmaps)"""
+    rng = np.random.default_rng(seed)
+    size = 3 * ARRAY_CONTAINER_MAX_SIZE if dense else ARRAY_CONTAINER_MAX_SIZE // 4
+    values = set()
+    for key in (0, 1, 3):
+        low = rng.choice(2**16, size=size, replace=False)
+        values.update(((key << 16) | low).tolist())
+    return values
+
+
+@pytest.mark.parametrize(
+    "a_dense,b_dense", list(itertools.product((False, True), repeat=2))
+)
+def test_set_operations(a_dense, b_dense):
+    a_values = get_values(seed=0, dense=a_dense)
+    b_values = get_values(seed=1, dense=b_dense) | {2 << 16}
+    a = RoaringBitmap.from_indices(list(a_values))
+    b = RoaringBitmap.from_indices(list(b_values))
+
+    assert len(a) == len(a_values)
+    assert set((a | b).to_indices().tolist()) == a_values | b_values
+    assert set((a & b).to_indices().tolist()) == a_values & b_values
+    assert set((a - b).to_indices().tolist()) == a_values - b_values
+    assert set((b - a).to_indices().tolist()) == b_values - a_values
+    assert len(a & b) == len(a_values & b_values)
+    assert a.intersects(b) == bool(a_values & b_values)
+    assert RoaringBitmap.intersection(a, b, a) == a & b
+    assert RoaringBitmap.difference(a, b, a) == RoaringBitmap()
+    assert RoaringBitmap.union(a, b) == a | b
+
+
+def test_disjoint_and_empty():
+    a = RoaringBitmap.from_indices([1, 2, 3])
+    b = RoaringBitmap.from_indices([4, 2**20])
+    empty = RoaringBitmap()
+
+    assert not a.intersects(b)
+    assert len(a & b) == 0
+    assert a - b == a
+    assert a & empty == empty
+    assert a - empty == a
+    assert empty - a == empty
+    np.testing.assert_array_equal((a | b).to_indices(), [1, 2, 3, 4, 2**20])
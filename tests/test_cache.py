@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from automappa.data.cache import SELECTION_MASKS_MAXSIZE, MetagenomeContigs
+from automappa.data.filters import ContigSelection
+from automappa.data.schemas import ContigSchema
+
+
+def test_selection_mask_concurrent_callers():
+    n_contigs = 1_000
+    contig_ids = np.arange(1, n_contigs + 1)
+    df = pd.DataFrame(
+        {
+            ContigSchema.CONTIG_ID: contig_ids,
+            ContigSchema.HEADER: [f"contig_{i}" for i in contig_ids],
+        }
+    )
+    contigs = MetagenomeContigs(metagenome_id=1, df=df)
+    selections = [
+        ContigSelection.from_contig_ids(1, contig_ids[i : i + 10])
+        for i in range(4 * SELECTION_MASKS_MAXSIZE)
+    ]
+
+    def get_rows(i: int) -> list:
+        mask = contigs.selection_mask(selections[i % len(selections)])
+        return np.flatnonzero(mask).tolist()
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(get_rows, range(5_000)))
+
+    for i, rows in enumerate(results):
+        start = i % len(selections)
+        assert rows == list(range(start, start + 10))
+    assert len(contigs._selection_masks) <= SELECTION_MASKS_MAXSIZE
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+from sqlmodel import Session, select
+
+from automappa.data.models import (
+    Contig,
+    ContigRefinementLink,
+    Refinement,
+    RefinementMetrics,
+)
+from automappa.pages.home.source import HomeDataSource
+
+
+def test_get_sample_card_summaries(create_sample):
+    metagenome_id = create_sample()
+    summaries = HomeDataSource().get_sample_card_summaries()
+    summary = summaries[metagenome_id]
+    assert summary["name"] == "sample"
+    assert summary["contig_count"] == 60
+    assert summary["marker_count"] == 120
+    assert summary["initial_refinements_count"] == 3
+    assert summary["current_refinements_count"] == 3
+    assert summary["user_refinements_count"] == 0
+    assert summary["refined_contig_count"] == 45
+    mimag_count = sum(
+        summary[tier] for tier in ("high_quality", "medium_quality", "low_quality")
+    )
+    assert mimag_count == 3
+
+
+def test_remove_metagenome(engine, create_sample):
+    removed_id = create_sample("removed")
+    kept_id = create_sample("kept")
+    source = HomeDataSource()
+    source.remove_metagenome(removed_id)
+
+    summaries = source.get_sample_card_summaries()
+    assert list(summaries) == [kept_id]
+    assert summaries[kept_id]["current_refinements_count"] == 3
+    with Session(engine) as session:
+        for model in (Contig, Refinement, RefinementMetrics):
+            orphans = session.exec(
+                select(model).where(
+                    (model.metagenome_id == removed_id) | (model.metagenome_id == None)
+                )
+            ).all()
+            assert not orphans
+        links = session.exec(select(ContigRefinementLink)).all()
+        assert len(links) == 45
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from sqlmodel import Session, select
+
+from automappa.data import loader
+from automappa.data.models import Contig
+
+
+def test_read_contig_sequences(engine, create_sample, sample_fpaths):
+    metagenome_id = create_sample()
+    with open(sample_fpaths["metagenome_fpath"]) as fh:
+        sequences = dict(SimpleFastaParser(fh))
+    with Session(engine) as session:
+        contigs = session.exec(
+            select(Contig.id, Contig.header)
+            .where(Contig.metagenome_id == metagenome_id)
+            .order_by(Contig.id)
+        ).all()
+    requested = {contig_id: header for contig_id, header in contigs[::7]}
+
+    contig_sequences = loader.read_contig_sequences(list(requested))
+
+    assert contig_sequences == {
+        contig_id: sequences[header] for contig_id, header in requested.items()
+    }
+    assert loader.read_contig_sequences([]) == {}
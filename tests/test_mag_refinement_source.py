@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+from sqlmodel import Session, select
+
+from automappa.data.models import Contig
+from automappa.pages.mag_refinement.source import RefinementDataSource
+
+
+def test_get_contig_lookup(engine, create_sample):
+    metagenome_id = create_sample()
+    source = RefinementDataSource()
+    lookup = source.get_contig_lookup(metagenome_id)
+    with Session(engine) as session:
+        contigs = session.exec(
+            select(Contig)
+            .where(Contig.metagenome_id == metagenome_id)
+            .order_by(Contig.id)
+        ).all()
+
+    assert set(lookup) == {"header", "coverage", "gc_content", "length"}
+    # Lookup rows are the contig rows carried by points (customdata)
+    for row, contig in enumerate(contigs):
+        assert lookup["header"][row] == contig.header
+        assert lookup["coverage"][row] == round(contig.coverage, 2)
+        assert lookup["gc_content"][row] == round(contig.gc_content, 2)
+        assert lookup["length"][row] == contig.length
+    selection = source.get_selection(metagenome_id, [0, 5])
+    assert selection.contig_ids.tolist() == [contigs[0].id, contigs[5].id]
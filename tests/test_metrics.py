@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+from sqlalchemy import delete, select
+
+from automappa.data import loader
+from automappa.data.metrics import read_refinement_metrics
+from automappa.data.models import Contig, Refinement, RefinementMetrics
+
+
+def read_stored_metrics(connection) -> dict:
+    rows = connection.execute(select(RefinementMetrics.__table__)).mappings()
+    return {row["refinement_id"]: dict(row) for row in rows}
+
+
+def test_metrics_written_with_refinements(engine, create_sample):
+    metagenome_id = create_sample()
+    with engine.connect() as connection:
+        refinement_ids = connection.execute(select(Refinement.id)).scalars().all()
+        stored = read_stored_metrics(connection)
+        contig_ids = (
+            connection.execute(
+                select(Contig.id).where(Contig.metagenome_id == metagenome_id)
+            )
+            .scalars()
+            .all()
+        )
+    assert sorted(stored) == sorted(refinement_ids)
+
+    refinement_id = loader.create_refinement(metagenome_id, contig_ids[:10])
+    with engine.connect() as connection:
+        stored = read_stored_metrics(connection)
+    assert stored[refinement_id]["contig_count"] == 10
+    assert stored[refinement_id]["metagenome_id"] == metagenome_id
+
+
+def test_read_refinement_metrics_without_stored_metrics(engine, create_sample):
+    create_sample()
+    with engine.connect() as connection:
+        expected = read_refinement_metrics(connection)
+    with engine.begin() as connection:
+        connection.execute(
+            delete(RefinementMetrics).where(RefinementMetrics.refinement_id != 1)
+        )
+    with engine.connect() as connection:
+        assert read_refinement_metrics(connection) == expected
+        assert len(read_stored_metrics(connection)) == 1
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+import hashlib
+import hmac
+import pickle
+from typing import Dict, Optional
+
+import pytest
+
+from automappa.data.results import ResultCache
+
+
+class InMemoryRedis:
+    """The subset of the redis client used by `ResultCache`"""
+
+    def __init__(self) -> None:
+        self.values: Dict[str, bytes] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.values.get(key)
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> None:
+        self.values[key] = value
+
+    def incr(self, key: str) -> None:
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+
+    def hincrby(self, name: str, key: str) -> None:
+        pass
+
+    def pipeline(self, transaction: bool = True) -> "InMemoryRedis":
+        return self
+
+    def execute(self) -> None:
+        pass
+
+
+def get_memoized(cache: ResultCache, calls: list):
+    @cache.memoize
+    def get_result(metagenome_id: int) -> dict:
+        calls.append(metagenome_id)
+        return {"metagenome_id": metagenome_id}
+
+    return get_result
+
+
+@pytest.mark.parametrize("signing_key", [None, ""])
+def test_unconfigured_signing_key_is_random(signing_key):
+    cache = ResultCache(signing_key=signing_key)
+    other = ResultCache(signing_key=signing_key)
+    assert len(cache._signing_key) >= 32
+    assert cache._signing_key != other._signing_key
+    forged = pickle.dumps({"forged": True})
+    with pytest.raises(ValueError):
+        cache.loads(hmac.new(b"", forged, hashlib.sha256).digest() + forged)
+
+
+def test_results_shared_by_signing_key():
+    client = InMemoryRedis()
+    calls = []
+    caches = [ResultCache(signing_key="secret") for _ in range(2)]
+    caches.append(ResultCache())
+    for cache in caches:
+        cache._client = client
+    get_results = [get_memoized(cache, calls) for cache in caches]
+
+    assert get_results[0](1) == {"metagenome_id": 1}
+    # Same key: read from redis, random key: entries of other keys are not read
+    assert get_results[1](1) == {"metagenome_id": 1}
+    assert get_results[2](1) == {"metagenome_id": 1}
+    assert calls == [1, 1]
+    caches[0].bump_generation(1)
+    get_results[1](1)
+    assert calls == [1, 1, 1]